@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+# A compact, sorted, memory-mapped index of a dbSNP or COSMIC VCF file, built once (per reference release) and looked up with binary searches.
+# The index is a directory of .npy arrays, which are memory-mapped read-only, so all the workers on a node share the same pages.
+#   keys.npy        coordinates encoded as (contig index << 32) | position, sorted
+#   alleles.npy     64-bit hash of REF and ALT, sorted within each coordinate
+#   flags.npy       COMMON=1 (dbSNP) and SNP (COSMIC)
+#   cnt.npy         COSMIC CNT, or -1 if there is none
+#   id_offsets.npy  where the ID column of each record is in ids.npy
+#   id_lengths.npy
+#   ids.npy         the ID columns, back to back
+#   contigs.txt     contig names, in the order of their index in the keys
+
+import argparse, os, sys, re, hashlib
+import numpy as np
+from array import array
+
+MY_DIR = os.path.dirname(os.path.realpath(__file__))
+PRE_DIR = os.path.join(MY_DIR, os.pardir)
+sys.path.append( PRE_DIR )
+
+import genomicFileHandler.genomic_file_handlers as genome
+
+flag_common = 1
+flag_snp    = 2
+
+index_arrays = ('keys', 'alleles', 'flags', 'cnt', 'id_offsets', 'id_lengths', 'ids')
+
+
+
+def allele_hash(ref_base, alt_base):
+    return int.from_bytes( hashlib.blake2b('{}\t{}'.format(ref_base, alt_base).encode(), digest_size=8).digest(), 'little' )
+
+
+
+def is_annotation_index(path):
+    return os.path.isdir(path) and os.path.exists( os.path.join(path, 'contigs.txt') )
+
+
+
+def build(vcf_file, index_dir):
+    '''Index every (coordinate, REF, ALT) of the VCF file. Like the dictionaries from find_vcf_at_coordinate, the last record of the same variant wins.'''
+
+    contigs    = {}
+    keys       = array('Q')
+    alleles    = array('Q')
+    flags      = array('B')
+    cnt        = array('i')
+    id_offsets = array('Q')
+    id_lengths = array('I')
+    ids        = bytearray()
+
+    with genome.open_textfile(vcf_file) as vcf_in:
+
+        line_i = genome.skip_vcf_header(vcf_in)
+
+        while line_i:
+
+            vcf_i = genome.Vcf_line( line_i )
+
+            if vcf_i.chromosome not in contigs:
+                contigs[ vcf_i.chromosome ] = len(contigs)
+
+            key_i  = genome.encode_coordinate( contigs[vcf_i.chromosome], vcf_i.position )
+            flag_i = ( flag_common if vcf_i.get_info_value('COMMON') == '1' else 0 ) | ( flag_snp if vcf_i.get_info_value('SNP') else 0 )
+
+            cnt_i = vcf_i.get_info_value('CNT')
+            try:
+                cnt_i = int(cnt_i) if cnt_i else -1
+            except ValueError:
+                cnt_i = -1
+
+            identifier_i = vcf_i.identifier.encode()
+
+            # Some VCF files wrongly uses "/" to separate different ALT's
+            for alt_i in re.split(r'[,/]', vcf_i.altbase):
+                keys.append( key_i )
+                alleles.append( allele_hash(vcf_i.refbase, alt_i) )
+                flags.append( flag_i )
+                cnt.append( cnt_i )
+                id_offsets.append( len(ids) )
+                id_lengths.append( len(identifier_i) )
+
+            ids.extend( identifier_i )
+            line_i = vcf_in.readline().rstrip()
+
+    keys    = np.frombuffer(keys,    dtype=np.uint64)
+    alleles = np.frombuffer(alleles, dtype=np.uint64)
+
+    # Sort by coordinate and then allele, where the latest record comes last, and keep only the last of each variant:
+    order = np.lexsort( (np.arange(keys.size), alleles, keys) )
+    keys, alleles = keys[order], alleles[order]
+
+    last_of_variant = np.ones(keys.size, dtype=bool)
+    last_of_variant[:-1] = (keys[1:] != keys[:-1]) | (alleles[1:] != alleles[:-1])
+    order = order[last_of_variant]
+
+    os.makedirs(index_dir, exist_ok=True)
+
+    np.save( os.path.join(index_dir, 'keys.npy'),       keys[last_of_variant] )
+    np.save( os.path.join(index_dir, 'alleles.npy'),    alleles[last_of_variant] )
+    np.save( os.path.join(index_dir, 'flags.npy'),      np.frombuffer(flags,      dtype=np.uint8)[order] )
+    np.save( os.path.join(index_dir, 'cnt.npy'),        np.frombuffer(cnt,        dtype=np.int32)[order] )
+    np.save( os.path.join(index_dir, 'id_offsets.npy'), np.frombuffer(id_offsets, dtype=np.uint64)[order] )
+    np.save( os.path.join(index_dir, 'id_lengths.npy'), np.frombuffer(id_lengths, dtype=np.uint32)[order] )
+    np.save( os.path.join(index_dir, 'ids.npy'),        np.frombuffer(bytes(ids), dtype=np.uint8) )
+
+    with open( os.path.join(index_dir, 'contigs.txt'), 'w' ) as contig_out:
+        for contig_i in contigs:
+            contig_out.write( contig_i + '\n' )
+
+    return int( last_of_variant.sum() )
+
+
+
+class AnnotationRecord:
+    '''What annotate_caller needs from a dbSNP or COSMIC record.'''
+
+    __slots__ = ('identifier', 'common', 'snp', 'cnt')
+
+    def __init__(self, identifier, common, snp, cnt):
+        self.identifier = identifier
+        self.common     = common
+        self.snp        = snp
+        self.cnt        = cnt
+
+
+
+class AnnotationIndex:
+    '''An index from build(), memory-mapped read-only.'''
+
+    def __init__(self, index_dir):
+
+        self.index_dir = index_dir
+
+        for array_i in index_arrays:
+            setattr( self, array_i, np.load(os.path.join(index_dir, array_i + '.npy'), mmap_mode='r') )
+
+        with open( os.path.join(index_dir, 'contigs.txt') ) as contig_in:
+            self.contigs = { contig_i.rstrip('\n'): n for n, contig_i in enumerate(contig_in) }
+
+
+    def lookup(self, variant_id):
+        '''variant_id = ( (contig, position), ref_base, alt_base ). Return an AnnotationRecord, or None if the variant is not in the index.'''
+
+        (contig_i, position_i), ref_base, alt_base = variant_id
+
+        if contig_i not in self.contigs:
+            return None
+
+        key_i = genome.encode_coordinate( self.contigs[contig_i], position_i )
+        first = int( np.searchsorted(self.keys, key_i, 'left') )
+        last  = int( np.searchsorted(self.keys, key_i, 'right') )
+
+        if first == last:
+            return None
+
+        hash_i = allele_hash(ref_base, alt_base)
+        for record_i in range(first, last):
+            if int(self.alleles[record_i]) == hash_i:
+
+                offset_i   = int( self.id_offsets[record_i] )
+                identifier = self.ids[ offset_i : offset_i + int(self.id_lengths[record_i]) ].tobytes().decode()
+                flag_i     = int( self.flags[record_i] )
+                cnt_i      = int( self.cnt[record_i] )
+
+                return AnnotationRecord( identifier, bool(flag_i & flag_common), bool(flag_i & flag_snp), str(cnt_i) if cnt_i >= 0 else None )
+
+        return None
+
+
+    def close(self):
+        for array_i in index_arrays:
+            setattr(self, array_i, None)
+
+
+
+def run():
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-vcf',    '--vcf-file',     type=str, help='dbSNP or COSMIC VCF file', required=True)
+    parser.add_argument('-outdir', '--index-dir',    type=str, help='Directory of the index, which can then be used in place of the VCF file with -dbsnp/-cosmic', required=True)
+
+    args = parser.parse_args()
+
+    return args.vcf_file, args.index_dir
+
+
+if __name__ == '__main__':
+
+    vcf_file, index_dir = run()
+
+    num_variants = build(vcf_file, index_dir)
+    print('{} variants from {} indexed in {}'.format(num_variants, vcf_file, index_dir))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Whole-genome candidate discovery: instead of extracting the features of every position of the genome, count the A/C/G/T bases of a BAM file a tile at a time with pysam's count_coverage,
+# and only keep the positions where some non-reference base has enough reads. The candidates are written into a sorted VCF file for vcf2tsv.
+# Only base substitutions are found this way, since count_coverage does not count insertions and deletions.
+
+import argparse, os, sys
+import numpy as np
+import pysam
+
+MY_DIR = os.path.dirname(os.path.realpath(__file__))
+PRE_DIR = os.path.join(MY_DIR, os.pardir)
+sys.path.append( PRE_DIR )
+
+bases = 'ACGT'
+
+# Reference bases to their row in count_coverage, and -1 for anything else, e.g., N:
+base_index = np.full(256, -1, dtype=np.int8)
+for n, base_i in enumerate(bases):
+    base_index[ ord(base_i) ] = n
+    base_index[ ord(base_i.lower()) ] = n
+
+# Unmapped, secondary, QC-failed and duplicate reads are not counted, like read_callback='all':
+uncounted_flags = 0x4 | 0x100 | 0x200 | 0x400
+
+
+
+def fai_contigs(fai_file):
+    '''(contig, length) in the order of the .fai file'''
+
+    with open(fai_file) as fai:
+        for line_i in fai:
+            item_i = line_i.rstrip('\n').split('\t')
+            yield item_i[0].split(' ')[0], int(item_i[1])
+
+
+
+def alt_evidence_sites(bam, ref_fa, contig, start, end, min_alt_reads=2, min_vaf=0.0, min_mq=1, min_bq=5):
+    '''
+    bam and ref_fa are opened pysam.AlignmentFile and pysam.FastaFile. Return the sites in [start, end) (0-based) with alt evidence,
+    i.e., [ (1-based position, REF, [ALT, ...]), ... ], where the ALT's have at least min_alt_reads reads and min_vaf of the depth, in decreasing order of their reads.
+    '''
+
+    if min_mq > 0:
+        read_callback = lambda read_i: read_i.mapping_quality >= min_mq and not read_i.flag & uncounted_flags
+    else:
+        read_callback = 'all'
+
+    counts = np.array( bam.count_coverage(contig, start, end, quality_threshold=int(min_bq), read_callback=read_callback), dtype=np.int64 )
+    depth  = counts.sum(axis=0)
+
+    ref_seq = ref_fa.fetch(contig, start, end)
+    ref_i   = base_index[ np.frombuffer(ref_seq.encode(), dtype=np.uint8) ]
+
+    # Reads that are not the reference base, where the reference is A/C/G/T:
+    alt_counts = counts.copy()
+    known_ref  = ref_i >= 0
+    alt_counts[ ref_i[known_ref], np.flatnonzero(known_ref) ] = 0
+    alt_counts[ :, ~known_ref ] = 0
+
+    alt_evidence = (alt_counts >= max(min_alt_reads, 1)) & (alt_counts >= min_vaf * depth)
+
+    sites = []
+    for offset_i in np.flatnonzero( alt_evidence.any(axis=0) ):
+        alt_rows = [ row_i for row_i in np.argsort(-alt_counts[:, offset_i], kind='stable') if alt_evidence[row_i, offset_i] ]
+        sites.append( ( start + int(offset_i) + 1, ref_seq[offset_i].upper(), [ bases[row_i] for row_i in alt_rows ] ) )
+
+    return sites
+
+
+
+def write_candidate_vcf(bam_file, ref_fa_file, out_vcf, min_alt_reads=2, min_vaf=0.0, min_mq=1, min_bq=5, tile_size=100000):
+    '''Scan the whole genome in the .fai file of ref_fa_file, and write the sites with alt evidence in the BAM file into out_vcf. Return the number of sites.'''
+
+    num_sites = 0
+
+    with pysam.AlignmentFile(bam_file, reference_filename=ref_fa_file) as bam, pysam.FastaFile(ref_fa_file) as ref_fa, open(out_vcf, 'w') as vcf_out:
+
+        vcf_out.write('##fileformat=VCFv4.1\n')
+        vcf_out.write('##source=candidate_sites.py: at least {} reads and {} of the depth for an ALT\n'.format(min_alt_reads, min_vaf))
+        vcf_out.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n')
+
+        bam_contigs = set(bam.references)
+
+        for contig_i, length_i in fai_contigs(ref_fa_file + '.fai'):
+
+            if contig_i not in bam_contigs:
+                continue
+
+            for start_i in range(0, length_i, tile_size):
+                for position_i, ref_base, alt_bases in alt_evidence_sites(bam, ref_fa, contig_i, start_i, min(start_i + tile_size, length_i), min_alt_reads, min_vaf, min_mq, min_bq):
+                    vcf_out.write( '{}\t{}\t.\t{}\t{}\t.\t.\t.\n'.format(contig_i, position_i, ref_base, ','.join(alt_bases)) )
+                    num_sites += 1
+
+    return num_sites
+
+
+
+def run():
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-bam',     '--bam-file',         type=str,   help='BAM file, e.g., the tumor', required=True)
+    parser.add_argument('-ref',     '--genome-reference', type=str,   help='Reference FASTA file, with its .fai index', required=True)
+    parser.add_argument('-outfile', '--output-vcf',       type=str,   help='Candidate VCF file', required=True)
+    parser.add_argument('-minAlt',  '--min-alt-reads',    type=int,   help='Minimum number of reads of a non-reference base', default=2)
+    parser.add_argument('-minVAF',  '--min-vaf',          type=float, help='Minimum fraction of the depth of a non-reference base', default=0.0)
+    parser.add_argument('-minMQ',   '--minimum-mapping-quality', type=float, help='Reads below this mapping quality are not counted', default=1)
+    parser.add_argument('-minBQ',   '--minimum-base-quality',    type=float, help='Bases below this base quality are not counted', default=5)
+    parser.add_argument('-tile',    '--tile-size',        type=int,   help='Count this many positions at a time', default=100000)
+
+    args = parser.parse_args()
+
+    return vars(args)
+
+
+if __name__ == '__main__':
+
+    args = run()
+
+    num_sites = write_candidate_vcf(args['bam_file'], args['genome_reference'], args['output_vcf'], args['min_alt_reads'], args['min_vaf'], args['minimum_mapping_quality'], args['minimum_base_quality'], args['tile_size'])
+    print('{} candidate sites in {}'.format(num_sites, args['output_vcf']))
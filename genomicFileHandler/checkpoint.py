@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+# Checkpoints of a TSV file that is written in coordinate order, e.g., by vcf2tsv, so a run that was killed can pick up where it left off.
+# Every so many coordinates, the TSV file is flushed to disk and <TSV>.checkpoint records:
+#   tsv_size     size of the TSV file up to the last coordinate that was completely written
+#   rows         number of rows up to there, not counting the header
+#   coordinate   that last coordinate
+#   arguments    the arguments of the run, which have to be the same to resume it
+# The input files are only read forward, so resuming does not need their offsets: the candidates up to the coordinate are skipped,
+# and the supporting VCF files catch up to the next candidate like they always do (and indexed ones only read from there, see regions_after).
+
+import os, sys, json
+
+MY_DIR = os.path.dirname(os.path.realpath(__file__))
+PRE_DIR = os.path.join(MY_DIR, os.pardir)
+sys.path.append( PRE_DIR )
+
+import genomicFileHandler.genomic_file_handlers as genome
+
+
+
+def checkpoint_file(tsv_file):
+    return tsv_file + '.checkpoint'
+
+
+
+def regions_after(regions, chrom_seq, coordinate_code):
+    '''The regions from genome.candidate_regions, without what is up to and including the coordinate.'''
+
+    if regions is None:
+        return None
+
+    contig_i, position_i = genome.decode_coordinate(coordinate_code)
+    remaining = {}
+
+    for contig in regions:
+
+        if contig not in chrom_seq or chrom_seq[contig] > contig_i:
+            remaining[contig] = regions[contig]
+
+        elif chrom_seq[contig] == contig_i:
+            regions_i = [ ( max(first, position_i+1), last ) for first, last in regions[contig] if last > position_i ]
+            if regions_i:
+                remaining[contig] = regions_i
+
+    return remaining
+
+
+
+class TsvCheckpoint:
+
+    def __init__(self, tsv_file, chrom_seq, arguments, every=10000):
+
+        self.tsv_file  = tsv_file
+        self.chrom_seq = chrom_seq
+        self.every     = every
+        self.rows       = 0
+        self.countdown  = every
+        self.coordinate = None
+
+        # Only what can be written into JSON, and compared as such:
+        self.arguments = json.loads( json.dumps(arguments, default=str) )
+
+
+    def resume(self):
+        '''
+        Truncate the TSV file to the last checkpoint. Return the coordinate code of that checkpoint,
+        or None if there is no checkpoint to resume from, in which case the TSV file is to be written from the start.
+        '''
+
+        if not os.path.exists( checkpoint_file(self.tsv_file) ):
+            return None
+
+        with open( checkpoint_file(self.tsv_file) ) as checkpoint_in:
+            checkpoint = json.load(checkpoint_in)
+
+        if checkpoint['arguments'] != self.arguments:
+            changed = sorted( key_i for key_i in checkpoint['arguments'].keys() | self.arguments.keys() if checkpoint['arguments'].get(key_i) != self.arguments.get(key_i) )
+            raise Exception( '{} was checkpointed with different arguments: {}'.format(self.tsv_file, ', '.join(changed)) )
+
+        if not os.path.exists(self.tsv_file) or os.path.getsize(self.tsv_file) < checkpoint['tsv_size']:
+            raise Exception( '{} is shorter than its checkpoint.'.format(self.tsv_file) )
+
+        os.truncate( self.tsv_file, checkpoint['tsv_size'] )
+        self.rows       = checkpoint['rows']
+        self.coordinate = tuple( checkpoint['coordinate'] )
+
+        return genome.coordinate_code( self.coordinate, self.chrom_seq )
+
+
+    def done(self, coordinate, outhandle, rows):
+        '''All the rows of the coordinate have been written into outhandle. Checkpoint every so many coordinates.'''
+
+        self.rows += rows
+
+        if self.every > 0:
+            self.countdown -= 1
+            if self.countdown <= 0:
+                self.save(coordinate, outhandle)
+                self.countdown = self.every
+
+
+    def save(self, coordinate, outhandle):
+
+        # The TSV file has to be on disk before the checkpoint that points into it:
+        outhandle.flush()
+        os.fsync( outhandle.fileno() )
+
+        checkpoint = {'tsv_size':   os.fstat( outhandle.fileno() ).st_size,
+                      'rows':       self.rows,
+                      'coordinate': [ coordinate[0], coordinate[1] ],
+                      'arguments':  self.arguments}
+
+        # Replace the previous checkpoint all at once:
+        temp_file = checkpoint_file(self.tsv_file) + '.tmp'
+        with open(temp_file, 'w') as checkpoint_out:
+            json.dump(checkpoint, checkpoint_out)
+            checkpoint_out.flush()
+            os.fsync( checkpoint_out.fileno() )
+
+        os.replace( temp_file, checkpoint_file(self.tsv_file) )
+
+
+    def remove(self):
+        '''The TSV file is complete.'''
+        if os.path.exists( checkpoint_file(self.tsv_file) ):
+            os.remove( checkpoint_file(self.tsv_file) )
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+
+# Columnar, binary copies of the Ensemble TSV files, so the next stages do not have to parse the features out of text again.
+# vcf2tsv (-columnar) writes Arrow IPC (Feather) files, which need pyarrow, because they are what the R classifiers can read.
+# This script also converts a TSV file into a Parquet file if its name ends with .parquet, or otherwise, into a directory of NumPy .npz files, one per chunk of rows, which tsv2vcf reads as well:
+#   columns.txt       column names, in the order of the TSV header, each followed by its number of decimals if the TSV prints it with a fixed number of them, e.g., the p-values
+#   chunk_00000.npz   one array per column: CHROM, ID, REF, ALT as strings, POS as int64, everything else as float64 (nan for missing values)
+# Like read.table in R, the numbers are kept as numbers, e.g., "0.50" in the TSV is 0.5 here, but they are printed back as "0.50" when the columnar file is read as a TSV file.
+
+import argparse, os, sys, math, json
+import numpy as np
+
+MY_DIR = os.path.dirname(os.path.realpath(__file__))
+PRE_DIR = os.path.join(MY_DIR, os.pardir)
+sys.path.append( PRE_DIR )
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+string_columns  = ('CHROM', 'ID', 'REF', 'ALT')
+integer_columns = ('POS',)
+
+arrow_suffixes = ('.feather', '.arrow', '.parquet')
+
+# What the R classifiers can read (arrow::read_feather), so the only formats vcf2tsv writes:
+feather_suffixes = ('.feather', '.arrow')
+
+
+
+def is_columnar(path):
+    return path.endswith(arrow_suffixes) or os.path.exists( os.path.join(path, 'columns.txt') )
+
+
+
+def check_feather(path):
+    '''The columnar output of vcf2tsv has to be a Feather file, which both tsv2vcf and the R classifiers read.'''
+
+    if not path.endswith(feather_suffixes):
+        raise Exception('{} should end with .feather or .arrow, the columnar files the R classifiers can read.'.format(path))
+
+    if not pyarrow:
+        raise Exception('{} needs pyarrow.'.format(path))
+
+
+
+def column_type(column):
+    if column in string_columns:
+        return str
+    elif column in integer_columns:
+        return int
+    else:
+        return float
+
+
+
+class ColumnarWriter:
+    '''Write rows, i.e., the same keyword arguments as the TSV header's format(), chunk_size rows at a time.'''
+
+    def __init__(self, path, columns, chunk_size=65536):
+
+        self.path       = path
+        self.columns    = list(columns)
+        self.chunk_size = chunk_size
+        self.num_chunks = 0
+        self.arrow_out  = None
+        self.decimals   = dict.fromkeys(self.columns)
+        self._clear()
+
+        self.use_arrow = path.endswith(arrow_suffixes)
+
+        if self.use_arrow and not pyarrow:
+            raise Exception('{} needs pyarrow.'.format(path))
+
+        # Overwrite the chunks of an earlier run, if any:
+        if not self.use_arrow:
+            os.makedirs(path, exist_ok=True)
+            for file_i in os.listdir(path):
+                if file_i.startswith('chunk_') and file_i.endswith('.npz'):
+                    os.remove( os.path.join(path, file_i) )
+
+
+    def _clear(self):
+        self.buffer = { column_i: [] for column_i in self.columns }
+        self.num_rows = 0
+
+
+    def write(self, row):
+
+        for column_i in self.columns:
+            value_i = row[column_i]
+            type_i  = column_type(column_i)
+
+            if type_i is str:
+                self.buffer[column_i].append( str(value_i) )
+
+            else:
+                # Numbers formatted like '%.2f' % x, in the first chunk:
+                if self.num_chunks == 0:
+                    self.decimals[column_i] = text_decimals( value_i, self.decimals[column_i] )
+
+                try:
+                    value_i = float(value_i)
+                except ValueError:
+                    raise Exception('{}={} is not a number.'.format(column_i, value_i))
+
+                self.buffer[column_i].append( value_i )
+
+        self.num_rows += 1
+        if self.num_rows >= self.chunk_size:
+            self.flush()
+
+
+    def flush(self):
+
+        if self.num_rows == 0 and self.num_chunks > 0:
+            return
+
+        arrays = {}
+        for column_i in self.columns:
+            type_i = column_type(column_i)
+            if type_i is str:
+                arrays[column_i] = pyarrow.array(self.buffer[column_i], type=pyarrow.string()) if self.use_arrow else np.array(self.buffer[column_i], dtype=str)
+            elif type_i is int:
+                arrays[column_i] = np.array( self.buffer[column_i], dtype=np.float64 ).astype(np.int64)
+            else:
+                arrays[column_i] = np.array( self.buffer[column_i], dtype=np.float64 )
+
+        decimals = { column_i: decimals_i for column_i, decimals_i in self.decimals.items() if isinstance(decimals_i, int) and decimals_i > 0 }
+
+        if self.use_arrow:
+            table = pyarrow.Table.from_arrays( [ arrays[column_i] for column_i in self.columns ], names=self.columns, metadata={'decimals': json.dumps(decimals)} )
+
+            if not self.arrow_out:
+                if self.path.endswith('.parquet'):
+                    self.arrow_out = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+                else:
+                    self.arrow_out = pyarrow.ipc.new_file(self.path, table.schema)
+
+            self.arrow_out.write_table(table)
+
+        else:
+            if self.num_chunks == 0:
+                with open( os.path.join(self.path, 'columns.txt'), 'w' ) as columns_out:
+                    for column_i in self.columns:
+                        columns_out.write( '\t'.join( [column_i, str(decimals[column_i])] if column_i in decimals else [column_i] ) + '\n' )
+
+            # Column names may not be valid file names inside the .npz, so they are numbered in the order of columns.txt:
+            np.savez( os.path.join(self.path, 'chunk_{:05d}.npz'.format(self.num_chunks)), **{ 'column_{}'.format(n): arrays[column_i] for n, column_i in enumerate(self.columns) } )
+
+        self.num_chunks += 1
+        self._clear()
+
+
+    def close(self):
+        self.flush()
+        if self.arrow_out:
+            self.arrow_out.close()
+            self.arrow_out = None
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+def read_columns(path):
+    '''Column names, their decimals, and then the chunks, each a dictionary of numpy arrays.'''
+
+    if os.path.isdir(path):
+
+        columns  = []
+        decimals = {}
+        with open( os.path.join(path, 'columns.txt') ) as columns_in:
+            for line_i in columns_in:
+                item_i = line_i.rstrip('\n').split('\t')
+                columns.append( item_i[0] )
+                if len(item_i) > 1:
+                    decimals[ item_i[0] ] = int( item_i[1] )
+
+        def chunks():
+            chunk_files = sorted( file_i for file_i in os.listdir(path) if file_i.startswith('chunk_') and file_i.endswith('.npz') )
+            for chunk_file in chunk_files:
+                with np.load( os.path.join(path, chunk_file) ) as chunk_i:
+                    yield { column_i: chunk_i['column_{}'.format(n)] for n, column_i in enumerate(columns) }
+
+        return columns, decimals, chunks()
+
+    if not pyarrow:
+        raise Exception('{} needs pyarrow.'.format(path))
+
+    if path.endswith('.parquet'):
+        arrow_in = pyarrow.parquet.ParquetFile(path)
+        schema   = arrow_in.schema_arrow
+        batches  = arrow_in.iter_batches()
+    else:
+        arrow_in = pyarrow.ipc.open_file(path)
+        schema   = arrow_in.schema
+        batches  = ( arrow_in.get_batch(n) for n in range(arrow_in.num_record_batches) )
+
+    columns  = schema.names
+    decimals = json.loads( (schema.metadata or {}).get(b'decimals', b'{}') )
+
+    def chunks():
+        for batch_i in batches:
+            yield { column_i: batch_i.column(n).to_numpy(zero_copy_only=False) for n, column_i in enumerate(columns) }
+
+    return columns, decimals, chunks()
+
+
+
+def text_decimals(value, decimals):
+    '''
+    The number of decimals of a column so far, after the value:
+    a string like '0.50' has a fixed number of decimals, i.e., 2, whereas other numbers have none (False). Columns with nothing but nan have None.
+    '''
+
+    if value == 'nan' or ( isinstance(value, float) and math.isnan(value) ):
+        return decimals
+
+    if isinstance(value, str) and '.' in value and 'e' not in value:
+        decimals_i = len(value) - value.index('.') - 1
+    else:
+        decimals_i = False
+
+    if decimals is None:
+        return decimals_i
+    else:
+        return decimals if decimals == decimals_i else False
+
+
+
+def text_value(value, decimals=None):
+    '''The numbers the way they look in the TSV files: nan, the fixed number of decimals if any, otherwise integers without the decimal point and the shortest decimal that reads back the same.'''
+
+    if isinstance(value, str):
+        return value
+
+    value = float(value)
+    if math.isnan(value):
+        return 'nan'
+    elif decimals:
+        return '{:.{}f}'.format(value, decimals)
+    elif value.is_integer():
+        return str( int(value) )
+    else:
+        return repr(value)
+
+
+
+class ColumnarTsv:
+    '''Read a columnar file with readline(), one TSV line at a time with the header first, for code that reads the TSV files.'''
+
+    def __init__(self, path):
+        self.columns, self.decimals, self.chunks = read_columns(path)
+        self.lines = iter( ( '\t'.join(self.columns) + '\n', ) )
+
+
+    def _next_chunk(self):
+        chunk_i = next(self.chunks, None)
+        if chunk_i is None:
+            return False
+
+        column_values = [ chunk_i[column_i].tolist() for column_i in self.columns ]
+        column_decimals = [ self.decimals.get(column_i) for column_i in self.columns ]
+        self.lines = ( '\t'.join( map(text_value, row_i, column_decimals) ) + '\n' for row_i in zip(*column_values) )
+        return True
+
+
+    def readline(self):
+        while True:
+            line_i = next(self.lines, None)
+            if line_i is not None:
+                return line_i
+            if not self._next_chunk():
+                return ''
+
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+
+    def close(self):
+        self.chunks.close()
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+def open_tsv(path):
+    '''Open a TSV file, or a columnar file as if it were one.'''
+    return ColumnarTsv(path) if is_columnar(path) else open(path)
+
+
+
+def to_tsv(path, tsv_file):
+    '''Convert a columnar file back to a TSV file, e.g., for read.table in R.'''
+
+    with ColumnarTsv(path) as columnar_in, open(tsv_file, 'w') as tsv_out:
+        for line_i in columnar_in:
+            tsv_out.write( line_i )
+
+
+
+def from_tsv(tsv_file, path, chunk_size=65536):
+    '''Convert a TSV file from vcf2tsv to a columnar file.'''
+
+    with open(tsv_file) as tsv_in:
+
+        columns = tsv_in.readline().rstrip('\n').split('\t')
+
+        with ColumnarWriter(path, columns, chunk_size) as columnar_out:
+            for line_i in tsv_in:
+                columnar_out.write( dict( zip(columns, line_i.rstrip('\n').split('\t')) ) )
+
+
+
+def run():
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-infile',  '--input-file',  type=str, help='TSV file from vcf2tsv, or a columnar file', required=True)
+    parser.add_argument('-outfile', '--output-file', type=str, help='Columnar file (.feather, .parquet, or otherwise a directory of .npz chunks) if the input is a TSV file, otherwise TSV file', required=True)
+
+    args = parser.parse_args()
+
+    return args.input_file, args.output_file
+
+
+if __name__ == '__main__':
+
+    infile, outfile = run()
+
+    if is_columnar(infile):
+        to_tsv(infile, outfile)
+    else:
+        from_tsv(infile, outfile)
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
-from pysam import AlignmentFile
-import sys, os, gzip, re, math
+from pysam import AlignmentFile, TabixFile
+from itertools import chain
+import sys, os, gzip, re, math, heapq
 
 # The regular expression pattern for "chrXX 1234567" in both VarScan2 Output and VCF files:
 pattern_major_chr_position = re.compile(r'^(?:chr)?(?:[1-9]|1[0-9]|2[0-2]|[XY]|MT?)\t[0-9]+\b')
@@ -24,66 +25,165 @@ AA_1to3 = {"A": "Ala", "R": "Arg", "N": "Asn", "D": "Asp", "C": "Cys", "E": "Glu
 
 ### ### ### ### ### MAJOR CLASSES ### ### ### ### ###
 class Vcf_line:
-    '''Each instance of this object is a line from the vcf file (no header).'''
+    '''
+    Each instance of this object is a line from the vcf file (no header).
+    The line is only split into columns when one of them is first accessed, and the INFO and sample columns are parsed into dictionaries at most once.
+    '''
+
+    columns = ('chromosome', 'position', 'identifier', 'refbase', 'altbase', 'qual', 'filters', 'info', 'has_samples', 'field', 'samples')
+
+    __slots__ = ('vcf_line', '_info_cache', '_sample_cache') + columns
 
     def __init__(self, vcf_line):
 
         '''Argument is a line in pileup file.'''
-        self.vcf_line = vcf_line.rstrip('\n')
+        self.vcf_line      = vcf_line.rstrip('\n')
+        self._info_cache   = None
+        self._sample_cache = {}
+
+
+    def __getattr__(self, name):
+        '''Only called for a column that has not been split out of the line yet.'''
+
+        if name not in Vcf_line.columns:
+            raise AttributeError(name)
+
+        self._split_columns()
+
+        return object.__getattribute__(self, name)
+
+
+    def _split_columns(self):
 
         try:
-            self.chromosome, self.position, self.identifier, self.refbase, self.altbase, self.qual, self.filters, self.info, *self.has_samples = vcf_line.rstrip('\n').split('\t')
-            self.position = int(self.position)
+            chromosome, position, identifier, refbase, altbase, qual, filters, info, *has_samples = self.vcf_line.split('\t')
+            position = int(position)
 
             try:
-                self.field, *self.samples = self.has_samples
+                field, *samples = has_samples
             except ValueError:
-                self.field = self.samples = ''
+                field = samples = ''
 
         except ValueError:
-            self.chromosome = self.identifier = self.refbase = self.altbase = self.qual = self.filters = self.info = self.field = self.samples = ''
-            self.position = None
+            chromosome = identifier = refbase = altbase = qual = filters = info = field = samples = ''
+            position = None
+            has_samples = []
+
+        for column_i, value_i in zip(Vcf_line.columns, (chromosome, position, identifier, refbase, altbase, qual, filters, info, has_samples, field, samples)):
+
+            # Keep the columns that have been assigned already, e.g., vcf_i.altbase = alt_i
+            try:
+                getattr(Vcf_line, column_i).__get__(self)
+            except AttributeError:
+                object.__setattr__(self, column_i, value_i)
+
+
+    def __copy__(self):
+
+        vcf_copy = Vcf_line.__new__(Vcf_line)
+
+        for slot_i in Vcf_line.__slots__:
+            try:
+                object.__setattr__( vcf_copy, slot_i, getattr(Vcf_line, slot_i).__get__(self) )
+            except AttributeError:
+                pass
+
+        vcf_copy._sample_cache = dict(self._sample_cache)
+
+        return vcf_copy
+
+
+    def __getstate__(self):
+        return self.vcf_line, { column_i: getattr(self, column_i) for column_i in Vcf_line.columns }
+
+
+    def __setstate__(self, state):
+
+        vcf_line, column_values = state
+
+        self.vcf_line      = vcf_line
+        self._info_cache   = None
+        self._sample_cache = {}
+
+        for column_i, value_i in column_values.items():
+            object.__setattr__(self, column_i, value_i)
 
 
     def get_info_items(self):
         return self.info.split(';')
 
 
+    def get_info_values(self):
+        '''The INFO column as a dictionary, where a flag without "=" is True. It is parsed again only if self.info has been changed.'''
+
+        info = self.info
+
+        if self._info_cache is None or self._info_cache[0] is not info:
+
+            info_values = {}
+            for item_i in info.split(';'):
+                key_i, has_value, value_i = item_i.partition('=')
+
+                if key_i not in info_values:
+                    info_values[key_i] = value_i if has_value else True
+
+            self._info_cache = (info, info_values, {})
+
+        return self._info_cache[1]
+
+
     def get_info_value(self, variable):
 
-        key_item = re.search(r'\b{}=([^;\s]+)([;\W]|$)'.format(variable), self.vcf_line)
+        value_i = self.get_info_values().get(variable, False)
 
-        # The key has a value attached to it, e.g., VAR=1,2,3
-        if key_item:
-            return key_item.groups()[0]
+        # The key has a value attached to it, e.g., VAR=1,2,3, or it's simply a flag without "="
+        return value_i if value_i != '' else False
 
-        # Perhaps it's simply a flag without "="
-        else:
-            key_item = self.info.split(';')
-            return True if variable in key_item else False
+
+    def get_info_number(self, variable, number_type=float):
+        '''number_type( get_info_value(variable) ), or nan if the INFO column does not have it. The converted values are cached as well.'''
+
+        self.get_info_values()
+        typed_values = self._info_cache[2]
+
+        try:
+            return typed_values[variable, number_type]
+
+        except KeyError:
+            value_i = self.get_info_value(variable)
+            typed_values[variable, number_type] = number_i = number_type(value_i) if value_i else nan
+
+            return number_i
 
 
     def get_sample_variable(self):
         return self.field.split(':')
 
 
+    def get_sample_values(self, idx=0):
+        '''The idx'th sample column as a dictionary. It is parsed again only if self.field or the sample column has been changed.'''
+
+        field     = self.field
+        sample_i  = self.samples[idx]
+        cached_i  = self._sample_cache.get(idx)
+
+        if cached_i is None or cached_i[0] is not field or cached_i[1] is not sample_i:
+            cached_i = self._sample_cache[idx] = (field, sample_i, dict( zip(field.split(':'), sample_i.split(':')) ))
+
+        return cached_i[2]
+
+
     def get_sample_item(self, idx=0, out_type='d'):
         '''d to output a dictionary. l to output a tuple of lists'''
 
         if out_type.lower() == 'd':
-            return dict( zip(self.get_sample_variable(), self.samples[idx].split(':') ) )
+            return dict( self.get_sample_values(idx) )
         elif out_type.lower() == 'l':
             return ( self.get_sample_variable(), self.samples[idx].split(':') )
 
 
     def get_sample_value(self, variable, idx=0):
-
-        var2value = dict( zip( self.field.split(':'), self.samples[idx].split(':') ))
-
-        try:
-            return var2value[variable]
-        except KeyError:
-            return None
+        return self.get_sample_values(idx).get(variable)
 
 
 
@@ -161,8 +261,37 @@ def faiordict2contigorder(file_name, file_format):
 
 
 
+class LineStream:
+    '''Lines from an iterator, e.g., a generator of VCF lines, that are read like an opened text file, i.e., readline() and with.'''
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+
+    def readline(self):
+        return next(self.lines, '')
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def close(self):
+        # Let a generator close the files it has opened:
+        if hasattr(self.lines, 'close'):
+            self.lines.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
 def open_textfile(file_name):
 
+    # Lines that are already streaming, e.g., from a previous step, rather than a file:
+    if not isinstance(file_name, str):
+        return file_name if hasattr(file_name, 'readline') else LineStream(file_name)
+
     # See if the input file is a .gz file:
     if file_name.lower().endswith('.gz'):
         return gzip.open(file_name, 'rt')
@@ -172,6 +301,172 @@ def open_textfile(file_name):
 
 
 
+def open_output(file_name):
+    '''Open a file to write, unless it is already something to write into, e.g., a vcfIntersector.VcfSorter.'''
+    return open(file_name, 'w') if isinstance(file_name, str) else file_name
+
+
+
+def tabix_index(file_name):
+    '''The .tbi or .csi index of a bgzipped file, or None if there is none.'''
+
+    if file_name.lower().endswith('.gz'):
+        for index_suffix in ('.tbi', '.csi'):
+            if os.path.exists(file_name + index_suffix):
+                return file_name + index_suffix
+
+    return None
+
+
+
+def candidate_regions(file_name, file_format, max_gap=100000):
+    '''
+    Where the candidate sites are, i.e., {contig: [(first position, last position), ...]} (1-based, inclusive), where file_format is vcf, bed, or pos.
+    Sites that are less than max_gap apart are lumped into the same region, so an indexed file is queried a handful of times rather than once per site.
+    '''
+
+    assert file_format in ('vcf', 'bed', 'pos')
+
+    sites = {}
+    with open_textfile(file_name) as site_file:
+        for line_i in site_file:
+
+            if line_i.startswith('#') or line_i.startswith('track='):
+                continue
+
+            item_i = line_i.rstrip('\n').split('\t')
+            if len(item_i) < 2:
+                continue
+
+            if file_format == 'bed':
+                sites.setdefault(item_i[0], []).append( (int(item_i[1])+1, int(item_i[2])) )
+            else:
+                sites.setdefault(item_i[0], []).append( (int(item_i[1]), int(item_i[1])) )
+
+    regions = {}
+    for contig_i in sites:
+
+        regions_i = regions[contig_i] = []
+        for first_i, last_i in sorted( sites[contig_i] ):
+
+            if regions_i and first_i <= regions_i[-1][1] + max_gap:
+                regions_i[-1] = ( regions_i[-1][0], max(last_i, regions_i[-1][1]) )
+            else:
+                regions_i.append( (first_i, last_i) )
+
+    return regions
+
+
+
+class TabixVcfStream:
+    '''
+    A bgzipped and indexed VCF file that reads like an opened text file (i.e., readline), but only within the regions from candidate_regions, contig by contig in the order of chrom_seq.
+    The header is not included, so skip_vcf_header just reads the first line.
+    '''
+
+    def __init__(self, file_name, regions, chrom_seq, index_file=None):
+
+        self.name  = file_name
+        self.tabix = TabixFile(file_name, index=index_file or tabix_index(file_name))
+
+        indexed_contigs = set(self.tabix.contigs)
+        contigs = sorted( [contig_i for contig_i in regions if contig_i in indexed_contigs], key=lambda contig_i: chrom_seq[contig_i] )
+
+        self.lines = chain.from_iterable( self._fetch(contig_i, first_i, last_i) for contig_i in contigs for first_i, last_i in regions[contig_i] )
+
+
+    def _fetch(self, contig_i, first_i, last_i):
+
+        for line_i in self.tabix.fetch(contig_i, max(0, first_i-1), last_i):
+
+            # Records that only overlap the region (e.g., deletions starting earlier) have been returned by the previous region, if at all:
+            if int( line_i.split('\t', 2)[1] ) >= first_i:
+                yield line_i
+
+
+    def readline(self):
+        line_i = next(self.lines, None)
+        return '' if line_i is None else line_i + '\n'
+
+
+    def close(self):
+        self.tabix.close()
+
+
+
+def open_vcf_region(file_name, regions, chrom_seq):
+    '''
+    If the VCF file is bgzipped and indexed, only read it within the regions (see candidate_regions). Otherwise, stream through the whole file as usual.
+    regions=None always streams the whole file.
+    '''
+
+    index_file = tabix_index(file_name) if regions is not None else None
+
+    if index_file:
+        return TabixVcfStream(file_name, regions, chrom_seq, index_file)
+    else:
+        return open_textfile(file_name)
+
+
+
+def split_vcf(vcf_file, num_chunks, out_prefix):
+    '''
+    Split a sorted VCF file into (up to) num_chunks contiguous VCF files with about the same number of lines, i.e., out_prefix + '1.vcf', out_prefix + '2.vcf', etc., each with the header.
+    Lines at the same coordinate are kept in the same file. Return the list of files in order.
+    '''
+
+    header    = []
+    num_lines = 0
+    with open_textfile(vcf_file) as vcf_in:
+        for line_i in vcf_in:
+            if line_i.startswith('#'):
+                header.append( line_i )
+            else:
+                num_lines += 1
+
+    lines_per_chunk = max(1, math.ceil(num_lines / num_chunks))
+    chunk_files     = []
+
+    with open_textfile(vcf_file) as vcf_in:
+
+        chunk_out = None
+        lines_in_chunk = 0
+        last_coordinate = None
+
+        for line_i in vcf_in:
+
+            if line_i.startswith('#'):
+                continue
+
+            coordinate_i = line_i.split('\t', 2)[:2]
+
+            if chunk_out is None or ( lines_in_chunk >= lines_per_chunk and coordinate_i != last_coordinate ):
+
+                if chunk_out:
+                    chunk_out.close()
+
+                chunk_files.append( '{}{}.vcf'.format(out_prefix, len(chunk_files)+1) )
+                chunk_out = open(chunk_files[-1], 'w')
+                chunk_out.writelines( header )
+                lines_in_chunk = 0
+
+            chunk_out.write( line_i )
+            lines_in_chunk += 1
+            last_coordinate = coordinate_i
+
+        if chunk_out:
+            chunk_out.close()
+
+    # Nothing but the header:
+    if not chunk_files:
+        chunk_files.append( '{}1.vcf'.format(out_prefix) )
+        with open(chunk_files[-1], 'w') as chunk_out:
+            chunk_out.writelines( header )
+
+    return chunk_files
+
+
+
 def open_bam_file(file_name):
 
     try:
@@ -257,14 +552,8 @@ def count_repeating_bases(sequence):
 
 
 def numeric_id(chr_i, pos_i, contig_seq):
-
-    chr_i = contig_seq[chr_i]
-    numeric_chr_i = float(chr_i) * 1000000000000
-    numeric_pos_i = float(pos_i)
-
-    numeric_i = numeric_chr_i + numeric_pos_i
-
-    return numeric_i
+    '''The integer code of the coordinate, i.e., encode_coordinate(contig_seq[chr_i], pos_i)'''
+    return encode_coordinate( contig_index(chr_i, contig_seq), int(pos_i) )
 
 
 
@@ -280,69 +569,82 @@ chrom_seq = {}
 for n,contig_i in enumerate(chrom_sequence):
     chrom_seq[contig_i] = n
 
-def whoisbehind(coord_0, coord_1, chrom_sequence):
-    '''
-    coord_0 and coord_1 are two strings or two lists, specifying the chromosome, a (typically) tab, and then the location.
-    Return the index where the coordinate is behind. Return 10 if they are the same position.
-    '''
 
-    end_of_0 = end_of_1 = False
+# A coordinate is encoded as a single 64-bit integer, i.e., the contig index (e.g., from faiordict2contigorder) in the upper bits and the position in the lower 32 bits,
+# so that coordinates are compared as plain integers. The end of a file is larger than any coordinate, i.e., it's always ahead.
+position_bits = 32
+end_of_file   = (1 << 63) - 1
 
-    if coord_0 == '' or coord_0==['',''] or coord_0==('','') or not coord_0:
-        end_of_0 = True
+def encode_coordinate(contig_idx, position):
+    return (contig_idx << position_bits) | position
 
-    if coord_1 == '' or coord_1==['',''] or coord_1==('','') or not coord_1:
-        end_of_1 = True
 
-    if end_of_0 and end_of_1:
-        return 10
+def decode_coordinate(coordinate_code):
+    '''Return (contig index, position)'''
+    return coordinate_code >> position_bits, coordinate_code & ((1 << position_bits) - 1)
 
-    elif end_of_1:
-        return 0
 
-    elif end_of_0:
-        return 1
+def contig_index(contig_i, chrom_sequence):
+    '''chrom_sequence is either a dictionary, i.e., chrom_seq['chr1'] == 0, or a list of contigs in order.'''
 
+    if isinstance(chrom_sequence, dict):
+        return chrom_sequence[contig_i]
     else:
+        return chrom_sequence.index(contig_i)
 
-        if isinstance(coord_0, str):
-            chrom0, position0 = coord_0.split()
-        elif isinstance(coord_0, list) or isinstance(coord_0, tuple):
-            chrom0, position0 = coord_0[0], coord_0[1]
 
-        if isinstance(coord_1, str):
-            chrom1, position1 = coord_1.split()
-        elif isinstance(coord_1, list) or isinstance(coord_1, tuple):
-            chrom1, position1 = coord_1[0], coord_1[1]
+def coordinate_code(coordinate, chrom_sequence):
+    '''
+    Encode a coordinate given as a string, i.e., the chromosome, a (typically) tab, and then the location, or as a (chromosome, location) list or tuple.
+    An empty coordinate is the end of a file. An integer is taken to be encoded already.
+    '''
 
-        if isinstance(chrom_sequence, dict):
-            chrom0_position = chrom_sequence[chrom0]
-            chrom1_position = chrom_sequence[chrom1]
-        elif isinstance(chrom_sequence, list) or isinstance(chrom_sequence, tuple):
-            chrom0_position = chrom_sequence.index(chrom0)
-            chrom1_position = chrom_sequence.index(chrom1)
+    if isinstance(coordinate, int):
+        return coordinate
 
-        if chrom0_position < chrom1_position:
-            return 0   # 1st coordinate is ahead
+    elif coordinate == '' or coordinate==['',''] or coordinate==('','') or not coordinate:
+        return end_of_file
 
-        elif chrom0_position > chrom1_position:
-            return 1   # 1st coordinate is ahead
+    elif isinstance(coordinate, str):
+        contig_i, position_i = coordinate.split()
 
-        # Must be in the same chromosome
-        else:
+    else:
+        contig_i, position_i = coordinate[0], coordinate[1]
+
+    return encode_coordinate( contig_index(contig_i, chrom_sequence), int(position_i) )
+
+
+def line_coordinate_code(line_i, chrom_sequence):
+    '''Encode the coordinate at the start of a line (e.g., VCF, BED, or pileup). A line without a coordinate, e.g., the end of a file, is end_of_file.'''
+
+    coordinate_i = pattern_chr_position.match( line_i )
+
+    if coordinate_i:
+        contig_i, position_i = coordinate_i.group().split('\t')
+        return encode_coordinate( contig_index(contig_i, chrom_sequence), int(position_i) )
+    else:
+        return end_of_file
 
-            position0 = int(position0)
-            position1 = int(position1)
 
-            if position0 < position1:
-                return 0
 
-            elif position0 > position1:
-                return 1
+def whoisbehind(coord_0, coord_1, chrom_sequence):
+    '''
+    coord_0 and coord_1 are two strings or two lists, specifying the chromosome, a (typically) tab, and then the location, or two encoded integers (see coordinate_code).
+    Return the index where the coordinate is behind. Return 10 if they are the same position.
+    '''
 
-            # Same chromosome, same position, then same coordinate:
-            elif position0 == position1:
-                return 10
+    code_0 = coordinate_code(coord_0, chrom_sequence)
+    code_1 = coordinate_code(coord_1, chrom_sequence)
+
+    if code_0 < code_1:
+        return 0   # 1st coordinate is behind
+
+    elif code_0 > code_1:
+        return 1   # 2nd coordinate is behind
+
+    # Same chromosome, same position, then same coordinate:
+    else:
+        return 10
 
 
 
@@ -398,50 +700,16 @@ def catchup(coordinate_i, line_j, filehandle_j, chrom_sequence):
     Returns (False, Vcf_line_j) if the j_th vcf file does not contain such an entry, and therefore the function has run past the i_th coordinate, by which time the programmer can decide to move into the next i_th coordiate.
     '''
 
-    coordinate_j = re.match( pattern_chr_position, line_j )
-
-    if coordinate_j:
-        coordinate_j = coordinate_j.group()
-    else:
-        coordinate_j = ''
-
-    # Which coordinate is behind?
-    is_behind = whoisbehind( coordinate_i, coordinate_j, chrom_sequence )
-
-    # The file_j is already ahead, return the same line_j, but tag it "False"
-    if is_behind == 0:
-        reporter = (False, line_j)
-
-    # The two coordinates are the same, return the same line_j, but tag it "True"
-    elif is_behind == 10:
-        reporter = (True, line_j)
-
-    # If file_j is behind, then needs to catch up:
-    elif is_behind == 1:
+    code_i = coordinate_code( coordinate_i, chrom_sequence )
+    code_j = line_coordinate_code( line_j, chrom_sequence )
 
-        # Keep at it until line_j is no longer behind:
-        while is_behind == 1:
+    # If file_j is behind, then needs to catch up, i.e., keep at it until line_j is no longer behind:
+    while code_j < code_i:
+        line_j = filehandle_j.readline().rstrip()
+        code_j = line_coordinate_code( line_j, chrom_sequence )
 
-            # Catch up
-            line_j = filehandle_j.readline().rstrip()
-            next_coord = re.match( pattern_chr_position, line_j )
-
-            if next_coord:
-                coordinate_j = next_coord.group()
-            else:
-                coordinate_j = ''
-
-            is_behind = whoisbehind( coordinate_i, coordinate_j, chrom_sequence )
-
-        # If file_j has caught up exactly to the position of coordinate_i:
-        if is_behind == 10:
-            reporter = (True, line_j)
-
-        # If file_j has run past coordinate_i:
-        elif is_behind == 0:
-            reporter = (False, line_j)
-
-    return reporter
+    # True if file_j has caught up exactly to the position of coordinate_i, False if it has run past coordinate_i:
+    return (code_j == code_i, line_j)
 
 
 
@@ -460,126 +728,158 @@ def catchup_multilines(coordinate_i, line_j, filehandle_j, chrom_sequence):
     Returns (False, []        , line_j) if the j_th vcf file does not contain such an entry, and therefore the function has run past the i_th coordinate, by which time the programmer can decide to move into the next i_th coordiate.
     '''
 
-    coordinate_j = re.match( pattern_chr_position, line_j )
+    code_i = coordinate_code( coordinate_i, chrom_sequence )
+    code_j = line_coordinate_code( line_j, chrom_sequence )
 
-    if coordinate_j:
-        coordinate_j = coordinate_j.group()
-    else:
-        coordinate_j = ''
+    # If file_j is behind, then needs to catch up:
+    # This is an opportunity to check if the vcf_j file is properly sorted, by asserting current line cannot be "behind" a subsequent line
+    while code_j < code_i:
+
+        line_j = filehandle_j.readline().rstrip()
+        next_code = line_coordinate_code( line_j, chrom_sequence )
 
-    # Which coordinate is behind?
-    is_behind = whoisbehind( coordinate_i, coordinate_j, chrom_sequence )
+        if next_code < code_j:
+            raise Exception('{} does not seem to be properly sorted'.format(filehandle_j.name) )
+
+        code_j = next_code
 
     # The file_j is already ahead, return the same line_j, but tag it "False"
-    if is_behind == 0:
-        reporter = (False, [], line_j)
+    if code_j > code_i:
+        return (False, [], line_j)
 
-    # The two coordinates are the same, return the same line_j, but tag it "True"
-    elif is_behind == 10:
+    # The two coordinates are the same. Create a list, initiated with the current line, and keep reading while the next line (still) has the same coordinate:
+    lines_of_coordinate_i = [ line_j ]
 
-        # Create a list, initiated with the current line:
-        lines_of_coordinate_i = [ line_j ]
+    while code_j == code_i:
+        line_j = filehandle_j.readline().rstrip()
+        code_j = line_coordinate_code( line_j, chrom_sequence )
 
-        while is_behind == 10:
-            line_j = filehandle_j.readline().rstrip()
-            next_coord = re.match( pattern_chr_position, line_j )
+        if code_j == code_i:
+            lines_of_coordinate_i.append( line_j )
 
-            if next_coord:
-                coordinate_j = next_coord.group()
-            else:
-                coordinate_j = ''
+    return (True, lines_of_coordinate_i, line_j)
 
-            is_behind = whoisbehind( coordinate_i, coordinate_j, chrom_sequence )
 
-            # If the next line (still) has the same coordinate:
-            if is_behind == 10:
-                lines_of_coordinate_i.append( line_j )
 
-        reporter = (True, lines_of_coordinate_i, line_j)
 
 
-    # If file_j is behind, then needs to catch up:
-    # This is an opportunity to check if the vcf_j file is properly sorted, by asserting current line cannot be "behind" a subsequent line
-    elif is_behind == 1:
 
-        # Keep at it until line_j is no longer behind:
-        while is_behind == 1:
+def find_vcf_at_coordinate(my_coordinate, latest_vcf_line, vcf_file_handle, chrom_seq):
+    '''Best used in conjunction with catchup_multilines.
+    Given the current coordinate, the latest vcf_line from a vcf file, and the vcf file handle, it will return all the VCF variants (as VCF objects) at the given coordinate as a dictionary, where the key is the ( (contig, position), ref_base_i, alt_base_i ).
+    If there are two ALT bases in a given VCF line, the output dictionary will include two copies of this VCF object, with two different keys, each representing a different ALT base.
+    '''
+    latest_vcf_run  = catchup_multilines(my_coordinate, latest_vcf_line, vcf_file_handle, chrom_seq)
+    latest_vcf_here = latest_vcf_run[1]
 
-            # Catch up
-            line_j = filehandle_j.readline().rstrip()
-            next_coord = re.match( pattern_chr_position, line_j )
+    vcf_variants = {}
+    if latest_vcf_run[0]:
 
-            if next_coord:
-                if whoisbehind(coordinate_j, next_coord.group(), chrom_sequence) == 1:
-                    raise Exception('{} does not seem to be properly sorted'.format(filehandle_j.name) )
+        for vcf_line_i in latest_vcf_here:
 
-                coordinate_j = next_coord.group()
-            else:
-                coordinate_j = ''
+            vcf_i = Vcf_line( vcf_line_i )
 
-            is_behind = whoisbehind( coordinate_i, coordinate_j, chrom_sequence )
+            # Some VCF files wrongly uses "/" to separate different ALT's
+            altbases = re.split(r'[,/]', vcf_i.altbase)
+            for alt_i in altbases:
+                vcf_variants[ ((vcf_i.chromosome, vcf_i.position), vcf_i.refbase, alt_i) ] = vcf_i
 
+            assert my_coordinate[1] == vcf_i.position
 
-        # If file_j has caught up exactly to the position of coordinate_i:
-        if is_behind == 10:
+    latest_vcf_line = latest_vcf_run[-1]
 
-            # Create a list, initiated with the current line:
-            lines_of_coordinate_i = [ line_j ]
+    return latest_vcf_run[0], vcf_variants, latest_vcf_line
 
-            while is_behind == 10:
-                line_j = filehandle_j.readline().rstrip()
-                next_coord = re.match( pattern_chr_position, line_j )
 
-                if next_coord:
-                    coordinate_j = next_coord.group()
-                else:
-                    coordinate_j = ''
 
-                is_behind = whoisbehind( coordinate_i, coordinate_j, chrom_sequence )
 
-                # If the next line (still) has the same coordinate:
-                if is_behind == 10:
-                    lines_of_coordinate_i.append( line_j )
+class VcfStreamMerger:
+    '''
+    Walk through a number of coordinate-sorted VCF files in lock step, e.g., all the callers plus truth, dbSNP and COSMIC in vcf2tsv.
+    Instead of catching up each file separately with find_vcf_at_coordinate, the current line of every file is kept in a heap keyed by its coordinate code (see coordinate_code), so only the files that have something at or before a coordinate are touched.
+    Every line read is checked against the previous line of the same file, so an unsorted file raises an exception.
+    A line without a coordinate (e.g., the end of the file) ends that file, as in catchup_multilines.
+    '''
 
-            reporter = (True, lines_of_coordinate_i, line_j)
+    def __init__(self, chrom_seq):
 
+        if isinstance(chrom_seq, dict):
+            self.chrom_seq = chrom_seq
+        else:
+            self.chrom_seq = { contig_i: n for n, contig_i in enumerate(chrom_seq) }
 
-        elif is_behind == 0:
+        self.names        = []
+        self.filehandles  = []
+        self.latest_lines = []
+        self.latest_keys  = []
+        self.heap         = []
 
-            reporter = (False, [], line_j)
 
-    return reporter
+    def add(self, name, filehandle, latest_line):
+        '''Add an opened VCF file, whose header has been skipped, i.e., latest_line = skip_vcf_header(filehandle).'''
 
+        stream_i = len(self.names)
+        key_i    = line_coordinate_code( latest_line, self.chrom_seq )
 
+        self.names.append( name )
+        self.filehandles.append( filehandle )
+        self.latest_lines.append( latest_line )
+        self.latest_keys.append( key_i )
 
+        if key_i != end_of_file:
+            heapq.heappush( self.heap, (key_i, stream_i) )
 
 
+    def _next_line(self, stream_i):
+        '''Read the next line of the stream_i'th file. Return its coordinate code.'''
 
-def find_vcf_at_coordinate(my_coordinate, latest_vcf_line, vcf_file_handle, chrom_seq):
-    '''Best used in conjunction with catchup_multilines.
-    Given the current coordinate, the latest vcf_line from a vcf file, and the vcf file handle, it will return all the VCF variants (as VCF objects) at the given coordinate as a dictionary, where the key is the ( (contig, position), ref_base_i, alt_base_i ).
-    If there are two ALT bases in a given VCF line, the output dictionary will include two copies of this VCF object, with two different keys, each representing a different ALT base.
-    '''
-    latest_vcf_run  = catchup_multilines(my_coordinate, latest_vcf_line, vcf_file_handle, chrom_seq)
-    latest_vcf_here = latest_vcf_run[1]
+        line_i = self.filehandles[stream_i].readline().rstrip()
+        key_i  = line_coordinate_code( line_i, self.chrom_seq )
 
-    vcf_variants = {}
-    if latest_vcf_run[0]:
+        if key_i < self.latest_keys[stream_i]:
+            raise Exception('{} does not seem to be properly sorted'.format(self.filehandles[stream_i].name) )
 
-        for vcf_line_i in latest_vcf_here:
+        self.latest_lines[stream_i] = line_i
+        self.latest_keys[stream_i]  = key_i
 
-            vcf_i = Vcf_line( vcf_line_i )
+        return key_i
 
-            # Some VCF files wrongly uses "/" to separate different ALT's
-            altbases = re.split(r'[,/]', vcf_i.altbase)
-            for alt_i in altbases:
-                vcf_variants[ ((vcf_i.chromosome, vcf_i.position), vcf_i.refbase, alt_i) ] = vcf_i
 
-            assert my_coordinate[1] == vcf_i.position
+    def variants_at(self, my_coordinate):
+        '''
+        The VCF variants of every file at my_coordinate = (contig, position), as {name: {((contig, position), ref_base_i, alt_base_i): Vcf_line}}, i.e., find_vcf_at_coordinate for all the files at once.
+        The coordinates must be asked for in sorted order.
+        '''
 
-    latest_vcf_line = latest_vcf_run[-1]
+        target_key   = coordinate_code(my_coordinate, self.chrom_seq)
+        vcf_variants = { name_i: {} for name_i in self.names }
 
-    return latest_vcf_run[0], vcf_variants, latest_vcf_line
+        # Skip everything behind the target coordinate:
+        while self.heap and self.heap[0][0] < target_key:
+            key_i, stream_i = heapq.heappop( self.heap )
+            key_i = self._next_line( stream_i )
+
+            if key_i != end_of_file:
+                heapq.heappush( self.heap, (key_i, stream_i) )
+
+        # Gather the lines at the target coordinate, file by file:
+        while self.heap and self.heap[0][0] == target_key:
+            key_i, stream_i = heapq.heappop( self.heap )
+            variants_i = vcf_variants[ self.names[stream_i] ]
+
+            while key_i == target_key:
+                vcf_i = Vcf_line( self.latest_lines[stream_i] )
+
+                # Some VCF files wrongly uses "/" to separate different ALT's
+                for alt_i in re.split(r'[,/]', vcf_i.altbase):
+                    variants_i[ ((vcf_i.chromosome, vcf_i.position), vcf_i.refbase, alt_i) ] = vcf_i
+
+                key_i = self._next_line( stream_i )
+
+            if key_i != end_of_file:
+                heapq.heappush( self.heap, (key_i, stream_i) )
+
+        return vcf_variants
 
 
 
@@ -594,30 +894,20 @@ def catchup_one_line_at_a_time(coordinate_i, line_j, filehandle_j, chrom_sequenc
     Return (-1, Vcf_line_j) if the coordinate_j is behind of coordinate_i.
     '''
 
-    coordinate_j = re.match( pattern_chr_position, line_j )
+    code_i = coordinate_code( coordinate_i, chrom_sequence )
+    code_j = line_coordinate_code( line_j, chrom_sequence )
 
-    if coordinate_j:
-        coordinate_j = coordinate_j.group()
-    else:
-        coordinate_j = ''
-
-    # Which coordinate is behind?
-    is_behind = whoisbehind( coordinate_i, coordinate_j, chrom_sequence )
-
-    # The file_j is already ahead, return the same line_j, but tag it "False"
-    if is_behind == 0:
+    # The file_j is already ahead:
+    if code_j > code_i:
         reporter = (1, line_j)
 
-    # The two coordinates are the same, return the same line_j, but tag it "True"
-    elif is_behind == 10:
+    # The two coordinates are the same:
+    elif code_j == code_i:
         reporter = (0, line_j)
 
-    # If file_j is behind, then needs to catch up:
-    elif is_behind == 1:
-
-        # Read one line into file_j:
+    # If file_j is behind, read one line into file_j:
+    else:
         line_j_next = filehandle_j.readline().rstrip()
-        next_coord = re.match( pattern_chr_position, line_j_next )
         reporter = (-1, line_j_next)
 
     return reporter
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Read a coordinate-sorted BAM file in bulk while sorted candidate coordinates are visited in order, instead of one indexed query per candidate.
+# The object mimics the fetch() method of pysam.AlignmentFile, so sequencing_features.from_bam() can take either one.
+
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+
+
+def alignment_end(read_i):
+    '''
+    The 0-based exclusive end of the read, following the same convention as htslib's region queries:
+    a read without an aligned reference length (e.g., unmapped reads placed next to their mates) occupies 1 bp.
+    '''
+    end_i = read_i.reference_end
+    if end_i is None or end_i <= read_i.reference_start:
+        end_i = read_i.reference_start + 1
+
+    return end_i
+
+
+
+
+class StreamingPileup:
+    '''
+    Keep an active window of reads overlapping the current pileup column.
+    When the candidate coordinates are sorted, each read is decoded only once no matter how many nearby candidates it spans, instead of once per bam.fetch() call.
+    If the next coordinate is behind the previous one, on a different contig, or too far ahead of the stream (reseek_distance), the window starts over with a fresh indexed query.
+    '''
+
+    def __init__(self, bam, reseek_distance=1000):
+
+        self.bam             = bam
+        self.reseek_distance = reseek_distance
+
+        self.contig       = None
+        self.last_start   = -1
+        self.active_reads = []
+        self.next_read    = None
+        self.read_stream  = iter(())
+
+
+    def _restart(self, contig, start):
+
+        self.contig       = contig
+        self.active_reads = []
+        self.read_stream  = self.bam.fetch(contig, start)
+        self.next_read    = next(self.read_stream, None)
+
+
+    def fetch(self, contig, start, end):
+        '''Return the reads overlapping [start, end) in the same order as bam.fetch(contig, start, end)'''
+
+        if contig != self.contig or start < self.last_start or \
+           ( self.next_read is not None and self.next_read.reference_start + self.reseek_distance < start ):
+            self._restart(contig, start)
+
+        self.last_start = start
+
+        # Reads that end before this column will not be seen again:
+        self.active_reads = [ read_i for read_i in self.active_reads if alignment_end(read_i) > start ]
+
+        # Pull in the reads that begin before the end of this column:
+        while self.next_read is not None and self.next_read.reference_start < end:
+
+            if alignment_end(self.next_read) > start:
+                self.active_reads.append( self.next_read )
+
+            self.next_read = next(self.read_stream, None)
+
+        return [ read_i for read_i in self.active_reads if read_i.reference_start < end ]
+
+
+    def close(self):
+        self.bam.close()
+
+
+
+
+class TiledPileup:
+    '''
+    For dense coordinates, e.g., every position of a BED region or of the whole genome:
+    fetch the reads of a whole tile (tile_size bp) at once, and index them once by where they begin.
+    Each position of the tile is then a look-up instead of an indexed query into the BAM file:
+    the reads that begin before the end of the position, starting from the first one that could still reach it, are clipped to the ones that do.
+    '''
+
+    def __init__(self, bam, tile_size=10000):
+
+        self.bam       = bam
+        self.tile_size = tile_size
+
+        self.contig     = None
+        self.tile_start = self.tile_end = 0
+        self.reads      = []
+        self.starts     = []
+        self.reach      = []
+
+
+    def _load(self, contig, start, end):
+
+        self.contig     = contig
+        self.tile_start = start
+        self.tile_end   = end
+        self.reads      = list( self.bam.fetch(contig, start, end) )
+
+        # The reads of a sorted BAM file come in the order of their starts, and reach[n] is the furthest end of the first n+1 reads, so both can be bisected:
+        self.starts = [ read_i.reference_start for read_i in self.reads ]
+        self.reach  = list( accumulate( map(alignment_end, self.reads), max ) )
+
+
+    def fetch(self, contig, start, end):
+        '''Return the reads overlapping [start, end) in the same order as bam.fetch(contig, start, end)'''
+
+        if contig != self.contig or start < self.tile_start or end > self.tile_end:
+            self._load( contig, start, max(end, start+self.tile_size) )
+
+        first_read = bisect_right(self.reach, start)
+        last_read  = bisect_left(self.starts, end)
+
+        return [ read_i for read_i in self.reads[first_read:last_read] if alignment_end(read_i) > start ]
+
+
+    def close(self):
+        self.bam.close()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+# Per-read attributes that do not depend on the candidate site, decoded once and shared across neighbouring sites.
+
+import sys, os
+from collections import OrderedDict
+
+MY_DIR = os.path.dirname(os.path.realpath(__file__))
+PRE_DIR = os.path.join(MY_DIR, os.pardir)
+sys.path.append( PRE_DIR )
+
+from genomicFileHandler.read_info_extractor import cigar_blocks, cigar_soft_clip, mean
+
+
+
+class DecodedRead:
+    '''The site-independent information from_bam needs from a read.'''
+
+    __slots__ = ('blocks', 'qualities', '_mean_bq', 'edit_distance', 'soft_clipped', 'proper_pair', 'reverse')
+
+    def __init__(self, read_i):
+
+        self.blocks    = cigar_blocks(read_i)
+        self.qualities = read_i.query_qualities
+        self._mean_bq  = None
+
+        try:
+            self.edit_distance = read_i.get_tag('NM')
+        except KeyError:
+            self.edit_distance = None
+
+        cigar_i = read_i.cigartuples
+        self.soft_clipped = bool(cigar_i) and ( cigar_i[0][0] == cigar_soft_clip or cigar_i[-1][0] == cigar_soft_clip )
+
+        # Mate information:
+        self.proper_pair = read_i.is_proper_pair
+        self.reverse     = read_i.is_reverse
+
+
+    @property
+    def mean_bq(self):
+        # Only reads with a poor mapping quality need it, so it is not computed until then:
+        if self._mean_bq is None:
+            self._mean_bq = mean(self.qualities)
+        return self._mean_bq
+
+
+
+def read_key(read_i):
+    '''Identity of a read, i.e., (qname, flag, contig, position)'''
+    return read_i.query_name, read_i.flag, read_i.reference_id, read_i.reference_start
+
+
+
+class CacheCounter:
+    '''Hits and misses of a cache, to be reported in the log.'''
+
+    def __init__(self):
+        self.hits   = 0
+        self.misses = 0
+
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits/total if total else float('nan')
+
+
+    def report(self):
+        if self.hits + self.misses == 0:
+            return 'no lookups'
+        return '{} hits, {} misses ({:.1%} hit rate)'.format(self.hits, self.misses, self.hit_rate())
+
+
+
+class ReadCache(CacheCounter):
+    '''
+    A bounded LRU cache of DecodedRead, keyed by read identity.
+    When candidates cluster (e.g., MNVs, indel-dense regions, VarDict complex calls), the same reads are seen at consecutive sites, and are only decoded once.
+    '''
+
+    def __init__(self, maxsize=20000):
+
+        CacheCounter.__init__(self)
+        self.maxsize = maxsize
+        self.reads   = OrderedDict()
+
+
+    def decode(self, read_i):
+
+        key_i = read_key(read_i)
+
+        try:
+            decoded_i = self.reads[key_i]
+            self.reads.move_to_end(key_i)
+            self.hits += 1
+
+        except KeyError:
+            decoded_i = DecodedRead(read_i)
+            self.misses += 1
+
+            self.reads[key_i] = decoded_i
+            if len(self.reads) > self.maxsize:
+                self.reads.popitem(last=False)
+
+        return decoded_i
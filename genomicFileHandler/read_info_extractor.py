@@ -18,7 +18,60 @@ inf = float('inf')
 ## Define functions:
 
 ### PYSAM ###
-def position_of_aligned_read(read_i, target_position):
+# How each CIGAR operation shows up in read_i.get_aligned_pairs():
+aligned_pair_ops   = (cigar_aln_match, cigar_seq_match, cigar_seq_mismatch)   # (seq_i, ref_i)
+unaligned_seq_ops  = (cigar_insertion, cigar_soft_clip, cigar_padding)        # (seq_i, None)
+unaligned_ref_ops  = (cigar_deletion,  cigar_skip)                            # (None,  ref_i)
+
+
+def cigar_blocks(read_i):
+    '''
+    Lay out the CIGAR of a read the way read_i.get_aligned_pairs() would, without building the list of pairs.
+    Return a list of (index of the first pair, cigar operation, length, first seq_i, first ref_i), where seq_i or ref_i is None if the operation does not consume it.
+    Hard clips and empty operations do not show up in the aligned pairs, so they are left out.
+    '''
+
+    blocks = []
+    pair_i = seq_i = 0
+    ref_i  = read_i.reference_start
+
+    for cigar_op, op_length in (read_i.cigartuples or ()):
+
+        if op_length == 0:
+            continue
+
+        if cigar_op in aligned_pair_ops:
+            blocks.append( (pair_i, cigar_op, op_length, seq_i, ref_i) )
+            seq_i  += op_length
+            ref_i  += op_length
+            pair_i += op_length
+
+        elif cigar_op in unaligned_seq_ops:
+            blocks.append( (pair_i, cigar_op, op_length, seq_i, None) )
+            seq_i  += op_length
+            pair_i += op_length
+
+        elif cigar_op in unaligned_ref_ops:
+            blocks.append( (pair_i, cigar_op, op_length, None, ref_i) )
+            ref_i  += op_length
+            pair_i += op_length
+
+    return blocks
+
+
+
+def is_unaligned_pair(blocks, pair_i):
+    '''True if the pair_i'th aligned pair exists and is half empty, i.e., part of an insertion/deletion/clipping.'''
+
+    for block_start, cigar_op, op_length, seq_i, ref_i in blocks:
+        if block_start <= pair_i < block_start + op_length:
+            return cigar_op not in aligned_pair_ops
+
+    return False
+
+
+
+def position_of_aligned_read(read_i, target_position, read_blocks=None):
     '''
     Return the base call of the target position, or if it's a start of insertion/deletion.
     This target position follows pysam convension, i.e., 0-based.
@@ -31,97 +84,154 @@ def position_of_aligned_read(read_i, target_position):
     2) Deletion after the target position
     3) Insertion after the target position
     0) The target position does not match to reference, and may be discarded for "reference/alternate" read count purposes, but can be kept for "inconsistent read" metrics.
-    '''
 
-    flanking_deletion, flanking_insertion = nan, nan
+    The target is located from the CIGAR blocks (see cigar_blocks) in O(number of CIGAR operations), but the result is the same as walking through read_i.get_aligned_pairs().
+    read_blocks can be supplied if cigar_blocks(read_i) has already been computed for this read.
+    '''
 
-    for i, align_i in enumerate(read_i.get_aligned_pairs()):
+    blocks = cigar_blocks(read_i) if read_blocks is None else read_blocks
 
-        # If find a match:
-        if align_i[1] == target_position:
-            seq_i = align_i[0]
+    # Find the CIGAR block that covers the target position:
+    for nth_block, (block_start, cigar_op, op_length, block_seq_i, block_ref_i) in enumerate(blocks):
+        if block_ref_i is not None and block_ref_i <= target_position < block_ref_i + op_length:
             break
 
+    # The target position does not exist in the read
+    else:
+        return None, None, None, None, None
 
-    # If the target position is aligned:
-    try:
-        if seq_i is not None:
-            base_at_target = read_i.seq[seq_i]
+    # If the target position is deleted from the sequencing read (i.e., the deletion in this read occurs before the target position):
+    if block_seq_i is None:
+        return 0, None, None, None, None
 
-            # Whether if it's a Deletion/Insertion depends on what happens after this position:
-            # If the match (i.e., i, seq_i) is the final alignment, then you cannot know if it's an indel
-            # if "i" is NOT the final alignment:
-            if i != len(read_i.get_aligned_pairs()) - 1:
+    offset         = target_position - block_ref_i
+    i              = block_start + offset
+    seq_i          = block_seq_i + offset
+    base_at_target = read_i.seq[seq_i]
 
-                indel_length = 0
-                # If the next alignment is the next sequenced base, then the target is either a reference read of a SNP/SNV:
-                if read_i.get_aligned_pairs()[i+1][0] == seq_i+1 and read_i.get_aligned_pairs()[i+1][1] == target_position + 1:
+    # If "i" is the final alignment, cannt exam for indel:
+    last_block = blocks[-1]
+    if i == last_block[0] + last_block[2] - 1:
+        return 1, seq_i, base_at_target, nan, None
 
-                    code = 1 # Reference read for mismatch
+    # Whether if it's a Deletion/Insertion depends on what happens after this position:
+    indel_length = 0
+    code         = 1 # Reference read for mismatch
 
-                # If the next reference position has no read position to it, it is DELETED in this read:
-                elif read_i.get_aligned_pairs()[i+1][0] == None and read_i.get_aligned_pairs()[i+1][1] == target_position + 1:
+    if offset == op_length - 1:
 
-                    code = 2 # Deletion
+        next_op = blocks[nth_block+1][1]
 
-                    for align_j in read_i.get_aligned_pairs()[ i+1:: ]:
-                        if align_j[0] == None:
-                            indel_length -= 1
-                        else:
-                            break
+        # If the next reference position has no read position to it, it is DELETED in this read:
+        if next_op in unaligned_ref_ops:
 
-                # Opposite of deletion, if the read position cannot be aligned to the reference, it can be an INSERTION.
-                # Insertions sometimes show up wit soft-clipping at the end, if the inserted sequence is "too long" to align on a single read. In this case, the inserted length derived here is but a lower limit of the real inserted length.
-                elif read_i.get_aligned_pairs()[i+1][0] == seq_i+1 and read_i.get_aligned_pairs()[i+1][1] == None:
+            code = 2 # Deletion
 
-                    code = 3 # Insertion or soft-clipping
+            for block_j in blocks[ nth_block+1:: ]:
+                if block_j[1] in unaligned_ref_ops:
+                    indel_length -= block_j[2]
+                else:
+                    break
 
-                    for align_j in read_i.get_aligned_pairs()[ i+1:: ]:
-                        if align_j[1] == None:
-                            indel_length += 1
-                        else:
-                            break
+        # Opposite of deletion, if the read position cannot be aligned to the reference, it can be an INSERTION.
+        # Insertions sometimes show up wit soft-clipping at the end, if the inserted sequence is "too long" to align on a single read. In this case, the inserted length derived here is but a lower limit of the real inserted length.
+        elif next_op in unaligned_seq_ops:
 
-            # If "i" is the final alignment, cannt exam for indel:
-            else:
-                code = 1           # Assuming no indel
-                indel_length = nan # Would be zero if certain no indel, but uncertain here
+            code = 3 # Insertion or soft-clipping
 
-        # If the target position is deleted from the sequencing read (i.e., the deletion in this read occurs before the target position):
-        else:
-            code = 0
-            base_at_target, indel_length, flanking_indel = None, None, None
-            
-
-        # See if there is insertion/deletion within 5 bp of "i":
-        if isinstance(indel_length, int):
-            flanking_indel = inf
-            left_side_start = seq_i
-            right_side_start = seq_i + abs(indel_length) + 1
-            switch = 1
-            for j in (3,2,1):
-                for indel_seeker_i in left_side_start, right_side_start:
-
-                    switch = switch * -1
-                    displacement = j * switch
-                    seq_j = indel_seeker_i + displacement
-
-                    if 0 <= seq_j < len(read_i.get_aligned_pairs()):
-
-                        # If the reference position has no base aligned to it, it's a deletion.
-                        # On the other hand, if the base has no reference base aligned to it, it's an insertion.
-                        if read_i.get_aligned_pairs()[ seq_j ][1] == None or read_i.get_aligned_pairs()[ seq_j ][0] == None:
-                            flanking_indel = j
-                            break
-        else:
-            flanking_indel = None
+            for block_j in blocks[ nth_block+1:: ]:
+                if block_j[1] in unaligned_seq_ops:
+                    indel_length += block_j[2]
+                else:
+                    break
+
+    # See if there is insertion/deletion within 5 bp of "i".
+    # As before, seq_j is used as an index of the aligned pairs, which are looked up in the CIGAR blocks.
+    flanking_indel = inf
+    left_side_start = seq_i
+    right_side_start = seq_i + abs(indel_length) + 1
+    switch = 1
+    for j in (3,2,1):
+        for indel_seeker_i in left_side_start, right_side_start:
+
+            switch = switch * -1
+            displacement = j * switch
+            seq_j = indel_seeker_i + displacement
+
+            # If the reference position has no base aligned to it, it's a deletion.
+            # On the other hand, if the base has no reference base aligned to it, it's an insertion.
+            if is_unaligned_pair(blocks, seq_j):
+                flanking_indel = j
+                break
 
-        return code, seq_i, base_at_target, indel_length, flanking_indel
+    return code, seq_i, base_at_target, indel_length, flanking_indel
+
+
+
+def call_of_aligned_read(read_i, target_position):
+    '''
+    The same (Code, seq_i, base_at_target, indel_length) as position_of_aligned_read(), without the nearest insertion/deletion.
+    It walks read_i.cigartuples only as far as the target position and does not lay out the CIGAR blocks, for a quick look at every read of a deep site.
+    '''
+
+    cigar_i = [ (cigar_op, op_length) for cigar_op, op_length in (read_i.cigartuples or ()) if op_length and ( cigar_op in aligned_pair_ops or cigar_op in unaligned_seq_ops or cigar_op in unaligned_ref_ops ) ]
+
+    seq_i = 0
+    ref_i = read_i.reference_start
+
+    for nth_op, (cigar_op, op_length) in enumerate(cigar_i):
+
+        if cigar_op in aligned_pair_ops:
+            if ref_i <= target_position < ref_i + op_length:
+                break
+            seq_i += op_length
+            ref_i += op_length
+
+        elif cigar_op in unaligned_seq_ops:
+            seq_i += op_length
+
+        else:
+            # The target position is deleted from the sequencing read:
+            if ref_i <= target_position < ref_i + op_length:
+                return 0, None, None, None
+            ref_i += op_length
 
     # The target position does not exist in the read
-    except UnboundLocalError:
-        return None, None, None, None, None
+    else:
+        return None, None, None, None
+
+    offset         = target_position - ref_i
+    seq_i          = seq_i + offset
+    base_at_target = read_i.query_sequence[seq_i]
 
+    if offset < op_length - 1:
+        return 1, seq_i, base_at_target, 0
+
+    # The final alignment cannot be examined for indel:
+    elif nth_op == len(cigar_i) - 1:
+        return 1, seq_i, base_at_target, nan
+
+    indel_length = 0
+    code         = 1
+    next_op      = cigar_i[nth_op+1][0]
+
+    if next_op in unaligned_ref_ops:
+        code = 2
+        for cigar_op, op_length in cigar_i[ nth_op+1:: ]:
+            if cigar_op in unaligned_ref_ops:
+                indel_length -= op_length
+            else:
+                break
+
+    elif next_op in unaligned_seq_ops:
+        code = 3
+        for cigar_op, op_length in cigar_i[ nth_op+1:: ]:
+            if cigar_op in unaligned_seq_ops:
+                indel_length += op_length
+            else:
+                break
+
+    return code, seq_i, base_at_target, indel_length
 
 
 ## Dedup test for BAM file
@@ -223,51 +333,25 @@ def rescale(x, original='fraction', rescale_to=None, max_phred=1001):
 
 ##### Stuff from VarDict:
 def find_MSI(vcf_object):
-
-    msi = vcf_object.get_info_value('MSI')
-    if msi:
-        msi = float(msi)
-    else:
-        msi = nan
-    return msi
+    return vcf_object.get_info_number('MSI')
 
 
 def find_MSILEN(vcf_object):
-
-    msilen = vcf_object.get_info_value('MSILEN')
-    if msilen:
-        msilen = float(msilen)
-    else:
-        msilen = nan
-    return msilen
+    return vcf_object.get_info_number('MSILEN')
 
 
 def find_SHIFT3(vcf_object):
-
-    shift3 = vcf_object.get_info_value('SHIFT3')
-    if shift3:
-        shift3 = float(shift3)
-    else:
-        shift3 = nan
-    return shift3
+    return vcf_object.get_info_number('SHIFT3')
 
 
 
 # MuTect2's Stuff:
 def mutect2_nlod(vcf_object):
-    nlod = vcf_object.get_info_value('NLOD')
-    if nlod:
-        return float(nlod)
-    else:
-        return nan
+    return vcf_object.get_info_number('NLOD')
 
 
 def mutect2_tlod(vcf_object):
-    tlod = vcf_object.get_info_value('TLOD')
-    if tlod:
-        return float(tlod)
-    else:
-        return nan
+    return vcf_object.get_info_number('TLOD')
 
 
 def mutect2_STR(vcf_object):
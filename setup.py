@@ -21,5 +21,8 @@ setup(
              'utilities/lociCounterWithLabels.py',
              'utilities/split_Bed_into_equal_regions.py',
              'somaticseq/somatic_vcf2tsv.py',
-             'somaticseq/single_sample_vcf2tsv.py']
+             'somaticseq/single_sample_vcf2tsv.py',
+             'genomicFileHandler/annotation_index.py',
+             'genomicFileHandler/columnar_tsv.py',
+             'genomicFileHandler/candidate_sites.py']
 )
@@ -8,6 +8,7 @@ sys.path.append( PRE_DIR )
 
 from genomicFileHandler.genomic_file_handlers import p2phred
 from somaticseq._version import vcf_header as version_line
+import genomicFileHandler.columnar_tsv as columnar_tsv
 
 nan = float('nan')
 
@@ -17,7 +18,7 @@ def run():
     inputParameters = {}
     
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('-tsv',   '--tsv-in',                    type=str,   help='TSV in', required=True)
+    parser.add_argument('-tsv',   '--tsv-in',                    type=str,   help='TSV in, or its columnar file from vcf2tsv', required=True)
     parser.add_argument('-vcf',   '--vcf-out',                   type=str,   help='VCF iut', required=True)
     parser.add_argument('-pass',  '--pass-threshold',            type=float, help='Above which is automatically PASS', required=False, default=0.5)
     parser.add_argument('-low',   '--lowqual-threshold',         type=float, help='Low quality subject to lenient filter', required=False, default=0.1)
@@ -107,7 +108,7 @@ def tsv2vcf(tsv_fn, vcf_fn, tools, pass_score=0.5, lowqual_score=0.1, hom_thresh
     tool_string = ', '.join( tools )
         
     
-    with open(tsv_fn) as tsv, open(vcf_fn, 'w') as vcf:
+    with columnar_tsv.open_tsv(tsv_fn) as tsv, open(vcf_fn, 'w') as vcf:
         
         # First line is a header:
         tsv_i = tsv.readline().rstrip()
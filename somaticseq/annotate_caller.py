@@ -9,6 +9,7 @@ sys.path.append( PRE_DIR )
 import scipy.stats as stats
 import genomicFileHandler.genomic_file_handlers as genome
 from genomicFileHandler.read_info_extractor import * 
+from genomicFileHandler.annotation_index import AnnotationIndex
 
 
 nan = float('nan')
@@ -405,7 +406,16 @@ def TNscope(variant_id, tnscope_variants):
 
 
 def dbSNP(variant_id, dbsnp_variants):
-    
+    '''dbsnp_variants can also be an AnnotationIndex of the dbSNP VCF file.'''
+
+    if isinstance(dbsnp_variants, AnnotationIndex):
+        dbsnp_record = dbsnp_variants.lookup(variant_id)
+
+        if dbsnp_record:
+            return 1, int(dbsnp_record.common), dbsnp_record.identifier.split(',')
+        else:
+            return 0, 0, []
+
     if variant_id in dbsnp_variants:
 
         dbsnp_variant_i = dbsnp_variants[variant_id]
@@ -424,7 +434,20 @@ def dbSNP(variant_id, dbsnp_variants):
 
 
 def COSMIC(variant_id, cosmic_variants):
-    
+    '''cosmic_variants can also be an AnnotationIndex of the COSMIC VCF file.'''
+
+    if isinstance(cosmic_variants, AnnotationIndex):
+        cosmic_record = cosmic_variants.lookup(variant_id)
+
+        if cosmic_record:
+            # If designated as SNP, make it "non-cosmic" and make CNT=nan.
+            if cosmic_record.snp:
+                return 0, nan, cosmic_record.identifier.split(',')
+            else:
+                return 1, cosmic_record.cnt if cosmic_record.cnt else nan, cosmic_record.identifier.split(',')
+        else:
+            return 0, 0, []
+
     if variant_id in cosmic_variants:
     
         cosmic_variant_i = cosmic_variants[variant_id]
@@ -1,28 +1,83 @@
 #!/usr/bin/env python3
 
 import sys, os, argparse, gzip, re, subprocess
+from concurrent.futures import ProcessPoolExecutor
 
 MY_DIR = os.path.dirname(os.path.realpath(__file__))
 PRE_DIR = os.path.join(MY_DIR, os.pardir)
 sys.path.append( PRE_DIR )
 
 import genomicFileHandler.genomic_file_handlers as genome
-import vcfModifier.copy_TextFile as copy_TextFile
 import vcfModifier.splitVcf as splitVcf
 import vcfModifier.getUniqueVcfPositions as getUniqueVcfPositions
 from vcfModifier.vcfIntersector import *
 
 
 
+def normalize_vcf(convert, infile, outfiles, *args, inclusion=None, exclusion=None, sort_ref=None, sort_buffer_size=None):
+    '''
+    Run a caller's modify script, i.e., convert(VCF lines, *outfiles, *args), on the lines of infile in the inclusion/exclusion regions.
+    With sort_ref, the outfiles are sorted by the contig order of that reference on the way in, holding up to sort_buffer_size bytes of VCF lines in memory.
+    '''
+
+    outputs = [ VcfSorter(sort_ref, outfile_i, sort_buffer_size) for outfile_i in outfiles ] if sort_ref else outfiles
+    convert( intersected_vcf(infile, inclusion, exclusion), *outputs, *args )
+
+    return outfiles
+
+
+
+def load_bed_indices(beds):
+    '''Pool initializer: the BedIntervals that the main process has read, by BED file.'''
+    bed_indices.update(beds)
+
+
+
+class Normalizer:
+    '''
+    Runs normalize_vcf for every caller, one after another in this process, or with threads > 1, in a pool of that many processes, since the callers do not depend on each other.
+    The output file names are known up front, so they are added to the intermediate lists in the same order either way. wait() returns when all of them are done.
+    '''
+
+    def __init__(self, inclusion=None, exclusion=None, threads=1, sort_buffer_size=None):
+        self.inclusion = inclusion
+        self.exclusion = exclusion
+        self.sort_buffer_size = sort_buffer_size
+        self.jobs = []
+
+        # The BED files are read here, once, and handed to every process instead of being read again in each of them:
+        beds = { bed_i: bed_index(bed_i) for bed_i in (inclusion, exclusion) if bed_i }
+        self.pool = ProcessPoolExecutor(max_workers=threads, initializer=load_bed_indices, initargs=(beds,)) if threads > 1 else None
+
+
+    def run(self, convert, infile, outfiles, *args, sort_ref=None):
+        if self.pool:
+            self.jobs.append( self.pool.submit(normalize_vcf, convert, infile, outfiles, *args, inclusion=self.inclusion, exclusion=self.exclusion, sort_ref=sort_ref, sort_buffer_size=self.sort_buffer_size) )
+        else:
+            normalize_vcf(convert, infile, outfiles, *args, inclusion=self.inclusion, exclusion=self.exclusion, sort_ref=sort_ref, sort_buffer_size=self.sort_buffer_size)
+
+
+    def wait(self):
+        # Raise the exception from any of the callers:
+        try:
+            for job_i in self.jobs:
+                job_i.result()
+        finally:
+            if self.pool:
+                self.pool.shutdown(cancel_futures=True)
+
+
+
 
 # Combine individual VCF output into a simple combined VCF file, for single-sample callers
-def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None, mutect2=None, varscan=None, vardict=None, lofreq=None, scalpel=None, strelka=None, keep_intermediates=False):
+def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None, mutect2=None, varscan=None, vardict=None, lofreq=None, scalpel=None, strelka=None, keep_intermediates=False, threads=1, sort_buffer_size=None):
     
     hg_dict = re.sub(r'\.fa(sta)?$', '.dict', ref)
     
     intermediate_files  = set()
     snv_intermediates   = []
     indel_intermediates = []
+    normalizer          = Normalizer(inclusion, exclusion, threads, sort_buffer_size)
 
     intermediate_vcfs = {'MuTect2'  :{'snv': None, 'indel': None}, \
                          'VarScan2' :{'snv': None, 'indel': None}, \
@@ -34,11 +89,8 @@ def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None,
         
         import vcfModifier.modify_MuTect as mod_mutect
         
-        mutect_in = bed_intersector(mutect, os.sep.join(( outdir, 'intersect.mutect1.vcf' )), inclusion, exclusion)
-        intermediate_files.add(mutect_in)
-        
         snv_mutect_out = os.sep.join(( outdir, 'snv.mutect1.vcf' ))
-        mod_mutect.convert(mutect_in, snv_mutect_out, bam)
+        normalizer.run(mod_mutect.convert, mutect, [snv_mutect_out], bam)
         
         intermediate_files.add(snv_mutect_out)
         snv_intermediates.append(snv_mutect_out)
@@ -46,12 +98,9 @@ def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None,
     if mutect2:
         import vcfModifier.modify_ssMuTect2 as mod_mutect2
                 
-        mutect2_in = bed_intersector(mutect2, os.sep.join(( outdir, 'intersect.mutect2.vcf' )), inclusion, exclusion)
-        intermediate_files.add(mutect2_in)
-        
         snv_mutect_out   = os.sep.join(( outdir, 'snv.mutect2.vcf' ))
         indel_mutect_out = os.sep.join(( outdir, 'indel.mutect2.vcf' ))
-        mod_mutect2.convert(mutect2_in, snv_mutect_out, indel_mutect_out)
+        normalizer.run(mod_mutect2.convert, mutect2, [snv_mutect_out, indel_mutect_out])
         
         for file_i in snv_mutect_out, indel_mutect_out:
             intermediate_files.add( file_i )
@@ -64,19 +113,12 @@ def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None,
     if varscan:
         import vcfModifier.modify_VarScan2 as mod_varscan2
 
-        varscan_in = bed_intersector(varscan, os.sep.join(( outdir, 'intersect.varscan.vcf' )), inclusion, exclusion)
-        intermediate_files.add(varscan_in)
-
-        snv_temp          = os.sep.join(( outdir, 'snv.varscan.temp.vcf' ))
-        indel_temp        = os.sep.join(( outdir, 'indel.varscan.temp.vcf' ))
         snv_varscan_out   = os.sep.join(( outdir, 'snv.varscan.vcf' ))
         indel_varscan_out = os.sep.join(( outdir, 'indel.varscan.vcf' ))
 
-        splitVcf.split_into_snv_and_indel(varscan_in, snv_temp, indel_temp)
-        mod_varscan2.convert(snv_temp,   snv_varscan_out)
-        mod_varscan2.convert(indel_temp, indel_varscan_out)
+        normalizer.run(splitVcf.split_into_snv_and_indel, varscan, [snv_varscan_out, indel_varscan_out], mod_varscan2.convert_line)
 
-        for file_i in snv_temp, indel_temp, snv_varscan_out, indel_varscan_out:
+        for file_i in snv_varscan_out, indel_varscan_out:
             intermediate_files.add( file_i )
         
         snv_intermediates.append(snv_varscan_out)
@@ -87,20 +129,12 @@ def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None,
     if vardict:
         import vcfModifier.modify_VarDict as mod_vardict
         
-        vardict_in = bed_intersector(vardict, os.sep.join(( outdir, 'intersect.vardict.vcf' )), inclusion, exclusion)
-        intermediate_files.add(vardict_in)
-
-        snv_vardict_out   = os.sep.join(( outdir, 'snv.vardict.vcf' ))
-        indel_vardict_out = os.sep.join(( outdir, 'indel.vardict.vcf'))
-        mod_vardict.convert(vardict_in, snv_vardict_out, indel_vardict_out)
-        
-        sorted_snv_vardict_out   = os.sep.join(( outdir, 'snv.sort.vardict.vcf'))
-        sorted_indel_vardict_out = os.sep.join(( outdir, 'indel.sort.vardict.vcf'))
-        
-        vcfsorter(ref, snv_vardict_out,   sorted_snv_vardict_out)
-        vcfsorter(ref, indel_vardict_out, sorted_indel_vardict_out)
+        # Split complex variants can go out of order, so they are sorted on the way into the files:
+        sorted_snv_vardict_out   = os.sep.join(( outdir, 'snv.sort.vardict.vcf' ))
+        sorted_indel_vardict_out = os.sep.join(( outdir, 'indel.sort.vardict.vcf' ))
+        normalizer.run(mod_vardict.convert, vardict, [sorted_snv_vardict_out, sorted_indel_vardict_out], sort_ref=ref)
                 
-        for file_i in snv_vardict_out, indel_vardict_out, sorted_snv_vardict_out, sorted_indel_vardict_out:
+        for file_i in sorted_snv_vardict_out, sorted_indel_vardict_out:
             intermediate_files.add( file_i )
         
         snv_intermediates.append(sorted_snv_vardict_out)
@@ -110,13 +144,10 @@ def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None,
 
     if lofreq:
         
-        lofreq_in = bed_intersector(lofreq, os.sep.join(( outdir, 'intersect.lofreq.vcf' )), inclusion, exclusion)
-        intermediate_files.add(lofreq_in)
-        
         snv_lofreq_out   = os.sep.join(( outdir, 'snv.lofreq.vcf' ))
         indel_lofreq_out = os.sep.join(( outdir, 'indel.lofreq.vcf' ))
 
-        splitVcf.split_into_snv_and_indel(lofreq_in, snv_lofreq_out, indel_lofreq_out)
+        normalizer.run(splitVcf.split_into_snv_and_indel, lofreq, [snv_lofreq_out, indel_lofreq_out])
 
         for file_i in snv_lofreq_out, indel_lofreq_out:
             intermediate_files.add( file_i )
@@ -128,23 +159,16 @@ def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None,
 
     if scalpel:
         
-        scalpel_in = bed_intersector(scalpel, os.sep.join(( outdir, 'intersect.scalpel.vcf' )), inclusion, exclusion)
-        intermediate_files.add(scalpel_in)
+        scalpel_in = intersected_vcf(scalpel, inclusion, exclusion)
 
-        scalpel_out = os.sep.join(( outdir, 'indel.scalpel.vcf' ))
-        copy_TextFile.copy(scalpel_in, scalpel_out)
-        intermediate_files.add(scalpel_out)
-        indel_intermediates.append(scalpel_out)
+        indel_intermediates.append(scalpel_in)
         
     if strelka:
         import vcfModifier.modify_ssStrelka as mod_strelka
         
-        strelka_in = bed_intersector(strelka, os.sep.join(( outdir, 'intersect.strelka.vcf' )), inclusion, exclusion)
-        intermediate_files.add(strelka_in)
-
         snv_strelka_out   = os.sep.join(( outdir, 'snv.strelka.vcf' ))
         indel_strelka_out = os.sep.join(( outdir, 'indel.strelka.vcf' ))
-        mod_strelka.convert(strelka_in, snv_strelka_out, indel_strelka_out)
+        normalizer.run(mod_strelka.convert, strelka, [snv_strelka_out, indel_strelka_out])
         
         for file_i in snv_strelka_out, indel_strelka_out:
             intermediate_files.add( file_i )
@@ -155,21 +179,14 @@ def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None,
         intermediate_vcfs['Strelka']['indel'] = indel_strelka_out
 
 
-    # Combine SNV/INDEL variant candidates
-    snv_combined   = os.sep.join(( outdir, 'unsorted.CombineVariants.snv.vcf' ))
-    indel_combined = os.sep.join(( outdir, 'unsorted.CombineVariants.indel.vcf' ))
-    
-    getUniqueVcfPositions.combine(snv_intermediates, snv_combined)
-    getUniqueVcfPositions.combine(indel_intermediates, indel_combined)
-    for file_i in snv_combined, indel_combined:
-        intermediate_files.add( file_i )
-    
-    # Sort them:
+    normalizer.wait()
+
+    # Combine SNV/INDEL variant candidates, already in the reference's order:
     snv_combined_sorted = os.sep.join(( outdir, 'CombineVariants.snv.vcf' ))
     indel_combined_sorted = os.sep.join(( outdir, 'CombineVariants.indel.vcf' ))
     
-    vcfsorter(ref, snv_combined,   snv_combined_sorted)
-    vcfsorter(ref, indel_combined, indel_combined_sorted)
+    getUniqueVcfPositions.combine(snv_intermediates,   snv_combined_sorted,   ref, sort_buffer_size)
+    getUniqueVcfPositions.combine(indel_intermediates, indel_combined_sorted, ref, sort_buffer_size)
     
 
     if not keep_intermediates:
@@ -184,13 +201,14 @@ def combineSingle(outdir, ref, bam, inclusion=None, exclusion=None, mutect=None,
 
 
 # Combine individual VCF output into a simple combined VCF file, for paired sample callers
-def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutect=None, indelocator=None, mutect2=None, varscan_snv=None, varscan_indel=None, jsm=None, sniper=None, vardict=None, muse=None, lofreq_snv=None, lofreq_indel=None, scalpel=None, strelka_snv=None, strelka_indel=None, tnscope=None, platypus=None, keep_intermediates=False):
+def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutect=None, indelocator=None, mutect2=None, varscan_snv=None, varscan_indel=None, jsm=None, sniper=None, vardict=None, muse=None, lofreq_snv=None, lofreq_indel=None, scalpel=None, strelka_snv=None, strelka_indel=None, tnscope=None, platypus=None, keep_intermediates=False, threads=1, sort_buffer_size=None):
     
     hg_dict = re.sub(r'\.fa(sta)?$', '.dict', ref)
     
     intermediate_files  = set()
     snv_intermediates   = []
     indel_intermediates = []
+    normalizer          = Normalizer(inclusion, exclusion, threads, sort_buffer_size)
     
     intermediate_vcfs = {'MuTect2':  {'snv': None, 'indel': None}, \
                          'VarDict':  {'snv': None, 'indel': None}, \
@@ -204,22 +222,16 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
 
         if mutect:
             
-            mutect_in = bed_intersector(mutect, os.sep.join(( outdir, 'intersect.mutect1.vcf' )), inclusion, exclusion)
-            intermediate_files.add(mutect_in)
-            
             snv_mutect_out = os.sep.join(( outdir, 'snv.mutect1.vcf' ))
-            mod_mutect.convert(mutect_in, snv_mutect_out, tbam, nbam)
+            normalizer.run(mod_mutect.convert, mutect, [snv_mutect_out], tbam, nbam)
             
             intermediate_files.add(snv_mutect_out)
             snv_intermediates.append(snv_mutect_out)
         
         if indelocator:
             
-            indelocator_in = bed_intersector(indelocator, os.sep.join(( outdir, 'intersect.indelocator.vcf' )), inclusion, exclusion)
-            intermediate_files.add(indelocator_in)
-            
             indel_indelocator_out = os.sep.join(( outdir, 'indel.indelocator.vcf'))
-            mod_mutect.convert(indelocator_in, indel_indelocator_out, tbam, nbam)
+            normalizer.run(mod_mutect.convert, indelocator, [indel_indelocator_out], tbam, nbam)
             
             intermediate_files.add(indel_indelocator_out)
             indel_intermediates.append(indel_indelocator_out)
@@ -229,12 +241,9 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
         
         import vcfModifier.modify_MuTect2 as mod_mutect2
                 
-        mutect2_in = bed_intersector(mutect2, os.sep.join(( outdir, 'intersect.mutect2.vcf' )), inclusion, exclusion)
-        intermediate_files.add(mutect2_in)
-
         snv_mutect_out   = os.sep.join(( outdir, 'snv.mutect2.vcf'))
         indel_mutect_out = os.sep.join(( outdir, 'indel.mutect2.vcf'))
-        mod_mutect2.convert(mutect2_in, snv_mutect_out, indel_mutect_out, False)
+        normalizer.run(mod_mutect2.convert, mutect2, [snv_mutect_out, indel_mutect_out], False)
         
         for file_i in snv_mutect_out, indel_mutect_out:
             intermediate_files.add( file_i )
@@ -251,22 +260,16 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
         
         if varscan_snv:
             
-            varscan_in = bed_intersector(varscan_snv, os.sep.join(( outdir, 'intersect.varscan.snv.vcf' )), inclusion, exclusion)
-            intermediate_files.add(varscan_in)
-            
             snv_varscan_out = os.sep.join(( outdir, 'snv.varscan.vcf'))
-            mod_varscan2.convert(varscan_in, snv_varscan_out)
+            normalizer.run(mod_varscan2.convert, varscan_snv, [snv_varscan_out])
             
             intermediate_files.add(snv_varscan_out)
             snv_intermediates.append(snv_varscan_out)
             
         if varscan_indel:
 
-            varscan_in = bed_intersector(varscan_indel, os.sep.join(( outdir, 'intersect.varscan.indel.vcf' )), inclusion, exclusion)
-            intermediate_files.add(varscan_in)
-            
             indel_varscan_out = os.sep.join(( outdir, 'indel.varscan.vcf' ))
-            mod_varscan2.convert(varscan_in, indel_varscan_out)
+            normalizer.run(mod_varscan2.convert, varscan_indel, [indel_varscan_out])
             
             intermediate_files.add(indel_varscan_out)
             indel_intermediates.append(indel_varscan_out)
@@ -274,11 +277,8 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
     if jsm:
         import vcfModifier.modify_JointSNVMix2 as mod_jsm
 
-        jsm_in = bed_intersector(jsm, os.sep.join(( outdir, 'intersect.jsm.vcf' )), inclusion, exclusion)
-        intermediate_files.add(jsm_in)
-        
         jsm_out = os.sep.join(( outdir, 'snv.jsm.vcf' ))
-        mod_jsm.convert(jsm_in, jsm_out)
+        normalizer.run(mod_jsm.convert, jsm, [jsm_out])
         
         intermediate_files.add(jsm_out)
         snv_intermediates.append(jsm_out)
@@ -286,11 +286,8 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
     if sniper:
         import vcfModifier.modify_SomaticSniper as mod_sniper
         
-        sniper_in = bed_intersector(sniper, os.sep.join(( outdir, 'intersect.sniper.vcf' )), inclusion, exclusion)
-        intermediate_files.add(sniper_in)
-        
         sniper_out = os.sep.join(( outdir, 'snv.somaticsniper.vcf' ))
-        mod_sniper.convert(sniper_in, sniper_out)
+        normalizer.run(mod_sniper.convert, sniper, [sniper_out])
         
         intermediate_files.add(sniper_out)
         snv_intermediates.append(sniper_out)
@@ -298,20 +295,12 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
     if vardict:
         import vcfModifier.modify_VarDict as mod_vardict
 
-        vardict_in = bed_intersector(vardict, os.sep.join(( outdir, 'intersect.vardict.vcf' )), inclusion, exclusion)
-        intermediate_files.add(vardict_in)
-        
-        snv_vardict_out   = os.sep.join(( outdir, 'snv.vardict.vcf' ))
-        indel_vardict_out = os.sep.join(( outdir, 'indel.vardict.vcf' ))
-        mod_vardict.convert(vardict_in, snv_vardict_out, indel_vardict_out)
-        
+        # Split complex variants can go out of order, so they are sorted on the way into the files:
         sorted_snv_vardict_out   = os.sep.join(( outdir, 'snv.sort.vardict.vcf' ))
         sorted_indel_vardict_out = os.sep.join(( outdir, 'indel.sort.vardict.vcf' ))
+        normalizer.run(mod_vardict.convert, vardict, [sorted_snv_vardict_out, sorted_indel_vardict_out], sort_ref=ref)
         
-        vcfsorter(ref, snv_vardict_out,   sorted_snv_vardict_out)
-        vcfsorter(ref, indel_vardict_out, sorted_indel_vardict_out)
-        
-        for file_i in snv_vardict_out, indel_vardict_out, sorted_snv_vardict_out, sorted_indel_vardict_out:
+        for file_i in sorted_snv_vardict_out, sorted_indel_vardict_out:
             intermediate_files.add(file_i)
         
         snv_intermediates.append(sorted_snv_vardict_out)
@@ -321,48 +310,26 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
         
     if muse:
 
-        muse_in = bed_intersector(muse, os.sep.join(( outdir, 'intersect.muse.vcf' )), inclusion, exclusion)
-        intermediate_files.add(muse_in)
-        
-        muse_out = os.sep.join(( outdir, 'snv.muse.vcf' ))
-        copy_TextFile.copy(muse_in, muse_out)
+        muse_in = intersected_vcf(muse, inclusion, exclusion)
         
-        intermediate_files.add(muse_out)
-        snv_intermediates.append(muse_out)
+        snv_intermediates.append(muse_in)
         
     if lofreq_snv:
         
-        lofreq_in = bed_intersector(lofreq_snv, os.sep.join(( outdir, 'intersect.lofreq.snv.vcf' )), inclusion, exclusion)
-        intermediate_files.add(lofreq_in)
-
-
-        snv_lofreq_out = os.sep.join(( outdir, 'snv.lofreq.vcf' ))
-        copy_TextFile.copy(lofreq_in, snv_lofreq_out)
-        
-        intermediate_files.add(snv_lofreq_out)
-        snv_intermediates.append(snv_lofreq_out)
+        lofreq_in = intersected_vcf(lofreq_snv, inclusion, exclusion)
+        snv_intermediates.append(lofreq_in)
 
     if lofreq_indel:
         
-        lofreq_in = bed_intersector(lofreq_indel, os.sep.join(( outdir, 'intersect.lofreq.indel.vcf' )), inclusion, exclusion)
-        intermediate_files.add(lofreq_in)
+        lofreq_in = intersected_vcf(lofreq_indel, inclusion, exclusion)
 
-        indel_lofreq_out = os.sep.join(( outdir, 'indel.lofreq.vcf' ))
-        copy_TextFile.copy(lofreq_in, indel_lofreq_out)
-        
-        intermediate_files.add(indel_lofreq_out)
-        indel_intermediates.append(indel_lofreq_out)
+        indel_intermediates.append(lofreq_in)
         
     if scalpel:
         
-        scalpel_in = bed_intersector(scalpel, os.sep.join(( outdir, 'intersect.scalpel.vcf' )), inclusion, exclusion)
-        intermediate_files.add(scalpel_in)
-        
-        scalpel_out = os.sep.join(( outdir, 'indel.scalpel.vcf' ))
-        copy_TextFile.copy(scalpel_in, scalpel_out)
+        scalpel_in = intersected_vcf(scalpel, inclusion, exclusion)
         
-        intermediate_files.add(scalpel_out)
-        indel_intermediates.append(scalpel_out)
+        indel_intermediates.append(scalpel_in)
     
     if strelka_snv or strelka_indel:
         
@@ -370,22 +337,16 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
 
         if strelka_snv:
             
-            strelka_in = bed_intersector(strelka_snv, os.sep.join(( outdir, 'intersect.strelka.snv.vcf' )), inclusion, exclusion)
-            intermediate_files.add(strelka_in)
-            
             snv_strelka_out = os.sep.join(( outdir, 'snv.strelka.vcf' ))
-            mod_strelka.convert(strelka_in, snv_strelka_out)
+            normalizer.run(mod_strelka.convert, strelka_snv, [snv_strelka_out])
             
             intermediate_files.add(snv_strelka_out)
             snv_intermediates.append(snv_strelka_out)
 
         if strelka_indel:
             
-            strelka_in = bed_intersector(strelka_indel, os.sep.join(( outdir, 'intersect.strelka.indel.vcf' )), inclusion, exclusion)
-            intermediate_files.add(strelka_in)
-                        
             indel_strelka_out = os.sep.join(( outdir, 'indel.strelka.vcf' ))
-            mod_strelka.convert(strelka_in, indel_strelka_out)
+            normalizer.run(mod_strelka.convert, strelka_indel, [indel_strelka_out])
             
             intermediate_files.add(indel_strelka_out)
             indel_intermediates.append(indel_strelka_out)
@@ -394,12 +355,9 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
 
         import vcfModifier.modify_MuTect2 as mod_mutect2
         
-        tnscope_in = bed_intersector(tnscope, os.sep.join(( outdir, 'intersect.tnscope.vcf' )), inclusion, exclusion)
-        intermediate_files.add(tnscope_in)
-        
         snv_tnscope_out   = os.sep.join(( outdir, 'snv.tnscope.vcf' ))
         indel_tnscope_out = os.sep.join(( outdir, 'indel.tnscope.vcf' ))
-        mod_mutect2.convert(tnscope_in, snv_tnscope_out, indel_tnscope_out, True)
+        normalizer.run(mod_mutect2.convert, tnscope, [snv_tnscope_out, indel_tnscope_out], True)
         
         for file_i in snv_tnscope_out, indel_tnscope_out:
             intermediate_files.add( file_i )
@@ -411,13 +369,10 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
     
     if platypus:
         
-        platypus_in = bed_intersector(platypus, os.sep.join(( outdir, 'intersect.platypus.vcf' )), inclusion, exclusion)
-        intermediate_files.add(platypus_in)
-        
         snv_platypus_out   = os.sep.join(( outdir, 'snv.platypus.vcf' ))
         indel_platypus_out = os.sep.join(( outdir, 'indel.platypus.vcf' ))
 
-        splitVcf.split_into_snv_and_indel(platypus_in, snv_platypus_out, indel_platypus_out)
+        normalizer.run(splitVcf.split_into_snv_and_indel, platypus, [snv_platypus_out, indel_platypus_out])
 
         for file_i in snv_platypus_out, indel_platypus_out:
             intermediate_files.add( file_i )
@@ -429,22 +384,14 @@ def combinePaired(outdir, ref, tbam, nbam, inclusion=None, exclusion=None, mutec
 
     
     
-    # Combine SNV/INDEL variant candidates
-    snv_combined   = os.sep.join(( outdir, 'unsorted.CombineVariants.snv.vcf' ))
-    indel_combined = os.sep.join(( outdir, 'unsorted.CombineVariants.indel.vcf' ))
-    
-    getUniqueVcfPositions.combine(snv_intermediates, snv_combined)
-    getUniqueVcfPositions.combine(indel_intermediates, indel_combined)
-    
-    for file_i in snv_combined, indel_combined:
-        intermediate_files.add( file_i )
-    
-    # Sort them:
+    normalizer.wait()
+
+    # Combine SNV/INDEL variant candidates, already in the reference's order:
     snv_combined_sorted = os.sep.join(( outdir, 'CombineVariants.snv.vcf' ))
     indel_combined_sorted = os.sep.join(( outdir, 'CombineVariants.indel.vcf' ))
     
-    vcfsorter(ref, snv_combined,   snv_combined_sorted)
-    vcfsorter(ref, indel_combined, indel_combined_sorted)
+    getUniqueVcfPositions.combine(snv_intermediates,   snv_combined_sorted,   ref, sort_buffer_size)
+    getUniqueVcfPositions.combine(indel_intermediates, indel_combined_sorted, ref, sort_buffer_size)
     
     if not keep_intermediates:
         for file_i in intermediate_files:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# Faster drop-in replacements for the scipy.stats tests used by the BAM features and the somatic scores.
+# Set use_scipy = True (-scipy/--scipy-stats in the vcf2tsv scripts) to compute everything with scipy.stats instead, e.g., for validation.
+
+import math
+import numpy as np
+import scipy.stats as stats
+from scipy.special import gammaln
+from collections import Counter
+from functools import lru_cache
+
+nan = float('nan')
+
+use_scipy = False
+
+
+
+def ranksums_z(x, y):
+    '''
+    The z statistic of the Wilcoxon rank-sum test, identical to scipy.stats.ranksums(x, y)[0].
+    Mapping qualities, base qualities, edit distances and read positions have few distinct values, so the ranks are tallied from a histogram of the values instead of sorting both samples:
+    each distinct value takes the average rank of its ties, and it takes linear time in the number of reads.
+    Like scipy, there is no tie correction, and the result is nan if either sample is empty.
+    '''
+
+    if use_scipy:
+        return stats.ranksums(x, y)[0]
+
+    n1 = len(x)
+    n2 = len(y)
+
+    if n1 == 0 or n2 == 0:
+        return nan
+
+    x_counts = Counter(x)
+    y_counts = Counter(y)
+
+    # Twice the rank sum of x, so tied ranks (which end in .5) stay integers:
+    ranked = rank_sum_x2 = 0
+    for value_i in sorted( x_counts.keys() | y_counts.keys() ):
+        x_count = x_counts.get(value_i, 0)
+        n_ties  = x_count + y_counts.get(value_i, 0)
+
+        rank_sum_x2 += x_count * (2*ranked + n_ties + 1)
+        ranked      += n_ties
+
+    expected = n1 * (n1+n2+1) / 2.0
+    z = (rank_sum_x2/2 - expected) / math.sqrt(n1*n2*(n1+n2+1)/12.0)
+
+    return z
+
+
+
+# Fisher's exact tests of tables of up to max_depth reads are computed by scipy.stats.fisher_exact and memoized on the counts.
+# Deeper tables are summed with numpy from a table of log-factorials. Those p-values are within a relative 1e-9 of scipy's,
+# and the ones close to 1 or to a 2-decimal rounding boundary, which could be printed differently, are left to scipy.
+max_depth      = 10000
+log_factorials = np.zeros(1)
+
+# Tables within this factor of the observed one's probability are as probable, as in R's fisher.test (scipy's 1+1e-14 is finer than the log-factorials):
+relative_error = 1 + 1e-7
+tolerance      = 1e-9
+
+
+
+def set_max_depth(depth=10000):
+    '''Tables of more than depth reads are evaluated with fisher_exact_p_batch instead of scipy.stats.fisher_exact.'''
+
+    global max_depth
+
+    max_depth = depth
+    _fisher_exact_p.cache_clear()
+
+
+
+def log_factorial_table(n):
+    '''log(k!) for k = 0, 1, ..., n, extended with gammaln as deeper tables come up.'''
+
+    global log_factorials
+
+    if log_factorials.size <= n:
+        log_factorials = gammaln( np.arange( max(n+1, 2*log_factorials.size) ) + 1 )
+
+    return log_factorials
+
+
+
+def fisher_exact_p(table, alternative='two-sided'):
+    '''
+    The p-value of Fisher's exact test of a 2x2 table, i.e., scipy.stats.fisher_exact(table, alternative)[1].
+    The same few count tables come up over and over, so the results are memoized on the counts.
+    '''
+
+    if use_scipy:
+        return stats.fisher_exact(table, alternative=alternative)[1]
+
+    (a, b), (c, d) = table
+
+    return _fisher_exact_p( int(a), int(b), int(c), int(d), alternative )
+
+
+
+@lru_cache(maxsize=65536)
+def _fisher_exact_p(a, b, c, d, alternative):
+
+    if a + b + c + d <= max_depth:
+        return stats.fisher_exact( ((a, b), (c, d)), alternative=alternative )[1]
+
+    return float( fisher_exact_p_batch( [(a, b, c, d)], alternative )[0] )
+
+
+
+def fisher_exact_p_batch(tables, alternative='two-sided'):
+    '''
+    Fisher's exact tests of many 2x2 tables at once, given as (a, b, c, d) rows for ((a, b), (c, d)), as a numpy array of p-values.
+    The hypergeometric distribution of every table is laid out in a 2D array, so the tables are summed with a few vectorized numpy operations.
+    '''
+
+    if alternative not in ('two-sided', 'greater', 'less'):
+        raise ValueError("alternative should be one of two-sided, less, or greater.")
+
+    tables = np.asarray(tables, dtype=np.int64).reshape(-1, 4)
+    if (tables < 0).any():
+        raise ValueError('All values in the table must be nonnegative.')
+
+    a, b, c, d = tables.T
+    row_1 = a + b
+    row_2 = c + d
+    col_1 = a + c
+
+    # The support of the upper left cell, one row per table:
+    lowest  = np.maximum(0, col_1 - row_2)
+    highest = np.minimum(col_1, row_1)
+    x = lowest[:, None] + np.arange( (highest - lowest).max(initial=0) + 1 )
+    in_support = x <= highest[:, None]
+    x = np.where(in_support, x, lowest[:, None])
+
+    # log of the hypergeometric probabilities, less the terms that are the same for the whole table:
+    log_f = log_factorial_table( int( (row_1 + row_2).max(initial=0) ) )
+    log_pmf = - log_f[x] - log_f[row_1[:, None] - x] - log_f[col_1[:, None] - x] - log_f[row_2[:, None] - col_1[:, None] + x]
+    log_pmf[~in_support] = -np.inf
+
+    if alternative == 'two-sided':
+        observed = log_pmf[ np.arange(len(a)), a - lowest ]
+        extreme  = log_pmf <= observed[:, None] + math.log(relative_error)
+    elif alternative == 'greater':
+        extreme  = x >= a[:, None]
+    else:
+        extreme  = x <= a[:, None]
+
+    # Relative to the mode, so that deep tables do not underflow. An empty row or column leaves a single table, i.e., p = 1.
+    pmf = np.exp( log_pmf - log_pmf.max(axis=1)[:, None] )
+    p_others = np.where(extreme, 0, pmf).sum(axis=1)
+    pvalues  = np.where(extreme, pmf, 0).sum(axis=1)
+    pvalues  = np.minimum( pvalues / (pvalues + p_others), 1.0 )
+
+    # p-values that are 1 or round to a different 2nd decimal within the tolerance:
+    hazards = (pvalues > 1 - tolerance) | (np.abs( (pvalues*100) % 1 - 0.5 ) < 100*tolerance)
+    for i in np.flatnonzero(hazards):
+        pvalues[i] = stats.fisher_exact( tables[i].reshape(2, 2), alternative=alternative )[1]
+
+    return pvalues
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# The from_bam() features of variants kept in an SQLite database across runs, e.g., when run_somaticseq.py is rerun on the same BAM files with other callers, classifiers, or thresholds.
+# Features are looked up by the BAM file's content (see bam_identity), the parameters of from_bam, and the variant. Only the variants not seen before are extracted from the BAM file.
+# Several processes (e.g., vcf2tsv -nt or somaticseq_parallel.py) can share the same database.
+
+import sys, os, json, hashlib, sqlite3
+
+MY_DIR = os.path.dirname(os.path.realpath(__file__))
+PRE_DIR = os.path.join(MY_DIR, os.pardir)
+sys.path.append( PRE_DIR )
+
+import somaticseq.sequencing_features as sequencing_features
+from genomicFileHandler.read_cache import CacheCounter
+
+# How much of the beginning (i.e., the header) and the end of a BAM file identifies it:
+identity_bytes = 1 << 20
+
+
+
+def bam_identity(bam_file):
+    '''A checksum of the size, the beginning and the end of the BAM file, which does not change if the file is moved or copied, but does if it is re-aligned or re-sorted.'''
+
+    file_size = os.path.getsize(bam_file)
+    checksum  = hashlib.blake2b( str(file_size).encode(), digest_size=16 )
+
+    with open(bam_file, 'rb') as bam_in:
+        checksum.update( bam_in.read(identity_bytes) )
+        bam_in.seek( max(0, file_size - identity_bytes) )
+        checksum.update( bam_in.read(identity_bytes) )
+
+    return checksum.hexdigest()
+
+
+
+class FeatureCache(CacheCounter):
+    '''
+    A drop-in replacement for sequencing_features.from_bam of one BAM file, which only calls it for variants that are not in the database yet.
+    New features are written in batches of batch_size, and close() writes the rest.
+    '''
+
+    def __init__(self, db_file, bam_file, dedup=True, batch_size=1000):
+
+        CacheCounter.__init__(self)
+        self.bam        = bam_identity(bam_file)
+        self.dedup      = dedup
+        self.batch_size = batch_size
+        self.new        = {}
+        self.parameter_keys = {}
+
+        # The normal BAM file may be read in another thread (vcf2tsv -concurrent), but each FeatureCache is only used by one thread at a time:
+        self.db = sqlite3.connect(db_file, timeout=600, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS bam_features (bam TEXT, parameters TEXT, contig TEXT, position INTEGER, ref TEXT, alt TEXT, features TEXT, PRIMARY KEY (bam, parameters, contig, position, ref, alt)) WITHOUT ROWID')
+        self.db.commit()
+
+
+    def parameters(self, min_mq, min_bq, max_reads, sampling_seed):
+        # The feature names are part of the key, so features from another version of BamFeatures are not mixed up.
+        # The quality thresholds are floats on the command line, but may be integers from python, and are the same key either way:
+        min_mq = float(min_mq)
+        min_bq = float(min_bq)
+
+        key_i = (min_mq, min_bq, max_reads, sampling_seed)
+        if key_i not in self.parameter_keys:
+            self.parameter_keys[key_i] = json.dumps( [min_mq, min_bq, self.dedup, max_reads, sampling_seed, sequencing_features.BamFeatures.fields] )
+
+        return self.parameter_keys[key_i]
+
+
+    def from_bam(self, bam, my_coordinate, ref_base, first_alt, min_mq=1, min_bq=10, read_cache=None, accumulator=None, max_reads=0, sampling_seed=0):
+
+        # Without a variant, i.e., BED regions or the whole genome, there is nothing to look up:
+        if first_alt == '.':
+            return sequencing_features.from_bam(bam, my_coordinate, ref_base, first_alt, min_mq, min_bq, read_cache, accumulator, max_reads, sampling_seed)
+
+        key_i = ( self.bam, self.parameters(min_mq, min_bq, max_reads, sampling_seed), my_coordinate[0], my_coordinate[1], ref_base, first_alt )
+
+        features = self.new.get(key_i)
+        if features is None:
+            row_i = self.db.execute( 'SELECT features FROM bam_features WHERE bam=? AND parameters=? AND contig=? AND position=? AND ref=? AND alt=?', key_i ).fetchone()
+            features = row_i[0] if row_i else None
+
+        if features is not None:
+            self.hits += 1
+            return sequencing_features.BamFeatures( **dict( zip(sequencing_features.BamFeatures.fields, json.loads(features)) ) )
+
+        self.misses += 1
+        bam_features = sequencing_features.from_bam(bam, my_coordinate, ref_base, first_alt, min_mq, min_bq, read_cache, accumulator, max_reads, sampling_seed)
+
+        # JSON keeps integers and floats apart (and nan), so the features print the same either way:
+        self.new[key_i] = json.dumps( [ value_i.item() if hasattr(value_i, 'item') else value_i for value_i in bam_features.values() ] )
+        if len(self.new) >= self.batch_size:
+            self.flush()
+
+        return bam_features
+
+
+    def flush(self):
+        if self.new:
+            self.db.executemany( 'INSERT OR REPLACE INTO bam_features VALUES (?,?,?,?,?,?,?)', [ key_i + (features_i,) for key_i, features_i in self.new.items() ] )
+            self.db.commit()
+            self.new = {}
+
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -1,178 +1,350 @@
 #!/usr/bin/env python3
 
-import sys, os, re, pysam
-import scipy.stats as stats
+import sys, os, re, random, zlib, pysam
+import numpy as np
 
 MY_DIR = os.path.dirname(os.path.realpath(__file__))
 PRE_DIR = os.path.join(MY_DIR, os.pardir)
 sys.path.append( PRE_DIR )
 
 import genomicFileHandler.genomic_file_handlers as genome
+import somaticseq.fast_stats as fast_stats
 from genomicFileHandler.read_info_extractor import * 
+from genomicFileHandler.read_cache import DecodedRead
 
 nan = float('nan')
 
 
-def from_bam(bam, my_coordinate, ref_base, first_alt, min_mq=1, min_bq=10):
+class BamFeatures:
+    '''The statistics that from_bam() extracts from a BAM file at a variant site, without the per-read lists they come from.'''
 
+    __slots__ = ('dp', 'MQ0', 'poor_read_count', 'noise_read_count', \
+                 'ref_for', 'ref_rev', 'alt_for', 'alt_rev', \
+                 'ref_mq', 'alt_mq', 'z_ranksums_mq', \
+                 'ref_bq', 'alt_bq', 'z_ranksums_bq', \
+                 'ref_NM', 'alt_NM', 'z_ranksums_NM', 'NM_Diff', \
+                 'ref_concordant_reads', 'ref_discordant_reads', 'alt_concordant_reads', 'alt_discordant_reads', 'concordance_fet', \
+                 'strandbias_fet', \
+                 'ref_SC_reads', 'ref_notSC_reads', 'alt_SC_reads', 'alt_notSC_reads', 'clipping_fet', \
+                 'z_ranksums_endpos', \
+                 'ref_indel_1bp', 'ref_indel_2bp', 'ref_indel_3bp', 'alt_indel_1bp', 'alt_indel_2bp', 'alt_indel_3bp', \
+                 'consistent_mates', 'inconsistent_mates')
+
+    fields = __slots__
+
+    def __init__(self, **features):
+        for field_i in self.fields:
+            setattr(self, field_i, features[field_i])
+
+    def values(self):
+        return tuple( getattr(self, field_i) for field_i in self.fields )
+
+
+
+def bam_features_table(records):
+    '''Put a list of BamFeatures into a numpy structured array, i.e., one column per feature.'''
+    return np.array( [record_i.values() for record_i in records], dtype=[ (field_i, float) for field_i in BamFeatures.fields ] )
+
+
+
+class ReadAccumulator:
+    '''The per-read lists that from_bam() tallies at a site. Pass one to from_bam() to recycle the same lists site after site.'''
+
+    __slots__ = ('ref_read_mq', 'alt_read_mq', 'ref_read_bq', 'alt_read_bq', 'ref_edit_distance', 'alt_edit_distance', \
+                 'ref_pos_from_end', 'alt_pos_from_end', 'ref_flanking_indel', 'alt_flanking_indel', 'qname_collector')
+
+    def __init__(self):
+        for list_i in self.__slots__[:-1]:
+            setattr(self, list_i, [])
+
+        self.qname_collector = {}
+
+    def clear(self):
+        for list_i in self.__slots__[:-1]:
+            getattr(self, list_i).clear()
+
+        self.qname_collector.clear()
+
+
+
+def allele_of_read(code_i, base_call_i, indel_length_i, ref_base, first_alt):
+    '''Return 0 if the read supports the reference, 1 if it supports the alternate allele, or 2 otherwise, given the output of position_of_aligned_read()'''
+
+    indel_length = len(first_alt) - len(ref_base)
+
+    # Reference calls:
+    if code_i == 1 and base_call_i == ref_base[0]:
+        return 0
+
+    # Alternate calls:
+    # SNV, or Deletion, or Insertion where I do not check for matching indel length
+    elif (indel_length == 0 and code_i == 1 and base_call_i == first_alt) or \
+         (indel_length < 0  and code_i == 2 and indel_length == indel_length_i) or \
+         (indel_length > 0  and code_i == 3):
+        return 1
+
+    # Inconsistent read or 2nd alternate calls:
+    else:
+        return 2
+
+
+
+def site_seed(my_coordinate, seed=0):
+    '''A random seed for each site that does not change from run to run (unlike hash() of strings)'''
+    return zlib.crc32( '{}:{}'.format(my_coordinate[0], my_coordinate[1]).encode() ) ^ seed
+
+
+
+class StrandStratifiedSample:
+    '''
+    Reservoir sampling of max_reads reads, one read at a time, where forward and reverse reads are sampled separately so the sample keeps the strand ratio of the site.
+    At most max_reads reads of each strand are kept, however deep the site is.
     '''
-    bam is the opened file handle of bam file
+
+    def __init__(self, max_reads, seed):
+
+        self.max_reads        = max_reads
+        self.random_generator = random.Random(seed)
+        self.reservoirs       = {False: [], True: []}
+        self.seen             = {False: 0,  True: 0}
+
+
+    def add(self, read_i):
+
+        strand_i = read_i.is_reverse
+        nth_read = self.seen[False] + self.seen[True]
+        self.seen[strand_i] += 1
+
+        reservoir_i = self.reservoirs[strand_i]
+        if len(reservoir_i) < self.max_reads:
+            reservoir_i.append( (nth_read, read_i) )
+        else:
+            j = self.random_generator.randrange( self.seen[strand_i] )
+            if j < self.max_reads:
+                reservoir_i[j] = (nth_read, read_i)
+
+
+    def reads(self):
+        '''The sampled reads in their original order, i.e., all of them if there were no more than max_reads.'''
+
+        n_reads = self.seen[False] + self.seen[True]
+
+        if n_reads <= self.max_reads:
+            sampled_reads = self.reservoirs[False] + self.reservoirs[True]
+
+        else:
+            n_reverse = round( self.max_reads * self.seen[True] / n_reads )
+            n_forward = self.max_reads - n_reverse
+            sampled_reads = self.random_generator.sample(self.reservoirs[False], n_forward) + self.random_generator.sample(self.reservoirs[True], n_reverse)
+
+        sampled_reads.sort(key=lambda read_i: read_i[0])
+
+        return [ read_i for nth_read, read_i in sampled_reads ]
+
+
+
+def from_bam(bam, my_coordinate, ref_base, first_alt, min_mq=1, min_bq=10, read_cache=None, accumulator=None, max_reads=0, sampling_seed=0):
+
+    '''
+    bam is the opened file handle of bam file, or anything with the same fetch() method, e.g., pileup_engine.StreamingPileup
     my_coordiate is a list or tuple of 0-based (contig, position)
+    read_cache is an optional read_cache.ReadCache, so reads spanning several nearby candidates are only decoded once
+    accumulator is an optional ReadAccumulator to be reused from call to call
+    max_reads: if there are more reads than this at the site, DP, MQ0 and DP4 are still counted from every read, but the other features, including read counts like the concordant, clipped and other reads, are from a sample of max_reads reads (0 means no limit)
+    Return BamFeatures
     '''
     
     indel_length = len(first_alt) - len(ref_base)
-    reads = bam.fetch( my_coordinate[0], my_coordinate[1]-1, my_coordinate[1] )
+    reads = ( read_i for read_i in bam.fetch( my_coordinate[0], my_coordinate[1]-1, my_coordinate[1] ) if not read_i.is_unmapped and dedup_test(read_i) )
     
-    ref_read_mq = []
-    alt_read_mq = []
-    ref_read_bq = []
-    alt_read_bq = []
-    ref_edit_distance = []
-    alt_edit_distance = []
+    if accumulator is None:
+        accumulator = ReadAccumulator()
+    else:
+        accumulator.clear()
+    
+    ref_read_mq = accumulator.ref_read_mq
+    alt_read_mq = accumulator.alt_read_mq
+    ref_read_bq = accumulator.ref_read_bq
+    alt_read_bq = accumulator.alt_read_bq
+    ref_edit_distance = accumulator.ref_edit_distance
+    alt_edit_distance = accumulator.alt_edit_distance
     
     ref_concordant_reads = alt_concordant_reads = ref_discordant_reads = alt_discordant_reads = 0
     ref_for = ref_rev = alt_for = alt_rev = dp = 0
     ref_SC_reads = alt_SC_reads = ref_notSC_reads = alt_notSC_reads = 0
     MQ0 = 0
     
-    ref_pos_from_end = []
-    alt_pos_from_end = []
-    ref_flanking_indel = []
-    alt_flanking_indel = []
+    ref_pos_from_end = accumulator.ref_pos_from_end
+    alt_pos_from_end = accumulator.alt_pos_from_end
+    ref_flanking_indel = accumulator.ref_flanking_indel
+    alt_flanking_indel = accumulator.alt_flanking_indel
     
     noise_read_count = poor_read_count  = 0
     
-    qname_collector = {}
+    qname_collector = accumulator.qname_collector
     
-    for read_i in reads:
-        if not read_i.is_unmapped and dedup_test(read_i):
+    # Ultra-deep sites: DP, MQ0 and DP4 are counted as the reads stream into a strand-stratified sample, and everything else is from the sample.
+    # Only the flag, the mapping quality and the base call at the site are looked at here, so the reads left out of the sample are never decoded.
+    if max_reads:
+        sample = StrandStratifiedSample(max_reads, site_seed(my_coordinate, sampling_seed))
+        
+        for read_i in reads:
             
+            sample.add(read_i)
             dp += 1
             
-            code_i, ith_base, base_call_i, indel_length_i, flanking_indel_i = position_of_aligned_read(read_i, my_coordinate[1]-1 )
-            
-            if read_i.mapping_quality < min_mq and mean(read_i.query_qualities) < min_bq:
-                poor_read_count += 1
-            
             if read_i.mapping_quality == 0:
                 MQ0 += 1
             
-            # Reference calls:
-            if code_i == 1 and base_call_i == ref_base[0]:
-
-                try:
-                    qname_collector[read_i.qname].append(0)
-                except KeyError:
-                    qname_collector[read_i.qname] = [0]
+            if read_i.mapping_quality < min_mq:
+                continue
             
-                ref_read_mq.append( read_i.mapping_quality )
-                ref_read_bq.append( read_i.query_qualities[ith_base] )
-                
-                try:
-                    ref_edit_distance.append( read_i.get_tag('NM') )
-                except KeyError:
-                    pass
-                
-                # Concordance
-                if        read_i.is_proper_pair  and read_i.mapping_quality >= min_mq and read_i.query_qualities[ith_base] >= min_bq:
-                    ref_concordant_reads += 1
-                elif (not read_i.is_proper_pair) and read_i.mapping_quality >= min_mq and read_i.query_qualities[ith_base] >= min_bq:
-                    ref_discordant_reads += 1
-                
-                # Orientation
-                if (not read_i.is_reverse) and read_i.mapping_quality >= min_mq and read_i.query_qualities[ith_base] >= min_bq:
+            code_i, ith_base, base_call_i, indel_length_i = call_of_aligned_read(read_i, my_coordinate[1]-1)
+            allele_i = allele_of_read(code_i, base_call_i, indel_length_i, ref_base, first_alt)
+            
+            if allele_i != 2 and read_i.query_qualities[ith_base] >= min_bq:
+                if   allele_i == 0 and not read_i.is_reverse:
                     ref_for += 1
-                elif    read_i.is_reverse  and read_i.mapping_quality >= min_mq and read_i.query_qualities[ith_base] >= min_bq:
+                elif allele_i == 0 and     read_i.is_reverse:
                     ref_rev += 1
-                
-                # Soft-clipped reads?
-                if read_i.cigar[0][0] == cigar_soft_clip or read_i.cigar[-1][0] == cigar_soft_clip:
-                    ref_SC_reads += 1
-                else:
-                    ref_notSC_reads += 1
-
-                # Distance from the end of the read:
-                if ith_base != None:
-                    ref_pos_from_end.append( min(ith_base, read_i.query_length-ith_base) )
-                    
-                # Flanking indels:
-                ref_flanking_indel.append( flanking_indel_i )
-
-            
-            # Alternate calls:
-            # SNV, or Deletion, or Insertion where I do not check for matching indel length
-            elif (indel_length == 0 and code_i == 1 and base_call_i == first_alt) or \
-                 (indel_length < 0  and code_i == 2 and indel_length == indel_length_i) or \
-                 (indel_length > 0  and code_i == 3):
-
-                try:
-                    qname_collector[read_i.qname].append(1)
-                except KeyError:
-                    qname_collector[read_i.qname] = [1]
-
-                alt_read_mq.append( read_i.mapping_quality )
-                alt_read_bq.append( read_i.query_qualities[ith_base] )
-                
-                try:
-                    alt_edit_distance.append( read_i.get_tag('NM') )
-                except KeyError:
-                    pass
-                
-                # Concordance
-                if        read_i.is_proper_pair  and read_i.mapping_quality >= min_mq and read_i.query_qualities[ith_base] >= min_bq:
-                    alt_concordant_reads += 1
-                elif (not read_i.is_proper_pair) and read_i.mapping_quality >= min_mq and read_i.query_qualities[ith_base] >= min_bq:
-                    alt_discordant_reads += 1
-                
-                # Orientation
-                if (not read_i.is_reverse) and read_i.mapping_quality >= min_mq and read_i.query_qualities[ith_base] >= min_bq:
+                elif allele_i == 1 and not read_i.is_reverse:
                     alt_for += 1
-                elif    read_i.is_reverse  and read_i.mapping_quality >= min_mq and read_i.query_qualities[ith_base] >= min_bq:
+                elif allele_i == 1 and     read_i.is_reverse:
                     alt_rev += 1
-                
-                # Soft-clipped reads?
-                if read_i.cigar[0][0] == cigar_soft_clip or read_i.cigar[-1][0] == cigar_soft_clip:
-                    alt_SC_reads += 1
-                else:
-                    alt_notSC_reads += 1
-
-                # Distance from the end of the read:
-                if ith_base != None:
-                    alt_pos_from_end.append( min(ith_base, read_i.query_length-ith_base) )
-                                        
-                # Flanking indels:
-                alt_flanking_indel.append( flanking_indel_i )
+        
+        reads = sample.reads()
+    
+    for read_i in reads:
+        
+        decoded_i = read_cache.decode(read_i) if read_cache else DecodedRead(read_i)
+        
+        code_i, ith_base, base_call_i, indel_length_i, flanking_indel_i = position_of_aligned_read(read_i, my_coordinate[1]-1, decoded_i.blocks )
+        allele_i = allele_of_read(code_i, base_call_i, indel_length_i, ref_base, first_alt)
+        
+        if read_i.mapping_quality < min_mq and decoded_i.mean_bq < min_bq:
+            poor_read_count += 1
+        
+        if not max_reads:
+            dp += 1
+            
+            if read_i.mapping_quality == 0:
+                MQ0 += 1
+        
+        # Reference calls:
+        if allele_i == 0:
+
+            try:
+                qname_collector[read_i.qname].append(0)
+            except KeyError:
+                qname_collector[read_i.qname] = [0]
+        
+            bq_i = decoded_i.qualities[ith_base]
+            good_read = read_i.mapping_quality >= min_mq and bq_i >= min_bq
+            
+            ref_read_mq.append( read_i.mapping_quality )
+            ref_read_bq.append( bq_i )
+            
+            if decoded_i.edit_distance is not None:
+                ref_edit_distance.append( decoded_i.edit_distance )
+            
+            # Concordance
+            if        decoded_i.proper_pair  and good_read:
+                ref_concordant_reads += 1
+            elif (not decoded_i.proper_pair) and good_read:
+                ref_discordant_reads += 1
             
+            # Orientation (already counted from all the reads if max_reads)
+            if (not decoded_i.reverse) and good_read and not max_reads:
+                ref_for += 1
+            elif    decoded_i.reverse  and good_read and not max_reads:
+                ref_rev += 1
             
-            # Inconsistent read or 2nd alternate calls:
+            # Soft-clipped reads?
+            if decoded_i.soft_clipped:
+                ref_SC_reads += 1
             else:
+                ref_notSC_reads += 1
+
+            # Distance from the end of the read:
+            if ith_base != None:
+                ref_pos_from_end.append( min(ith_base, read_i.query_length-ith_base) )
                 
-                try:
-                    qname_collector[read_i.qname].append(2)
-                except KeyError:
-                    qname_collector[read_i.qname] = [2]
-                
-                noise_read_count += 1
-    
+            # Flanking indels:
+            ref_flanking_indel.append( flanking_indel_i )
+
+        
+        # Alternate calls:
+        elif allele_i == 1:
+
+            try:
+                qname_collector[read_i.qname].append(1)
+            except KeyError:
+                qname_collector[read_i.qname] = [1]
+
+            bq_i = decoded_i.qualities[ith_base]
+            good_read = read_i.mapping_quality >= min_mq and bq_i >= min_bq
+            
+            alt_read_mq.append( read_i.mapping_quality )
+            alt_read_bq.append( bq_i )
+            
+            if decoded_i.edit_distance is not None:
+                alt_edit_distance.append( decoded_i.edit_distance )
+            
+            # Concordance
+            if        decoded_i.proper_pair  and good_read:
+                alt_concordant_reads += 1
+            elif (not decoded_i.proper_pair) and good_read:
+                alt_discordant_reads += 1
+            
+            # Orientation (already counted from all the reads if max_reads)
+            if (not decoded_i.reverse) and good_read and not max_reads:
+                alt_for += 1
+            elif    decoded_i.reverse  and good_read and not max_reads:
+                alt_rev += 1
+            
+            # Soft-clipped reads?
+            if decoded_i.soft_clipped:
+                alt_SC_reads += 1
+            else:
+                alt_notSC_reads += 1
+
+            # Distance from the end of the read:
+            if ith_base != None:
+                alt_pos_from_end.append( min(ith_base, read_i.query_length-ith_base) )
+                                    
+            # Flanking indels:
+            alt_flanking_indel.append( flanking_indel_i )
+        
+        
+        # Inconsistent read or 2nd alternate calls:
+        else:
+            
+            try:
+                qname_collector[read_i.qname].append(2)
+            except KeyError:
+                qname_collector[read_i.qname] = [2]
+            
+            noise_read_count += 1
+
     # Done extracting info from tumor BAM. Now tally them:
     ref_mq        = mean(ref_read_mq)
     alt_mq        = mean(alt_read_mq)
-    z_ranksums_mq = stats.ranksums(alt_read_mq, ref_read_mq)[0]
+    z_ranksums_mq = fast_stats.ranksums_z(alt_read_mq, ref_read_mq)
     
     ref_bq        = mean(ref_read_bq)
     alt_bq        = mean(alt_read_bq)
-    z_ranksums_bq = stats.ranksums(alt_read_bq, ref_read_bq)[0]
+    z_ranksums_bq = fast_stats.ranksums_z(alt_read_bq, ref_read_bq)
     
     ref_NM        = mean(ref_edit_distance)
     alt_NM        = mean(alt_edit_distance)
-    z_ranksums_NM = stats.ranksums(alt_edit_distance, ref_edit_distance)[0]
+    z_ranksums_NM = fast_stats.ranksums_z(alt_edit_distance, ref_edit_distance)
     NM_Diff       = alt_NM - ref_NM - abs(indel_length)
     
-    concordance_fet = stats.fisher_exact(( (ref_concordant_reads, alt_concordant_reads), (ref_discordant_reads, alt_discordant_reads) ))[1]
-    strandbias_fet  = stats.fisher_exact(( (ref_for, alt_for), (ref_rev, alt_rev) ))[1]
-    clipping_fet    = stats.fisher_exact(( (ref_notSC_reads, alt_notSC_reads), (ref_SC_reads, alt_SC_reads) ))[1]
+    concordance_fet = fast_stats.fisher_exact_p(( (ref_concordant_reads, alt_concordant_reads), (ref_discordant_reads, alt_discordant_reads) ))
+    strandbias_fet  = fast_stats.fisher_exact_p(( (ref_for, alt_for), (ref_rev, alt_rev) ))
+    clipping_fet    = fast_stats.fisher_exact_p(( (ref_notSC_reads, alt_notSC_reads), (ref_SC_reads, alt_SC_reads) ))
     
-    z_ranksums_endpos = stats.ranksums(alt_pos_from_end, ref_pos_from_end)[0]
+    z_ranksums_endpos = fast_stats.ranksums_z(alt_pos_from_end, ref_pos_from_end)
     
     ref_indel_1bp = ref_flanking_indel.count(1)
     ref_indel_2bp = ref_flanking_indel.count(2) + ref_indel_1bp
@@ -192,7 +364,19 @@ def from_bam(bam, my_coordinate, ref_base, first_alt, min_mq=1, min_bq=10):
         elif len(qname_collector[pairs_i]) == 2 and 1 in qname_collector[pairs_i]:
             inconsistent_mates += 1
 
-    return vars()
+    return BamFeatures(dp = dp, MQ0 = MQ0, poor_read_count = poor_read_count, noise_read_count = noise_read_count, \
+                       ref_for = ref_for, ref_rev = ref_rev, alt_for = alt_for, alt_rev = alt_rev, \
+                       ref_mq = ref_mq, alt_mq = alt_mq, z_ranksums_mq = z_ranksums_mq, \
+                       ref_bq = ref_bq, alt_bq = alt_bq, z_ranksums_bq = z_ranksums_bq, \
+                       ref_NM = ref_NM, alt_NM = alt_NM, z_ranksums_NM = z_ranksums_NM, NM_Diff = NM_Diff, \
+                       ref_concordant_reads = ref_concordant_reads, ref_discordant_reads = ref_discordant_reads, \
+                       alt_concordant_reads = alt_concordant_reads, alt_discordant_reads = alt_discordant_reads, concordance_fet = concordance_fet, \
+                       strandbias_fet = strandbias_fet, \
+                       ref_SC_reads = ref_SC_reads, ref_notSC_reads = ref_notSC_reads, alt_SC_reads = alt_SC_reads, alt_notSC_reads = alt_notSC_reads, clipping_fet = clipping_fet, \
+                       z_ranksums_endpos = z_ranksums_endpos, \
+                       ref_indel_1bp = ref_indel_1bp, ref_indel_2bp = ref_indel_2bp, ref_indel_3bp = ref_indel_3bp, \
+                       alt_indel_1bp = alt_indel_1bp, alt_indel_2bp = alt_indel_2bp, alt_indel_3bp = alt_indel_3bp, \
+                       consistent_mates = consistent_mates, inconsistent_mates = inconsistent_mates)
 
 
 
@@ -257,6 +441,118 @@ def from_genome_reference(ref_fa, my_coordinate, ref_base, first_alt):
 
 
 
+def run_lengths(sequence):
+    '''For a numpy array, the number of identical values in a row ending at each position, e.g., AABCCC --> 1,2,1,1,2,3'''
+
+    index   = np.arange(sequence.size)
+    new_run = np.ones(sequence.size, dtype=bool)
+    new_run[1:] = sequence[1:] != sequence[:-1]
+
+    return index - np.maximum.accumulate( np.where(new_run, index, 0) ) + 1
+
+
+
+class ReferenceHomopolymers:
+    '''
+    Same output as from_genome_reference(), but a chunk of the reference is fetched once, and the homopolymer runs of the whole chunk are tallied with numpy:
+        run_left[i]:  length of the run of identical bases that ends at i
+        run_right[i]: length of the run of identical bases that starts at i
+        left_max[i]:  longest run in the 20 bases before i, i.e., lseq in from_genome_reference()
+        right_max[i]: longest run in the 20 bases after i+1, i.e., rseq in from_genome_reference()
+    Then, for each site, only the runs that touch the ref/alt allele are counted.
+    '''
+
+    flank = 20
+
+    def __init__(self, ref_fa, chunk_size=1000000):
+
+        self.ref_fa      = ref_fa
+        self.chunk_size  = max(chunk_size, 2*self.flank+1)
+
+        self.contig      = None
+        self.chunk_start = self.chunk_end = 0
+
+
+    def _load(self, contig_i, position_i):
+
+        contig_length    = self.ref_fa.get_reference_length(contig_i)
+        self.contig      = contig_i
+        self.chunk_start = min( max(0, position_i - self.flank), contig_length )
+        self.chunk_end   = min( contig_length, self.chunk_start + self.chunk_size )
+
+        sequence = self.ref_fa.fetch(contig_i, self.chunk_start, self.chunk_end)
+        sequence = sequence.decode() if isinstance(sequence, bytes) else sequence
+        self.sequence = sequence
+
+        # Padded with 0's, which are not bases, so the windows at the ends of the chunk need no special treatment:
+        flank  = self.flank
+        bases  = np.zeros( len(sequence) + 2*flank + 2, dtype=np.uint8 )
+        bases[ flank+1 : flank+1+len(sequence) ] = np.frombuffer(sequence.encode(), dtype=np.uint8)
+        is_base = bases != 0
+
+        run_left  = np.where(is_base, run_lengths(bases), 0)
+        run_right = np.where(is_base, run_lengths(bases[::-1])[::-1], 0)
+
+        # Longest run within a window, where a run is cut off by the edge of the window:
+        left_max  = np.zeros(bases.size, dtype=np.int64)
+        right_max = np.zeros(bases.size, dtype=np.int64)
+        for k in range(flank):
+            # left_max[i]: window [i-flank, i), position i-flank+k is k+1 bases into the window
+            left_max[flank:]    = np.maximum( left_max[flank:],   np.minimum(run_left[k:bases.size-flank+k], k+1) )
+            # right_max[i]: window [i+1, i+1+flank), position i+1+k is flank-k bases from the end of the window
+            right_max[:-flank]  = np.maximum( right_max[:-flank],  np.minimum(run_right[1+k:bases.size-flank+1+k], flank-k) )
+
+        # Index of padded arrays = position - chunk_start + offset
+        self.offset        = flank + 1
+        self.run_left      = run_left
+        self.run_right     = run_right
+        self.left_max      = left_max
+        self.right_max     = right_max
+        self.contig_length = contig_length
+
+
+    def homopolymer_lengths(self, my_coordinate, ref_base, first_alt):
+        '''Return (homopolymer_length, site_homopolymer_length) like from_genome_reference(ref_fa, my_coordinate, ref_base, first_alt)'''
+
+        contig_i, position_i = my_coordinate[0], my_coordinate[1]
+        flank = self.flank
+
+        if contig_i != self.contig:
+            self._load(contig_i, position_i)
+
+        # Beyond the end of the contig:
+        if position_i >= self.contig_length:
+            return from_genome_reference(self.ref_fa, my_coordinate, ref_base, first_alt)
+
+        if not ( self.chunk_start <= max(0, position_i-flank) and min(self.contig_length, position_i+flank+1) <= self.chunk_end ):
+            self._load(contig_i, position_i)
+
+        i = position_i - self.chunk_start + self.offset
+
+        # The run at the end of lseq and the run at the beginning of rseq:
+        left_base   = self.sequence[position_i - self.chunk_start - 1] if position_i > 0 else ''
+        left_run    = int( min(self.run_left[i-1], flank) )
+        rseq_length = min(self.contig_length, position_i+flank+1) - (position_i+1)
+        right_base  = self.sequence[position_i - self.chunk_start + 1] if rseq_length > 0 else ''
+        right_run   = int( min(self.run_right[i+1], rseq_length) )
+
+        # Runs that do not touch the allele, and the runs that go through the ref or alt allele:
+        homopolymer_length = int( max(self.left_max[i], self.right_max[i]) )
+        for allele_i in ref_base, first_alt:
+            homopolymer_length = max( homopolymer_length, max( genome.count_repeating_bases( left_base*left_run + allele_i + right_base*right_run ) ) )
+
+        # Homopolymer spanning the variant site:
+        ref_c = (right_run if right_base == ref_base  else 0) + (left_run if left_base == ref_base  else 0)
+        alt_c = (right_run if right_base == first_alt else 0) + (left_run if left_base == first_alt else 0)
+
+        site_homopolymer_length = max( alt_c+1, ref_c+1 )
+
+        return homopolymer_length, site_homopolymer_length
+
+
+
+
+
 def somaticOddRatio(n_ref, n_alt, t_ref, t_alt, max_value=100):
 
     # Odds Ratio just like VarDict's output
@@ -1,18 +1,27 @@
 #!/usr/bin/env python3
 
-import sys, argparse, math, gzip, os, pysam, re, logging
+import sys, argparse, math, gzip, os, pysam, re, logging, tempfile, shutil
 
 MY_DIR = os.path.dirname(os.path.realpath(__file__))
 PRE_DIR = os.path.join(MY_DIR, os.pardir)
 sys.path.append( PRE_DIR )
 
-import scipy.stats as stats
 from copy import copy
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 from genomicFileHandler.read_info_extractor import *
 import genomicFileHandler.genomic_file_handlers as genome
 import somaticseq.annotate_caller as annotate_caller
 import somaticseq.sequencing_features as sequencing_features
+import somaticseq.fast_stats as fast_stats
+from somaticseq.feature_cache import FeatureCache
+import genomicFileHandler.pileup_engine as pileup_engine
+import genomicFileHandler.read_cache as read_cache
+import genomicFileHandler.annotation_index as annotation_index
+import genomicFileHandler.columnar_tsv as columnar_tsv
+import genomicFileHandler.checkpoint as checkpoint
+import genomicFileHandler.candidate_sites as candidate_sites
+import genomicFileHandler.concat as concat
 
 ch = logging.StreamHandler()
 ch.setLevel(logging.DEBUG)
@@ -143,15 +152,15 @@ def run():
 
     input_sites = parser.add_mutually_exclusive_group()
     input_sites.add_argument('-myvcf',  '--vcf-format',           type=str,   help='Input file is VCF formatted.')
-    input_sites.add_argument('-mybed',  '--bed-format',           type=str,   help='Input file is BED formatted.')
-    input_sites.add_argument('-mypos',  '--positions-list',       type=str,   help='A list of positions: tab seperating contig and positions.')
+    input_sites.add_argument('-mybed',  '--bed-format',           type=str,   help='Input file is BED formatted. Every position is a site, whose REF is the base in the reference FASTA and whose ALT is \'.\', so the read features are those of the reference-supporting reads.')
+    input_sites.add_argument('-mypos',  '--positions-list',       type=str,   help='A list of positions: tab seperating contig and positions. REF and ALT as in -mybed.')
 
     parser.add_argument('-nbam', '--normal-bam-file',             type=str,   help='Normal BAM File',   required=True)
     parser.add_argument('-tbam', '--tumor-bam-file',              type=str,   help='Tumor BAM File',    required=True)
 
     parser.add_argument('-truth',     '--ground-truth-vcf',       type=str,   help='VCF of true hits')
-    parser.add_argument('-dbsnp',     '--dbsnp-vcf',              type=str,   help='dbSNP VCF: do not use if input VCF is annotated')
-    parser.add_argument('-cosmic',    '--cosmic-vcf',             type=str,   help='COSMIC VCF: do not use if input VCF is annotated')
+    parser.add_argument('-dbsnp',     '--dbsnp-vcf',              type=str,   help='dbSNP VCF (or its index from annotation_index.py): do not use if input VCF is annotated')
+    parser.add_argument('-cosmic',    '--cosmic-vcf',             type=str,   help='COSMIC VCF (or its index from annotation_index.py): do not use if input VCF is annotated')
 
     parser.add_argument('-mutect',   '--mutect-vcf',              type=str,   help='MuTect VCF',        )
     parser.add_argument('-strelka',  '--strelka-vcf',             type=str,   help='Strelka VCF',       )
@@ -173,6 +182,23 @@ def run():
     parser.add_argument('-mincaller', '--minimum-num-callers',    type=float, help='Minimum number of tools to be considered', default=0)
 
     parser.add_argument('-scale',      '--p-scale',               type=str,   help='phred, fraction, or none')
+    parser.add_argument('-stream',     '--stream-bam',   action='store_true', help='Stream each BAM file once over the sorted sites instead of one query per site', default=False)
+    parser.add_argument('-tile',       '--tile-size',             type=int,   help='In BED or whole-genome mode, read the BAM file(s) this many bp at a time and index the reads by where they begin. 0 to query position by position.', default=10000)
+    parser.add_argument('-readcache',  '--read-cache-size',       type=int,   help='Number of decoded reads kept for nearby sites, 0 to disable', default=20000)
+    parser.add_argument('-scipy',      '--scipy-stats',  action='store_true', help='Compute the rank-sum and Fisher\'s exact tests with scipy.stats instead of the faster equivalents, e.g., for validation', default=False)
+    parser.add_argument('-fetdepth',   '--fisher-exact-depth',    type=int,   help='Fisher\'s exact tests of tables of more reads than this are summed with numpy from log-factorials, within a relative 1e-9 of scipy.stats', default=10000)
+    parser.add_argument('-maxreads',   '--max-reads-per-site',    type=int,   help='Compute the read features from a strand-stratified sample of this many reads at deeper sites, while DP, MQ0 and DP4 are still counted from every read. Read counts such as *_Concordant, *_Discordant, *_Clipped_Reads, *_Other_Reads and *_Poor_Reads are then counts within the sample, not scaled to the depth. 0 means no limit.', default=0)
+    parser.add_argument('-seed',       '--sampling-seed',         type=int,   help='Random seed for --max-reads-per-site', default=0)
+    parser.add_argument('-concurrent', '--concurrent-bams', action='store_true', help='Extract the normal and tumor BAM features at the same time in two threads', default=False)
+
+    parser.add_argument('-nt',         '--threads',               type=int,   help='Split the candidate VCF file into this many contiguous chunks, and extract their features in parallel processes', default=1)
+
+    parser.add_argument('-prefilter',  '--prefilter-min-alt-reads', type=int, help='Without candidate sites, only evaluate the positions where a non-reference base has at least this many reads in the tumor BAM file (0 evaluates every position)', default=0)
+    parser.add_argument('-prefilterVAF', '--prefilter-min-vaf',   type=float, help='... and at least this fraction of the depth', default=0.0)
+    parser.add_argument('-fcache',     '--feature-cache',         type=str,   help='SQLite database of BAM features from earlier runs, which is looked up before and updated after reading the BAM file(s)')
+    parser.add_argument('-ckpt',       '--checkpoint-every',      type=int,   help='Flush the TSV file and checkpoint it every this many candidate coordinates (0 to turn off)', default=10000)
+    parser.add_argument('-resume',     '--resume',                action='store_true', help='Resume from the last checkpoint of the output TSV file, i.e., after the run was killed')
+    parser.add_argument('-columnar',   '--columnar-output',       type=str,   help='Also write the features into this Feather file (.feather or .arrow, needs pyarrow), which tsv2vcf and the R classifiers read. run_somaticseq.py and somaticseq_parallel.py use the TSV files.')
 
     parser.add_argument('-outfile',    '--output-tsv-file',       type=str,   help='Output TSV Name', default=os.sys.stdout)
 
@@ -184,12 +210,37 @@ def run():
 
 
 
-def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, truth=None, cosmic=None, dbsnp=None, mutect=None, varscan=None, jsm=None, sniper=None, vardict=None, muse=None, lofreq=None, scalpel=None, strelka=None, tnscope=None, platypus=None, dedup=True, min_mq=1, min_bq=5, min_caller=0, ref_fa=None, p_scale=None, outfile=None):
+def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, truth=None, cosmic=None, dbsnp=None, mutect=None, varscan=None, jsm=None, sniper=None, vardict=None, muse=None, lofreq=None, scalpel=None, strelka=None, tnscope=None, platypus=None, dedup=True, min_mq=1, min_bq=5, min_caller=0, ref_fa=None, p_scale=None, stream_bam=False, tile_size=10000, read_cache_size=20000, scipy_stats=False, fisher_depth=10000, max_reads_per_site=0, sampling_seed=0, concurrent_bams=False, threads=1, prefilter_min_alt_reads=0, prefilter_min_vaf=0.0, feature_cache=None, checkpoint_every=10000, resume=False, columnar=None, outfile=None):
+
+    if columnar:
+        columnar_tsv.check_feather(columnar)
+
+    # Whole genome: only the positions with evidence of a non-reference base, if asked for:
+    if prefilter_min_alt_reads > 0 and not (is_vcf or is_bed or is_pos):
+        vcf2tsv_on_candidates( dict(locals()) )
+        return
+
+    # Contiguous chunks of the candidate VCF file are done in parallel processes, each with its own BAM and FASTA handles:
+    if threads > 1 and is_vcf:
+        vcf2tsv_in_chunks( dict(locals()) )
+        return
+
+    # The arguments that change the output, which cannot change when a run is resumed:
+    arguments = { key_i: value_i for key_i, value_i in locals().items() if key_i not in ('stream_bam', 'tile_size', 'read_cache_size', 'feature_cache', 'concurrent_bams', 'threads', 'checkpoint_every', 'resume', 'columnar') }
 
     # Convert contig_sequence to chrom_seq dict:
     fai_file  = ref_fa + '.fai'
     chrom_seq = genome.faiordict2contigorder(fai_file, 'fai')
 
+    # Pick up after the last checkpoint, if any, instead of starting over:
+    checkpoints = checkpoint.TsvCheckpoint(outfile, chrom_seq, arguments, checkpoint_every)
+    resume_code = checkpoints.resume() if resume else None
+
+    if resume_code is not None:
+        logger.info('Resuming {} after {}:{}, where {} rows were written.'.format(outfile, checkpoints.coordinate[0], checkpoints.coordinate[1], checkpoints.rows))
+    elif resume:
+        logger.info('No checkpoint of {} to resume from.'.format(outfile))
+
     # Determine input format:
     if is_vcf:
         mysites = is_vcf
@@ -201,6 +252,10 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
         mysites = fai_file
         logger.info('No position supplied. Will evaluate the whole genome.')
 
+    # Validate the faster statistical tests against scipy.stats:
+    fast_stats.use_scipy = scipy_stats
+    fast_stats.set_max_depth(fisher_depth)
+
     # Re-scale output or not:
     if p_scale == None:
         logger.info('NO RE-SCALING')
@@ -218,7 +273,7 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
     pattern_chr_position = genome.pattern_chr_position
 
     ## Running
-    with genome.open_textfile(mysites) as my_sites, open(outfile, 'w') as outhandle:
+    with genome.open_textfile(mysites) as my_sites, open(outfile, 'w' if resume_code is None else 'a') as outhandle:
 
         my_line = my_sites.readline().rstrip()
 
@@ -226,74 +281,143 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
         tbam    = pysam.AlignmentFile(tbam_fn, reference_filename=ref_fa)
         ref_fa  = pysam.FastaFile(ref_fa)
 
+        # Homopolymer runs of a chunk of the reference at a time:
+        ref_homopolymers = sequencing_features.ReferenceHomopolymers(ref_fa)
+
+        # One streaming pass over each BAM file, keeping the reads that overlap the current site:
+        if stream_bam:
+            nbam = pileup_engine.StreamingPileup(nbam)
+            tbam = pileup_engine.StreamingPileup(tbam)
+
+        # BED regions or whole genome: one BAM query per tile instead of one per position:
+        elif tile_size > 0 and not (is_vcf or is_pos):
+            nbam = pileup_engine.TiledPileup(nbam, tile_size)
+            tbam = pileup_engine.TiledPileup(tbam, tile_size)
+
+        # Reads decoded at one site are reused at the nearby sites:
+        nbam_cache = read_cache.ReadCache(read_cache_size) if read_cache_size > 0 else None
+        tbam_cache = read_cache.ReadCache(read_cache_size) if read_cache_size > 0 else None
+
+        # Features of the variants from earlier runs are looked up instead of extracted from the BAM files again:
+        nbam_features = FeatureCache(feature_cache, nbam_fn, dedup) if feature_cache else None
+        tbam_features = FeatureCache(feature_cache, tbam_fn, dedup) if feature_cache else None
+
+        nbam_from_bam = nbam_features.from_bam if nbam_features else sequencing_features.from_bam
+        tbam_from_bam = tbam_features.from_bam if tbam_features else sequencing_features.from_bam
+
+        # Per-read lists recycled from site to site:
+        nbam_accumulator = sequencing_features.ReadAccumulator()
+        tbam_accumulator = sequencing_features.ReadAccumulator()
+
+        # The normal BAM file is read in a second thread while the tumor BAM file is read in this one. Each BAM file has its own handle, read cache, and accumulator.
+        bam_executor = ThreadPoolExecutor(max_workers=1) if concurrent_bams else None
+
+        # Supporting VCF files that are bgzipped and indexed are only read where the candidates are:
+        if is_vcf or is_bed or is_pos:
+            vcf_regions = genome.candidate_regions(mysites, 'vcf' if is_vcf else 'bed' if is_bed else 'pos')
+        else:
+            vcf_regions = None
+
+        if resume_code is not None:
+            vcf_regions = checkpoint.regions_after(vcf_regions, chrom_seq, resume_code)
+
         if truth:
-            truth = genome.open_textfile(truth)
+            truth = genome.open_vcf_region(truth, vcf_regions, chrom_seq)
             truth_line = genome.skip_vcf_header( truth )
 
-        if cosmic:
-            cosmic = genome.open_textfile(cosmic)
+        # dbSNP and COSMIC can also be prebuilt annotation indices (see annotation_index.py), which are looked up directly:
+        if cosmic and annotation_index.is_annotation_index(cosmic):
+            cosmic = annotation_index.AnnotationIndex(cosmic)
+
+        elif cosmic:
+            cosmic = genome.open_vcf_region(cosmic, vcf_regions, chrom_seq)
             cosmic_line = genome.skip_vcf_header( cosmic )
 
-        if dbsnp:
-            dbsnp = genome.open_textfile(dbsnp)
+        if dbsnp and annotation_index.is_annotation_index(dbsnp):
+            dbsnp = annotation_index.AnnotationIndex(dbsnp)
+
+        elif dbsnp:
+            dbsnp = genome.open_vcf_region(dbsnp, vcf_regions, chrom_seq)
             dbsnp_line = genome.skip_vcf_header( dbsnp )
 
         # 10 Incorporate callers: get thru the #'s
         if mutect:
-            mutect = genome.open_textfile(mutect)
+            mutect = genome.open_vcf_region(mutect, vcf_regions, chrom_seq)
             mutect_line = genome.skip_vcf_header( mutect )
 
         if varscan:
-            varscan = genome.open_textfile(varscan)
+            varscan = genome.open_vcf_region(varscan, vcf_regions, chrom_seq)
             varscan_line = genome.skip_vcf_header( varscan )
 
         if jsm:
-            jsm = genome.open_textfile(jsm)
+            jsm = genome.open_vcf_region(jsm, vcf_regions, chrom_seq)
             jsm_line = genome.skip_vcf_header( jsm )
 
         if sniper:
-            sniper = genome.open_textfile(sniper)
+            sniper = genome.open_vcf_region(sniper, vcf_regions, chrom_seq)
             sniper_line = genome.skip_vcf_header( sniper )
 
         if vardict:
-            vardict = genome.open_textfile(vardict)
+            vardict = genome.open_vcf_region(vardict, vcf_regions, chrom_seq)
             vardict_line = genome.skip_vcf_header( vardict )
 
         if muse:
-            muse = genome.open_textfile(muse)
+            muse = genome.open_vcf_region(muse, vcf_regions, chrom_seq)
             muse_line = genome.skip_vcf_header( muse )
 
         if lofreq:
-            lofreq = genome.open_textfile(lofreq)
+            lofreq = genome.open_vcf_region(lofreq, vcf_regions, chrom_seq)
             lofreq_line = genome.skip_vcf_header( lofreq )
 
         if scalpel:
-            scalpel = genome.open_textfile(scalpel)
+            scalpel = genome.open_vcf_region(scalpel, vcf_regions, chrom_seq)
             scalpel_line = genome.skip_vcf_header( scalpel )
 
         if strelka:
-            strelka = genome.open_textfile(strelka)
+            strelka = genome.open_vcf_region(strelka, vcf_regions, chrom_seq)
             strelka_line = genome.skip_vcf_header( strelka )
 
         if tnscope:
-            tnscope = genome.open_textfile(tnscope)
+            tnscope = genome.open_vcf_region(tnscope, vcf_regions, chrom_seq)
             tnscope_line = genome.skip_vcf_header( tnscope )
 
         if platypus:
-            platypus      = genome.open_textfile(platypus)
+            platypus      = genome.open_vcf_region(platypus, vcf_regions, chrom_seq)
             platypus_line = genome.skip_vcf_header( platypus )
 
+        # All the VCF files are read in lock step, so each of them only moves forward when the candidate coordinate catches up:
+        vcf_streams = genome.VcfStreamMerger(chrom_seq)
+        if truth:    vcf_streams.add('truth',    truth,    truth_line)
+        if cosmic and not isinstance(cosmic, annotation_index.AnnotationIndex):
+            vcf_streams.add('cosmic', cosmic, cosmic_line)
+        if dbsnp and not isinstance(dbsnp, annotation_index.AnnotationIndex):
+            vcf_streams.add('dbsnp', dbsnp, dbsnp_line)
+        if mutect:   vcf_streams.add('mutect',   mutect,   mutect_line)
+        if varscan:  vcf_streams.add('varscan',  varscan,  varscan_line)
+        if jsm:      vcf_streams.add('jsm',      jsm,      jsm_line)
+        if sniper:   vcf_streams.add('sniper',   sniper,   sniper_line)
+        if vardict:  vcf_streams.add('vardict',  vardict,  vardict_line)
+        if muse:     vcf_streams.add('muse',     muse,     muse_line)
+        if lofreq:   vcf_streams.add('lofreq',   lofreq,   lofreq_line)
+        if scalpel:  vcf_streams.add('scalpel',  scalpel,  scalpel_line)
+        if strelka:  vcf_streams.add('strelka',  strelka,  strelka_line)
+        if tnscope:  vcf_streams.add('tnscope',  tnscope,  tnscope_line)
+        if platypus: vcf_streams.add('platypus', platypus, platypus_line)
+
         # Get through all the headers:
         while my_line.startswith('#') or my_line.startswith('track='):
             my_line = my_sites.readline().rstrip()
 
 
         # First coordinate, for later purpose of making sure the input is sorted properly
-        coordinate_i = re.match( genome.pattern_chr_position, my_line )
-        coordinate_i = coordinate_i.group() if coordinate_i else ''
+        coordinate_i = genome.line_coordinate_code( my_line, chrom_seq )
+
+        # First line, unless it is already there before the checkpoint:
+        if resume_code is None:
+            outhandle.write( out_header.replace('{','').replace('}','')  + '\n' )
 
-        # First line:
-        outhandle.write( out_header.replace('{','').replace('}','')  + '\n' )
+        # The same rows in a columnar file, if asked for:
+        columnar_out = columnar_tsv.ColumnarWriter( columnar, out_header.replace('{','').replace('}','').split('\t') ) if columnar and resume_code is None else None
 
         while my_line:
 
@@ -320,10 +444,9 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
                     my_vcf = genome.Vcf_line( my_line )
 
                     ########## This block is code is to ensure the input VCF file is properly sorted ##
-                    coordinate_j = re.match( genome.pattern_chr_position, my_line )
-                    coordinate_j = coordinate_j.group() if coordinate_j else ''
+                    coordinate_j = genome.line_coordinate_code( my_line, chrom_seq )
 
-                    if genome.whoisbehind(coordinate_i, coordinate_j, chrom_seq) == 1:
+                    if coordinate_j < coordinate_i:
                         raise Exception( '{} does not seem to be properly sorted.'.format(mysites) )
 
                     coordinate_i = coordinate_j
@@ -353,6 +476,12 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
             ##### ##### ##### ##### ##### #####
             for my_coordinate in my_coordinates:
 
+                # Already written before the checkpoint:
+                if resume_code is not None and genome.coordinate_code(my_coordinate, chrom_seq) <= resume_code:
+                    continue
+
+                rows_here = 0
+
                 ######## If VCF, can get ref base, variant base, as well as other identifying information ########
                 if is_vcf:
 
@@ -385,11 +514,13 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
 
                         all_my_identifiers.append( my_identifier_i )
 
-                ## If not, 1) get ref_base, first_alt from other VCF files.
+                ## If not, 1) get ref_base from the reference FASTA file. There is no ALT ('.'), so the read features are those of the reference reads.
                 #          2) Create placeholders for dbSNP and COSMIC that can be overwritten with dbSNP/COSMIC VCF files (if provided)
                 else:
                     variants_at_my_coordinate = [None] # Just to have something to iterate
-                    ref_base = first_alt = indel_length = None
+                    ref_base = ref_fa.fetch( my_coordinate[0], my_coordinate[1]-1, my_coordinate[1] ).upper()
+                    first_alt = '.'
+                    indel_length = 0
 
                     # Could be re-written if dbSNP/COSMIC are supplied. If not, they will remain NaN.
                     if_dbsnp = if_cosmic = if_common = num_cases = nan
@@ -398,20 +529,21 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
                 num_callers = 0
 
                 #################################### Find the same coordinate in those VCF files ####################################
-                if mutect:   got_mutect,   mutect_variants,   mutect_line   = genome.find_vcf_at_coordinate(my_coordinate, mutect_line,  mutect,  chrom_seq)
-                if varscan:  got_varscan,  varscan_variants,  varscan_line  = genome.find_vcf_at_coordinate(my_coordinate, varscan_line, varscan, chrom_seq)
-                if jsm:      got_jsm,      jsm_variants,      jsm_line      = genome.find_vcf_at_coordinate(my_coordinate, jsm_line,     jsm,     chrom_seq)
-                if sniper:   got_sniper,   sniper_variants,   sniper_line   = genome.find_vcf_at_coordinate(my_coordinate, sniper_line,  sniper,  chrom_seq)
-                if vardict:  got_vardict,  vardict_variants,  vardict_line  = genome.find_vcf_at_coordinate(my_coordinate, vardict_line, vardict, chrom_seq)
-                if muse:     got_muse,     muse_variants,     muse_line     = genome.find_vcf_at_coordinate(my_coordinate, muse_line,    muse,    chrom_seq)
-                if lofreq:   got_lofreq,   lofreq_variants,   lofreq_line   = genome.find_vcf_at_coordinate(my_coordinate, lofreq_line,  lofreq,  chrom_seq)
-                if scalpel:  got_scalpel,  scalpel_variants,  scalpel_line  = genome.find_vcf_at_coordinate(my_coordinate, scalpel_line, scalpel, chrom_seq)
-                if strelka:  got_strelka,  strelka_variants,  strelka_line  = genome.find_vcf_at_coordinate(my_coordinate, strelka_line, strelka, chrom_seq)
-                if tnscope:  got_tnscope,  tnscope_variants,  tnscope_line  = genome.find_vcf_at_coordinate(my_coordinate, tnscope_line, tnscope, chrom_seq)
-                if platypus: got_platypus, platypus_variants, platypus_line = genome.find_vcf_at_coordinate(my_coordinate, platypus_line, platypus, chrom_seq)
-                if truth:    got_truth,    truth_variants,    truth_line    = genome.find_vcf_at_coordinate(my_coordinate, truth_line,   truth,   chrom_seq)
-                if dbsnp:    got_dbsnp,    dbsnp_variants,    dbsnp_line    = genome.find_vcf_at_coordinate(my_coordinate, dbsnp_line,   dbsnp,   chrom_seq)
-                if cosmic:   got_cosmic,   cosmic_variants,   cosmic_line   = genome.find_vcf_at_coordinate(my_coordinate, cosmic_line,  cosmic,  chrom_seq)
+                vcf_variants_here = vcf_streams.variants_at(my_coordinate)
+                if mutect:   mutect_variants   = vcf_variants_here['mutect']
+                if varscan:  varscan_variants  = vcf_variants_here['varscan']
+                if jsm:      jsm_variants      = vcf_variants_here['jsm']
+                if sniper:   sniper_variants   = vcf_variants_here['sniper']
+                if vardict:  vardict_variants  = vcf_variants_here['vardict']
+                if muse:     muse_variants     = vcf_variants_here['muse']
+                if lofreq:   lofreq_variants   = vcf_variants_here['lofreq']
+                if scalpel:  scalpel_variants  = vcf_variants_here['scalpel']
+                if strelka:  strelka_variants  = vcf_variants_here['strelka']
+                if tnscope:  tnscope_variants  = vcf_variants_here['tnscope']
+                if platypus: platypus_variants = vcf_variants_here['platypus']
+                if truth:    truth_variants    = vcf_variants_here['truth']
+                if dbsnp:    dbsnp_variants    = dbsnp if isinstance(dbsnp, annotation_index.AnnotationIndex) else vcf_variants_here['dbsnp']
+                if cosmic:   cosmic_variants   = cosmic if isinstance(cosmic, annotation_index.AnnotationIndex) else vcf_variants_here['cosmic']
 
 
                 # Now, use pysam to look into the BAM file(s), variant by variant from the input:
@@ -428,6 +560,7 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
 
                     else:
                         variant_id = ( (my_coordinate[0], my_coordinate[1]), ref_base, first_alt )
+                        my_identifiers = set()
 
 
                     #################### Collect Caller Vcf ####################:
@@ -538,29 +671,34 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
 
 
                         ########## ######### ######### INFO EXTRACTION FROM BAM FILES ########## ######### #########
-                        nBamFeatures = sequencing_features.from_bam(nbam, my_coordinate, ref_base, first_alt, min_mq, min_bq)
-                        tBamFeatures = sequencing_features.from_bam(tbam, my_coordinate, ref_base, first_alt, min_mq, min_bq)
+                        if bam_executor:
+                            nBamJob      = bam_executor.submit(nbam_from_bam, nbam, my_coordinate, ref_base, first_alt, min_mq, min_bq, nbam_cache, nbam_accumulator, max_reads_per_site, sampling_seed)
+                            tBamFeatures = tbam_from_bam(tbam, my_coordinate, ref_base, first_alt, min_mq, min_bq, tbam_cache, tbam_accumulator, max_reads_per_site, sampling_seed)
+                            nBamFeatures = nBamJob.result()
+                        else:
+                            nBamFeatures = nbam_from_bam(nbam, my_coordinate, ref_base, first_alt, min_mq, min_bq, nbam_cache, nbam_accumulator, max_reads_per_site, sampling_seed)
+                            tBamFeatures = tbam_from_bam(tbam, my_coordinate, ref_base, first_alt, min_mq, min_bq, tbam_cache, tbam_accumulator, max_reads_per_site, sampling_seed)
 
-                        n_ref = nBamFeatures['ref_for'] + nBamFeatures['ref_rev']
-                        n_alt = nBamFeatures['alt_for'] + nBamFeatures['alt_rev']
-                        t_ref = tBamFeatures['ref_for'] + tBamFeatures['ref_rev']
-                        t_alt = tBamFeatures['alt_for'] + tBamFeatures['alt_rev']
+                        n_ref = nBamFeatures.ref_for + nBamFeatures.ref_rev
+                        n_alt = nBamFeatures.alt_for + nBamFeatures.alt_rev
+                        t_ref = tBamFeatures.ref_for + tBamFeatures.ref_rev
+                        t_alt = tBamFeatures.alt_for + tBamFeatures.alt_rev
                         sor = sequencing_features.somaticOddRatio(n_ref, n_alt, t_ref, t_alt)
 
                         # Calculate VarScan'2 SCC directly without using VarScan2 output:
                         try:
-                            score_varscan2 = genome.p2phred( stats.fisher_exact( ((t_alt, n_alt), (t_ref, n_ref)), alternative='greater' )[1] )
+                            score_varscan2 = genome.p2phred( fast_stats.fisher_exact_p( ((t_alt, n_alt), (t_ref, n_ref)), alternative='greater' ) )
                         except ValueError:
                             score_varscan2 = nan
 
                         # Homopolymer eval:
-                        homopolymer_length, site_homopolymer_length = sequencing_features.from_genome_reference(ref_fa, my_coordinate, ref_base, first_alt)
+                        homopolymer_length, site_homopolymer_length = ref_homopolymers.homopolymer_lengths(my_coordinate, ref_base, first_alt)
 
                         # Fill the ID field of the TSV/VCF
                         my_identifiers = ';'.join(my_identifiers) if my_identifiers else '.'
 
                         ###
-                        out_line = out_header.format( \
+                        out_row = dict( \
                         CHROM                   = my_coordinate[0],                                                    \
                         POS                     = my_coordinate[1],                                                    \
                         ID                      = my_identifiers,                                                      \
@@ -588,41 +726,41 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
                         COMMON                  = if_common,                                                           \
                         if_COSMIC               = if_cosmic,                                                           \
                         COSMIC_CNT              = num_cases,                                                           \
-                        Consistent_Mates        = tBamFeatures['consistent_mates'],                                    \
-                        Inconsistent_Mates      = tBamFeatures['inconsistent_mates'],                                  \
-                        N_DP                    = nBamFeatures['dp'],                                                  \
-                        nBAM_REF_MQ             = '%g' % nBamFeatures['ref_mq'],                                       \
-                        nBAM_ALT_MQ             = '%g' % nBamFeatures['alt_mq'],                                       \
-                        nBAM_Z_Ranksums_MQ      = '%g' % nBamFeatures['z_ranksums_mq'],                                \
-                        nBAM_REF_BQ             = '%g' % nBamFeatures['ref_bq'],                                       \
-                        nBAM_ALT_BQ             = '%g' % nBamFeatures['alt_bq'],                                       \
-                        nBAM_Z_Ranksums_BQ      = '%g' % nBamFeatures['z_ranksums_bq'],                                \
-                        nBAM_REF_NM             = '%g' % nBamFeatures['ref_NM'],                                       \
-                        nBAM_ALT_NM             = '%g' % nBamFeatures['alt_NM'],                                       \
-                        nBAM_NM_Diff            = '%g' % nBamFeatures['NM_Diff'],                                      \
-                        nBAM_REF_Concordant     = nBamFeatures['ref_concordant_reads'],                                \
-                        nBAM_REF_Discordant     = nBamFeatures['ref_discordant_reads'],                                \
-                        nBAM_ALT_Concordant     = nBamFeatures['alt_concordant_reads'],                                \
-                        nBAM_ALT_Discordant     = nBamFeatures['alt_discordant_reads'],                                \
-                        nBAM_Concordance_FET    = rescale(nBamFeatures['concordance_fet'], 'fraction', p_scale, 1001), \
-                        N_REF_FOR               = nBamFeatures['ref_for'],                                             \
-                        N_REF_REV               = nBamFeatures['ref_rev'],                                             \
-                        N_ALT_FOR               = nBamFeatures['alt_for'],                                             \
-                        N_ALT_REV               = nBamFeatures['alt_rev'],                                             \
-                        nBAM_StrandBias_FET     = rescale(nBamFeatures['strandbias_fet'], 'fraction', p_scale, 1001),  \
-                        nBAM_Z_Ranksums_EndPos  = '%g' % nBamFeatures['z_ranksums_endpos'],                            \
-                        nBAM_REF_Clipped_Reads  = nBamFeatures['ref_SC_reads'],                                        \
-                        nBAM_ALT_Clipped_Reads  = nBamFeatures['alt_SC_reads'],                                        \
-                        nBAM_Clipping_FET       = rescale(nBamFeatures['clipping_fet'], 'fraction', p_scale, 1001),    \
-                        nBAM_MQ0                = nBamFeatures['MQ0'],                                                 \
-                        nBAM_Other_Reads        = nBamFeatures['noise_read_count'],                                    \
-                        nBAM_Poor_Reads         = nBamFeatures['poor_read_count'],                                     \
-                        nBAM_REF_InDel_3bp      = nBamFeatures['ref_indel_3bp'],                                       \
-                        nBAM_REF_InDel_2bp      = nBamFeatures['ref_indel_2bp'],                                       \
-                        nBAM_REF_InDel_1bp      = nBamFeatures['ref_indel_1bp'],                                       \
-                        nBAM_ALT_InDel_3bp      = nBamFeatures['alt_indel_3bp'],                                       \
-                        nBAM_ALT_InDel_2bp      = nBamFeatures['alt_indel_2bp'],                                       \
-                        nBAM_ALT_InDel_1bp      = nBamFeatures['alt_indel_1bp'],                                       \
+                        Consistent_Mates        = tBamFeatures.consistent_mates,                                       \
+                        Inconsistent_Mates      = tBamFeatures.inconsistent_mates,                                     \
+                        N_DP                    = nBamFeatures.dp,                                                     \
+                        nBAM_REF_MQ             = '%g' % nBamFeatures.ref_mq,                                          \
+                        nBAM_ALT_MQ             = '%g' % nBamFeatures.alt_mq,                                          \
+                        nBAM_Z_Ranksums_MQ      = '%g' % nBamFeatures.z_ranksums_mq,                                   \
+                        nBAM_REF_BQ             = '%g' % nBamFeatures.ref_bq,                                          \
+                        nBAM_ALT_BQ             = '%g' % nBamFeatures.alt_bq,                                          \
+                        nBAM_Z_Ranksums_BQ      = '%g' % nBamFeatures.z_ranksums_bq,                                   \
+                        nBAM_REF_NM             = '%g' % nBamFeatures.ref_NM,                                          \
+                        nBAM_ALT_NM             = '%g' % nBamFeatures.alt_NM,                                          \
+                        nBAM_NM_Diff            = '%g' % nBamFeatures.NM_Diff,                                         \
+                        nBAM_REF_Concordant     = nBamFeatures.ref_concordant_reads,                                   \
+                        nBAM_REF_Discordant     = nBamFeatures.ref_discordant_reads,                                   \
+                        nBAM_ALT_Concordant     = nBamFeatures.alt_concordant_reads,                                   \
+                        nBAM_ALT_Discordant     = nBamFeatures.alt_discordant_reads,                                   \
+                        nBAM_Concordance_FET    = rescale(nBamFeatures.concordance_fet, 'fraction', p_scale, 1001),    \
+                        N_REF_FOR               = nBamFeatures.ref_for,                                                \
+                        N_REF_REV               = nBamFeatures.ref_rev,                                                \
+                        N_ALT_FOR               = nBamFeatures.alt_for,                                                \
+                        N_ALT_REV               = nBamFeatures.alt_rev,                                                \
+                        nBAM_StrandBias_FET     = rescale(nBamFeatures.strandbias_fet, 'fraction', p_scale, 1001),     \
+                        nBAM_Z_Ranksums_EndPos  = '%g' % nBamFeatures.z_ranksums_endpos,                               \
+                        nBAM_REF_Clipped_Reads  = nBamFeatures.ref_SC_reads,                                           \
+                        nBAM_ALT_Clipped_Reads  = nBamFeatures.alt_SC_reads,                                           \
+                        nBAM_Clipping_FET       = rescale(nBamFeatures.clipping_fet, 'fraction', p_scale, 1001),       \
+                        nBAM_MQ0                = nBamFeatures.MQ0,                                                    \
+                        nBAM_Other_Reads        = nBamFeatures.noise_read_count,                                       \
+                        nBAM_Poor_Reads         = nBamFeatures.poor_read_count,                                        \
+                        nBAM_REF_InDel_3bp      = nBamFeatures.ref_indel_3bp,                                          \
+                        nBAM_REF_InDel_2bp      = nBamFeatures.ref_indel_2bp,                                          \
+                        nBAM_REF_InDel_1bp      = nBamFeatures.ref_indel_1bp,                                          \
+                        nBAM_ALT_InDel_3bp      = nBamFeatures.alt_indel_3bp,                                          \
+                        nBAM_ALT_InDel_2bp      = nBamFeatures.alt_indel_2bp,                                          \
+                        nBAM_ALT_InDel_1bp      = nBamFeatures.alt_indel_1bp,                                          \
                         M2_NLOD                 = nlod,                                                                \
                         M2_TLOD                 = tlod,                                                                \
                         M2_STR                  = tandem,                                                              \
@@ -633,53 +771,155 @@ def vcf2tsv(is_vcf=None, is_bed=None, is_pos=None, nbam_fn=None, tbam_fn=None, t
                         SHIFT3                  = shift3,                                                              \
                         MaxHomopolymer_Length   = homopolymer_length,                                                  \
                         SiteHomopolymer_Length  = site_homopolymer_length,                                             \
-                        T_DP                    = tBamFeatures['dp'],                                                  \
-                        tBAM_REF_MQ             = '%g' % tBamFeatures['ref_mq'],                                       \
-                        tBAM_ALT_MQ             = '%g' % tBamFeatures['alt_mq'],                                       \
-                        tBAM_Z_Ranksums_MQ      = '%g' % tBamFeatures['z_ranksums_mq'],                                \
-                        tBAM_REF_BQ             = '%g' % tBamFeatures['ref_bq'],                                       \
-                        tBAM_ALT_BQ             = '%g' % tBamFeatures['alt_bq'],                                       \
-                        tBAM_Z_Ranksums_BQ      = '%g' % tBamFeatures['z_ranksums_bq'],                                \
-                        tBAM_REF_NM             = '%g' % tBamFeatures['ref_NM'],                                       \
-                        tBAM_ALT_NM             = '%g' % tBamFeatures['alt_NM'],                                       \
-                        tBAM_NM_Diff            = '%g' % tBamFeatures['NM_Diff'],                                      \
-                        tBAM_REF_Concordant     = tBamFeatures['ref_concordant_reads'],                                \
-                        tBAM_REF_Discordant     = tBamFeatures['ref_discordant_reads'],                                \
-                        tBAM_ALT_Concordant     = tBamFeatures['alt_concordant_reads'],                                \
-                        tBAM_ALT_Discordant     = tBamFeatures['alt_discordant_reads'],                                \
-                        tBAM_Concordance_FET    = rescale(tBamFeatures['concordance_fet'], 'fraction', p_scale, 1001), \
-                        T_REF_FOR               = tBamFeatures['ref_for'],                                             \
-                        T_REF_REV               = tBamFeatures['ref_rev'],                                             \
-                        T_ALT_FOR               = tBamFeatures['alt_for'],                                             \
-                        T_ALT_REV               = tBamFeatures['alt_rev'],                                             \
-                        tBAM_StrandBias_FET     = rescale(tBamFeatures['strandbias_fet'], 'fraction', p_scale, 1001),  \
-                        tBAM_Z_Ranksums_EndPos  = '%g' % tBamFeatures['z_ranksums_endpos'],                            \
-                        tBAM_REF_Clipped_Reads  = tBamFeatures['ref_SC_reads'],                                        \
-                        tBAM_ALT_Clipped_Reads  = tBamFeatures['alt_SC_reads'],                                        \
-                        tBAM_Clipping_FET       = rescale(tBamFeatures['clipping_fet'], 'fraction', p_scale, 1001),    \
-                        tBAM_MQ0                = tBamFeatures['MQ0'],                                                 \
-                        tBAM_Other_Reads        = tBamFeatures['noise_read_count'],                                    \
-                        tBAM_Poor_Reads         = tBamFeatures['poor_read_count'],                                     \
-                        tBAM_REF_InDel_3bp      = tBamFeatures['ref_indel_3bp'],                                       \
-                        tBAM_REF_InDel_2bp      = tBamFeatures['ref_indel_2bp'],                                       \
-                        tBAM_REF_InDel_1bp      = tBamFeatures['ref_indel_1bp'],                                       \
-                        tBAM_ALT_InDel_3bp      = tBamFeatures['alt_indel_3bp'],                                       \
-                        tBAM_ALT_InDel_2bp      = tBamFeatures['alt_indel_2bp'],                                       \
-                        tBAM_ALT_InDel_1bp      = tBamFeatures['alt_indel_1bp'],                                       \
+                        T_DP                    = tBamFeatures.dp,                                                     \
+                        tBAM_REF_MQ             = '%g' % tBamFeatures.ref_mq,                                          \
+                        tBAM_ALT_MQ             = '%g' % tBamFeatures.alt_mq,                                          \
+                        tBAM_Z_Ranksums_MQ      = '%g' % tBamFeatures.z_ranksums_mq,                                   \
+                        tBAM_REF_BQ             = '%g' % tBamFeatures.ref_bq,                                          \
+                        tBAM_ALT_BQ             = '%g' % tBamFeatures.alt_bq,                                          \
+                        tBAM_Z_Ranksums_BQ      = '%g' % tBamFeatures.z_ranksums_bq,                                   \
+                        tBAM_REF_NM             = '%g' % tBamFeatures.ref_NM,                                          \
+                        tBAM_ALT_NM             = '%g' % tBamFeatures.alt_NM,                                          \
+                        tBAM_NM_Diff            = '%g' % tBamFeatures.NM_Diff,                                         \
+                        tBAM_REF_Concordant     = tBamFeatures.ref_concordant_reads,                                   \
+                        tBAM_REF_Discordant     = tBamFeatures.ref_discordant_reads,                                   \
+                        tBAM_ALT_Concordant     = tBamFeatures.alt_concordant_reads,                                   \
+                        tBAM_ALT_Discordant     = tBamFeatures.alt_discordant_reads,                                   \
+                        tBAM_Concordance_FET    = rescale(tBamFeatures.concordance_fet, 'fraction', p_scale, 1001),    \
+                        T_REF_FOR               = tBamFeatures.ref_for,                                                \
+                        T_REF_REV               = tBamFeatures.ref_rev,                                                \
+                        T_ALT_FOR               = tBamFeatures.alt_for,                                                \
+                        T_ALT_REV               = tBamFeatures.alt_rev,                                                \
+                        tBAM_StrandBias_FET     = rescale(tBamFeatures.strandbias_fet, 'fraction', p_scale, 1001),     \
+                        tBAM_Z_Ranksums_EndPos  = '%g' % tBamFeatures.z_ranksums_endpos,                               \
+                        tBAM_REF_Clipped_Reads  = tBamFeatures.ref_SC_reads,                                           \
+                        tBAM_ALT_Clipped_Reads  = tBamFeatures.alt_SC_reads,                                           \
+                        tBAM_Clipping_FET       = rescale(tBamFeatures.clipping_fet, 'fraction', p_scale, 1001),       \
+                        tBAM_MQ0                = tBamFeatures.MQ0,                                                    \
+                        tBAM_Other_Reads        = tBamFeatures.noise_read_count,                                       \
+                        tBAM_Poor_Reads         = tBamFeatures.poor_read_count,                                        \
+                        tBAM_REF_InDel_3bp      = tBamFeatures.ref_indel_3bp,                                          \
+                        tBAM_REF_InDel_2bp      = tBamFeatures.ref_indel_2bp,                                          \
+                        tBAM_REF_InDel_1bp      = tBamFeatures.ref_indel_1bp,                                          \
+                        tBAM_ALT_InDel_3bp      = tBamFeatures.alt_indel_3bp,                                          \
+                        tBAM_ALT_InDel_2bp      = tBamFeatures.alt_indel_2bp,                                          \
+                        tBAM_ALT_InDel_1bp      = tBamFeatures.alt_indel_1bp,                                          \
                         InDel_Length            = indel_length,                                                        \
                         TrueVariant_or_False    = judgement )
 
                         # Print it out to stdout:
-                        outhandle.write(out_line + '\n')
+                        outhandle.write( out_header.format(**out_row) + '\n' )
+
+                        if columnar_out:
+                            columnar_out.write( out_row )
+
+                        rows_here += 1
+
+                checkpoints.done(my_coordinate, outhandle, rows_here)
 
             # Read into the next line:
             if not is_vcf:
                 my_line = my_sites.readline().rstrip()
 
         ##########  Close all open files if they were opened  ##########
+        if bam_executor:
+            bam_executor.shutdown()
+
+        if columnar_out:
+            columnar_out.close()
+
         opened_files = (ref_fa, nbam, tbam, truth, cosmic, dbsnp, mutect, varscan, jsm, sniper, vardict, muse, lofreq, scalpel, strelka, tnscope, platypus)
         [opened_file.close() for opened_file in opened_files if opened_file]
 
+        if read_cache_size > 0:
+            logger.info('Read cache for {}: {}'.format(nbam_fn, nbam_cache.report()))
+            logger.info('Read cache for {}: {}'.format(tbam_fn, tbam_cache.report()))
+
+        if feature_cache:
+            nbam_features.close()
+            tbam_features.close()
+            logger.info('Feature cache for {}: {}'.format(nbam_fn, nbam_features.report()))
+            logger.info('Feature cache for {}: {}'.format(tbam_fn, tbam_features.report()))
+
+    # A resumed run only has the rows after the checkpoint, so its columnar file is made from the whole TSV file:
+    if columnar and resume_code is not None:
+        columnar_tsv.from_tsv(outfile, columnar)
+
+    checkpoints.remove()
+
+
+
+
+def vcf2tsv_on_candidates(parameters):
+    '''
+    Whole-genome vcf2tsv, but only at the positions where the tumor BAM file has enough reads of a non-reference base (see candidate_sites.py).
+    The candidate VCF file is kept next to the output until vcf2tsv is done, so a resumed run does not have to scan the genome again.
+    '''
+
+    outfile = parameters['outfile']
+    candidate_vcf = outfile + '.candidates.vcf'
+
+    if not ( parameters['resume'] and os.path.exists(candidate_vcf) ):
+        num_sites = candidate_sites.write_candidate_vcf(parameters['tbam_fn'], parameters['ref_fa'], candidate_vcf + '.tmp', parameters['prefilter_min_alt_reads'], parameters['prefilter_min_vaf'], parameters['min_mq'], parameters['min_bq'])
+        os.replace(candidate_vcf + '.tmp', candidate_vcf)
+        logger.info('{} candidate sites in {}'.format(num_sites, parameters['tbam_fn']))
+
+    vcf2tsv( **dict(parameters, is_vcf=candidate_vcf) )
+    os.remove(candidate_vcf)
+
+
+
+def vcf2tsv_in_chunks(parameters):
+    '''
+    vcf2tsv with the parameters (i.e., its arguments) in parameters['threads'] processes:
+    the sorted candidate VCF file is split into contiguous chunks, each chunk is converted by its own vcf2tsv, and the TSV files are concatenated back in coordinate order.
+    With checkpoints, the chunks are kept next to the output until they are all done, and a resumed run only picks up the chunks that were not done.
+    '''
+
+    threads = parameters['threads']
+    outfile = parameters['outfile']
+
+    if parameters['checkpoint_every'] > 0:
+        chunk_dir = outfile + '.chunks'
+        os.makedirs(chunk_dir, exist_ok=True)
+    else:
+        chunk_dir = tempfile.mkdtemp( prefix='vcf2tsv.', dir=os.path.dirname(os.path.abspath(outfile)) )
+
+    all_done = False
+
+    try:
+        chunk_vcfs = genome.split_vcf( parameters['is_vcf'], threads, os.path.join(chunk_dir, '{}_chunks_'.format(threads)) )
+        chunk_tsvs = [ re.sub(r'\.vcf$', '.tsv', chunk_vcf_i) for chunk_vcf_i in chunk_vcfs ]
+
+        # Chunks are marked done once their TSV files are complete:
+        if not parameters['resume']:
+            for chunk_tsv_i in chunk_tsvs:
+                if os.path.exists(chunk_tsv_i + '.done'):
+                    os.remove(chunk_tsv_i + '.done')
+
+        pending_chunks = [ (chunk_vcf_i, chunk_tsv_i) for chunk_vcf_i, chunk_tsv_i in zip(chunk_vcfs, chunk_tsvs) if not os.path.exists(chunk_tsv_i + '.done') ]
+
+        logger.info('{} chunks of {} in {} processes, {} of them to do'.format(len(chunk_vcfs), parameters['is_vcf'], threads, len(pending_chunks)))
+
+        with ProcessPoolExecutor(max_workers=threads) as chunk_pool:
+            chunk_runs = { chunk_pool.submit(vcf2tsv, **dict(parameters, is_vcf=chunk_vcf_i, threads=1, columnar=None, outfile=chunk_tsv_i)): chunk_tsv_i for chunk_vcf_i, chunk_tsv_i in pending_chunks }
+
+            # Raise the exception from any of the chunks:
+            for chunk_run_i in as_completed(chunk_runs):
+                chunk_run_i.result()
+                open(chunk_runs[chunk_run_i] + '.done', 'w').close()
+
+        concat.tsv(chunk_tsvs, outfile)
+
+        if parameters['columnar']:
+            columnar_tsv.from_tsv(outfile, parameters['columnar'])
+
+        all_done = True
+
+    finally:
+        if all_done or parameters['checkpoint_every'] <= 0:
+            shutil.rmtree(chunk_dir)
+
 
 
 if __name__ == '__main__':
@@ -710,4 +950,19 @@ if __name__ == '__main__':
             min_caller = runParameters['minimum_num_callers'], \
             ref_fa     = runParameters['genome_reference'], \
             p_scale    = runParameters['p_scale'], \
+            stream_bam = runParameters['stream_bam'], \
+            tile_size  = runParameters['tile_size'], \
+            read_cache_size = runParameters['read_cache_size'], \
+            scipy_stats = runParameters['scipy_stats'], \
+            fisher_depth = runParameters['fisher_exact_depth'], \
+            max_reads_per_site = runParameters['max_reads_per_site'], \
+            sampling_seed = runParameters['sampling_seed'], \
+            concurrent_bams = runParameters['concurrent_bams'], \
+            threads    = runParameters['threads'], \
+            prefilter_min_alt_reads = runParameters['prefilter_min_alt_reads'], \
+            prefilter_min_vaf = runParameters['prefilter_min_vaf'], \
+            feature_cache = runParameters['feature_cache'], \
+            checkpoint_every = runParameters['checkpoint_every'], \
+            resume     = runParameters['resume'], \
+            columnar   = runParameters['columnar_output'], \
             outfile    = runParameters['output_tsv_file'])
@@ -48,42 +48,28 @@ else:
 
 
 
+def vcf_coordinate(vcf_i):
+    '''The coordinate of a Vcf_line encoded as an integer (see genome.coordinate_code), so coordinates are compared as plain integers.'''
+
+    if vcf_i.chromosome == '':
+        return genome.end_of_file
+    else:
+        return genome.encode_coordinate( chrom_sequence[vcf_i.chromosome], vcf_i.position )
+
+
+
 def whoisbehind(coord_0, coord_1):
-    '''coord_0 and coord_1 are two strings, specifying the chromosome, a (typically) tab, and then the location.'''
-    
-    if coord_0[0] == coord_1[0] == '':
-        return 10
-        
-    elif coord_1[0] == '':
-        return 0
-        
-    elif coord_0[0] == '':
-        return 1
-    
+    '''coord_0 and coord_1 are two encoded coordinates, where the end of a file is genome.end_of_file.'''
+
+    if coord_0 < coord_1:
+        return 0   # 1st coordinate is behind
+
+    elif coord_0 > coord_1:
+        return 1   # 2nd coordinate is behind
+
+    # Same chromosome, same position, then same coordinate:
     else:
-    
-        chrom0, position0 = coord_0[0], coord_0[1]
-        chrom1, position1 = coord_1[0], coord_1[1]
-        
-        
-        if chrom_sequence[chrom0] < chrom_sequence[chrom1]:
-            return 0   # 1st coordinate is behind
-            
-        elif chrom_sequence[chrom0] > chrom_sequence[chrom1]:
-            return 1   # 2nd coordinate is behind
-        
-        # Must be in the same chromosome
-        else:
-                        
-            if position0 < position1:
-                return 0
-            
-            elif position0 > position1:
-                return 1
-            
-            # Same chromosome, same position, then same coordinate:
-            else:
-                return 10
+        return 10
 
 
 
@@ -108,10 +94,10 @@ def catch_up(line_1, line_2, file_1, file_2, output_vcf, id_1, id_2, id_12 ):
     vcf_1 = genome.Vcf_line(line_1)
     vcf_2 = genome.Vcf_line(line_2)
     
-    coord_1 = [vcf_1.chromosome, vcf_1.position]
-    coord_2 = [vcf_2.chromosome, vcf_2.position]
+    coord_1 = vcf_coordinate(vcf_1)
+    coord_2 = vcf_coordinate(vcf_2)
     
-    print(coord_1, coord_2)
+    print([vcf_1.chromosome, vcf_1.position], [vcf_2.chromosome, vcf_2.position])
     
     is_behind = whoisbehind( coord_1, coord_2 )
     
@@ -138,7 +124,7 @@ def catch_up(line_1, line_2, file_1, file_2, output_vcf, id_1, id_2, id_12 ):
             
             line_1 = file_1.readline()
             vcf_1  = genome.Vcf_line(line_1)
-            coord_1 = [vcf_1.chromosome, vcf_1.position]
+            coord_1 = vcf_coordinate(vcf_1)
                     
         # If 2nd VCF is behind:    
         elif is_behind == 1:
@@ -163,13 +149,13 @@ def catch_up(line_1, line_2, file_1, file_2, output_vcf, id_1, id_2, id_12 ):
             
             line_2 = file_2.readline()
             vcf_2  = genome.Vcf_line(line_2)
-            coord_2 = [vcf_2.chromosome, vcf_2.position]
+            coord_2 = vcf_coordinate(vcf_2)
         
         is_behind = whoisbehind( coord_1, coord_2 )
     
     
     # Returns the value of the function:
-    if coord_1[0] == coord_2[0] =='':
+    if coord_1 == coord_2 == genome.end_of_file:
         result = 42
     else:
         
@@ -1,18 +1,20 @@
 #!/usr/bin/env python3
 
 # A simple and quick way to replace GATK3 CombineVariants
+# The callers' VCF files are usually sorted already, so they are merged like sort -m rather than collected and sorted: only the variants around the current position are in memory.
+# The ones that are not are sorted with vcfIntersector.vcfsorter first.
 
-import sys, argparse, gzip, re
+import sys, os, argparse, re, heapq, tempfile
 
+MY_DIR = os.path.dirname(os.path.realpath(__file__))
+PRE_DIR = os.path.join(MY_DIR, os.pardir)
+sys.path.append( PRE_DIR )
 
-def open_textfile(file_name):
+import genomicFileHandler.genomic_file_handlers as genome
+import vcfModifier.vcfIntersector as vcfIntersector
 
-    # See if the input file is a .gz file:
-    if file_name.lower().endswith('.gz'):
-        return gzip.open(file_name, 'rt')
-
-    else:
-        return open(file_name)
+# Records can be this many bp out of order in a VCF file, e.g., where splitVcf moved a complex variant to where its INDEL starts:
+max_shift = 1000
 
 
 def run():
@@ -20,54 +22,130 @@ def run():
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('-vcfs',  '--input-vcfs', nargs='*', type=str, help='Input VCF file', required=True, default=None)
     parser.add_argument('-out',   '--output-vcf',            type=str, help='Output VCF file', required=True)
+    parser.add_argument('-ref',   '--genome-reference',      type=str, help='.fasta file with its .fai, whose contig order the VCF files are sorted by', required=True)
+    parser.add_argument('-sortbuffer', '--sort-buffer-mb',    type=int, help='MB of VCF lines held in memory when a VCF file out of order is sorted', default=vcfIntersector.sort_buffer_size // 2**20)
 
     args = parser.parse_args()
 
     infiles = args.input_vcfs
     outfile  = args.output_vcf
+    ref      = args.genome_reference
+    sort_buffer_size = args.sort_buffer_mb * 2**20
+
+    return infiles, outfile, ref, sort_buffer_size
+
+
+
+def sorted_variants(file_i, chrom_seq, max_shift=max_shift):
+    '''
+    (coordinate code, REF, ALT) of every ALT of every record in the VCF file, in order, where the file is sorted by the contig order of chrom_seq.
+    Variants are held back until the file is max_shift bp past them, so ones that are a little out of order still come out in order.
+    '''
+
+    pending  = []
+    released = None
+    vcf_name = file_i if isinstance(file_i, str) else 'VCF'
+
+    with genome.open_textfile(file_i) as vcf:
+
+        line_i = vcf.readline().rstrip()
+
+        while line_i.startswith('#'):
+            line_i = vcf.readline().rstrip()
 
-    return infiles, outfile
+        while line_i:
 
+            item = line_i.split('\t')
 
+            if item[0] not in chrom_seq:
+                raise Exception( '{} of {} is not in the reference.'.format(item[0], vcf_name) )
 
-def combine(infiles, outfile):
+            coordinate_i = genome.encode_coordinate( chrom_seq[item[0]], int(item[1]) )
+            refbase      = item[3]
+            altbases     = re.split(r'[,/]', item[4])
 
-    variant_positions = set()
+            for altbase_i in altbases:
+                variant_i = (coordinate_i, refbase, altbase_i)
 
-    for file_i in infiles:
+                if released and variant_i < released:
+                    raise Exception( '{} is out of order at {}:{}.'.format(vcf_name, item[0], item[1]) )
 
-        with open_textfile(file_i) as vcf:
+                heapq.heappush( pending, variant_i )
+
+            # A different contig is always more than max_shift away:
+            while pending and pending[0][0] + max_shift < coordinate_i:
+                released = heapq.heappop(pending)
+                yield released
 
             line_i = vcf.readline().rstrip()
 
-            while line_i.startswith('#'):
-                line_i = vcf.readline().rstrip()
+    while pending:
+        yield heapq.heappop(pending)
+
+
+
+def in_order(file_i, chrom_seq, ref, max_shift=max_shift):
+    '''Whether sorted_variants can merge the VCF file as it is, i.e., none of its records is more than max_shift bp behind an earlier one.'''
+
+    farthest = -1
+    with genome.open_textfile(file_i) as vcf:
+        for line_i in vcf:
+            if not line_i.startswith('#'):
+                coordinate_i = vcfIntersector.record_coordinate(line_i, chrom_seq, ref)
+                if coordinate_i + max_shift < farthest:
+                    return False
+                farthest = max(farthest, coordinate_i)
 
+    return True
 
-            while line_i:
 
-                item = line_i.split('\t')
 
-                chromosome = item[0]
-                position   = int( item[1] )
-                refbase    = item[3]
-                altbases   = re.split(r'[,/]', item[4])
+def combine(infiles, outfile, ref, sort_buffer_size=None):
 
-                for altbase_i in altbases:
-                    variant_positions.add( (chromosome, position, refbase, altbase_i) )
+    chrom_seq = genome.faiordict2contigorder(ref + '.fai', 'fai')
+    contigs   = sorted(chrom_seq, key=chrom_seq.get)
 
-                line_i = vcf.readline().rstrip()
+    # Files that are out of order are sorted into temp files first. Streaming lines can only be read once, so they are always put through the sorter.
+    temp_dir   = os.path.dirname( os.path.abspath(outfile) ) if isinstance(outfile, str) else None
+    temp_files = []
+    try:
+        sorted_infiles = []
+        for file_i in infiles:
+            if isinstance(file_i, str) and in_order(file_i, chrom_seq, ref):
+                sorted_infiles.append( file_i )
+            else:
+                file_handle, sorted_file_i = tempfile.mkstemp(suffix='.vcf', dir=temp_dir)
+                os.close(file_handle)
+                temp_files.append( sorted_file_i )
+                sorted_infiles.append( vcfIntersector.vcfsorter(ref, file_i, sorted_file_i, sort_buffer_size) )
 
+        merge_variants(sorted_infiles, outfile, chrom_seq, contigs)
 
-    with open(outfile, 'w') as vcf_out:
+    finally:
+        for file_i in temp_files:
+            os.remove(file_i)
+
+
+
+def merge_variants(infiles, outfile, chrom_seq, contigs):
+    '''The union of the variants of the VCF files, which sorted_variants can read in order, as a sites-only VCF file.'''
+
+    with genome.open_output(outfile) as vcf_out:
         vcf_out.write('##fileformat=VCFv4.1\n')
         vcf_out.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n')
 
-        for variant_position_i in sorted(variant_positions):
+        # Variants called by more than one caller come out next to each other:
+        last_variant = None
+        for variant_i in heapq.merge( *[ sorted_variants(file_i, chrom_seq) for file_i in infiles ] ):
+
+            if variant_i == last_variant:
+                continue
+            last_variant = variant_i
 
-            vcf_out.write('{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n'.format(variant_position_i[0], variant_position_i[1], '.', variant_position_i[2], variant_position_i[3], '.', 'PASS', '.') )
+            contig_idx, position = genome.decode_coordinate( variant_i[0] )
+            vcf_out.write('{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n'.format(contigs[contig_idx], position, '.', variant_i[1], variant_i[2], '.', 'PASS', '.') )
 
 
 if __name__ == '__main__':
-    infiles, outfile = run()
-    combine(infiles, outfile)
+    infiles, outfile, ref, sort_buffer_size = run()
+    combine(infiles, outfile, ref, sort_buffer_size)
@@ -26,7 +26,7 @@ def run():
 
 def convert(infile, snv_out, indel_out):
 
-    with genome.open_textfile(infile) as vcf, open(snv_out, 'w') as snpout, open(indel_out, 'w') as indelout:
+    with genome.open_textfile(infile) as vcf, genome.open_output(snv_out) as snpout, genome.open_output(indel_out) as indelout:
 
         line_i = vcf.readline().rstrip()
 
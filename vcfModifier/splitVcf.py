@@ -33,9 +33,30 @@ def run():
     return infile, snv_out, indel_out
 
 
-def split_into_snv_and_indel(infile, snv_out, indel_out):
+class ModifiedOutput:
+    '''Write the lines into vcf_out after modify(line), i.e., a line without its newline, unless that returns None.'''
 
-    with genome.open_textfile(infile) as vcf_in, open(snv_out, 'w') as snv_out, open(indel_out, 'w') as indel_out:
+    def __init__(self, vcf_out, modify):
+        self.vcf_out = vcf_out
+        self.modify  = modify
+
+    def write(self, line_i):
+        line_i = self.modify( line_i.rstrip('\n') )
+        if line_i is not None:
+            self.vcf_out.write( line_i + '\n' )
+
+
+
+def split_into_snv_and_indel(infile, snv_out, indel_out, modify=None):
+    '''
+    infile may also be streaming lines, e.g., vcfIntersector.intersected_vcf. Every line that is written can be modified on the way by modify(line),
+    e.g., modify_VarScan2.convert_line, which returns the new line, or None for a line not to be written.
+    '''
+
+    with genome.open_textfile(infile) as vcf_in, genome.open_output(snv_out) as snv_out, genome.open_output(indel_out) as indel_out:
+
+        if modify:
+            snv_out, indel_out = ModifiedOutput(snv_out, modify), ModifiedOutput(indel_out, modify)
 
         line_i = vcf_in.readline().rstrip()
 
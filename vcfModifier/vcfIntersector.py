@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
-import sys, os, argparse, gzip, re, subprocess, uuid
+import sys, os, argparse, gzip, heapq, shutil, tempfile
+from bisect import bisect_left
 
 MY_DIR = os.path.dirname(os.path.realpath(__file__))
 PRE_DIR = os.path.join(MY_DIR, os.pardir)
@@ -10,14 +11,115 @@ import genomicFileHandler.genomic_file_handlers as genome
 
 
 
+class BedIntervals:
+    '''
+    The regions of a BED file, merged and sorted per contig into two lists, i.e., starts and ends (0-based, half-open), for bisect lookups.
+    Overlaps are the same as intersectBed's: a VCF record covers [POS-1, POS-1+len(REF)).
+    '''
+
+    def __init__(self, bed_file):
+
+        regions = {}
+        with genome.open_textfile(bed_file) as bed:
+            for line_i in bed:
+                if line_i.startswith(('#', 'track', 'browser')) or not line_i.strip():
+                    continue
+
+                item_i = line_i.rstrip('\n').split('\t')
+                regions.setdefault(item_i[0], []).append( ( int(item_i[1]), int(item_i[2]) ) )
+
+        self.starts = {}
+        self.ends   = {}
+
+        for contig_i in regions:
+            starts, ends = [], []
+            for start_i, end_i in sorted( regions[contig_i] ):
+                if ends and start_i <= ends[-1]:
+                    ends[-1] = max(ends[-1], end_i)
+                else:
+                    starts.append( start_i )
+                    ends.append( end_i )
+
+            self.starts[contig_i] = starts
+            self.ends[contig_i]   = ends
+
+
+    def overlaps(self, contig, start, end):
+        '''Whether [start, end) overlaps any region.'''
+
+        if contig not in self.starts:
+            return False
+
+        # The last region starting before the end, and since the regions are merged, the only one that can reach the start:
+        i = bisect_left( self.starts[contig], end ) - 1
+        return i >= 0 and self.ends[contig][i] > start
+
+
+
+# Each BED file is only read once, no matter how many caller VCF files are intersected with it:
+bed_indices = {}
+
+def bed_index(bed_file):
+    if bed_file not in bed_indices:
+        bed_indices[bed_file] = BedIntervals(bed_file)
+    return bed_indices[bed_file]
+
+
+
+def intersect_lines(vcf_lines, inclusion_region=None, exclusion_region=None):
+    '''
+    Stream the header lines, and the VCF records that overlap the inclusion BED file (if any) but not the exclusion BED file (if any).
+    Like intersectBed | uniq, repeated lines in a row are only kept once.
+    '''
+
+    included = bed_index(inclusion_region) if inclusion_region else None
+    excluded = bed_index(exclusion_region) if exclusion_region else None
+
+    # Without any BED file, the lines are passed on as they are:
+    if included is None and excluded is None:
+        yield from vcf_lines
+        return
+
+    last_line = None
+    for line_i in vcf_lines:
+
+        if line_i == last_line:
+            continue
+
+        if not line_i.startswith('#'):
+
+            item_i = line_i.split('\t', 4)
+            start_i = int(item_i[1]) - 1
+            end_i   = start_i + len(item_i[3])
+
+            if included is not None and not included.overlaps(item_i[0], start_i, end_i):
+                continue
+
+            if excluded is not None and excluded.overlaps(item_i[0], start_i, end_i):
+                continue
+
+        last_line = line_i
+        yield line_i
+
+
+
+def intersected_vcf(infile, inclusion_region=None, exclusion_region=None):
+    '''The lines of bed_intersector's output, streaming rather than written into a file, to be read like an opened VCF file (see genome.LineStream).'''
+
+    def vcf_lines():
+        with genome.open_textfile(infile) as vcf_in:
+            yield from intersect_lines(vcf_in, inclusion_region, exclusion_region)
+
+    return genome.LineStream( vcf_lines() )
+
+
+
 def bed_include(infile, inclusion_region, outfile):
     
     assert infile != outfile
     
     if inclusion_region:
-    
-        exit_code = os.system( 'intersectBed -header -a {} -b {} | uniq > {}'.format(infile, inclusion_region, outfile) )
-        assert exit_code == 0
+        bed_intersector(infile, outfile, inclusion_region)
     else:
         outfile = None
     
@@ -30,9 +132,7 @@ def bed_exclude(infile, exclusion_region, outfile):
     assert infile != outfile
     
     if exclusion_region:
-    
-        exit_code = os.system( 'intersectBed -header -a {} -b {} -v | uniq > {}'.format(infile, exclusion_region, outfile) )
-        assert exit_code == 0
+        bed_intersector(infile, outfile, exclusion_region=exclusion_region)
     else:
         outfile = None
         
@@ -44,54 +144,173 @@ def bed_exclude(infile, exclusion_region, outfile):
 def bed_intersector(infile, outfile, inclusion_region=None, exclusion_region=None):
     
     assert infile != outfile
-    from shutil import copyfile
-    
-    # Get the input file name minus the extention, and also get the extension
-    infile_noext = re.sub(r'\.\w+$', '', infile)
-    file_ext     = re.search(r'\.\w+$',  infile).group()
     
-    temp_files   = []
-    
-    if inclusion_region:
-        
-        included_temp_file = infile_noext + uuid.uuid4().hex + file_ext
-        
-        exit_code = os.system( 'intersectBed -header -a {} -b {} | uniq > {}'.format(infile, inclusion_region, included_temp_file) )
-        assert exit_code == 0
-        
-        infile  = included_temp_file
-        temp_files.append( included_temp_file )
-    
-    
-    if exclusion_region:
+    # Without any BED file, this is just a copy (gunzipped if .gz):
+    with intersected_vcf(infile, inclusion_region, exclusion_region) as vcf_in, open(outfile, 'w') as vcf_out:
+        vcf_out.writelines( vcf_in )
         
-        exit_code = os.system( 'intersectBed -header -a {} -b {} -v | uniq > {}'.format(infile, exclusion_region, outfile) )
-        assert exit_code == 0
-    
-    
-    if inclusion_region and not exclusion_region:
-        copyfile(included_temp_file, outfile)
-    
-    elif not (inclusion_region or exclusion_region):
-        if infile.endswith('.gz'):
-            exit_code = os.system( 'gunzip -c {} > {}'.format(infile, outfile) )
-            assert exit_code == 0
+    return outfile
+
+
+
+# VCF text (in bytes) that vcfsorter holds in memory at a time. Larger inputs are sorted in runs of this size, spilled into temp files, and merged.
+sort_buffer_size = 256 * 2**20
+
+# At most this many runs are merged at once (i.e., open files). More runs are merged into fewer, longer ones first.
+max_merged_runs = 256
+
+def record_coordinate(line_i, chrom_seq, ref):
+    '''The coordinate code of a VCF record, in the contig order of ref's .fai file.'''
+
+    contig_i, position_i = line_i.split('\t', 2)[:2]
+    if contig_i not in chrom_seq:
+        raise Exception( '{} is not in {}.fai'.format(contig_i, ref) )
+
+    return genome.encode_coordinate( chrom_seq[contig_i], int(position_i) )
+
+
+
+class VcfSorter:
+    '''
+    Write VCF lines, one at a time, into vcfout sorted like vcfsorter does, e.g., straight from a caller's modify script without an unsorted file in between.
+    The header lines are written as they come, and the records when the VcfSorter is closed.
+    '''
+
+    def __init__(self, ref, vcfout, buffer_size=None):
+
+        self.ref        = ref
+        self.vcfout     = vcfout
+        self.chrom_seq  = genome.faiordict2contigorder(ref + '.fai', 'fai')
+        self.buffer_size = sort_buffer_size if buffer_size is None else buffer_size
+        self.temp_dir   = os.path.dirname( os.path.abspath(vcfout) )
+
+        self.vcf_out    = open(vcfout, 'w')
+        self.buffer     = []
+        self.buffered   = 0
+        self.runs       = []
+        self.in_order   = True
+        self.last_coordinate = -1
+
+
+    def coordinate_of(self, line_i):
+        return record_coordinate(line_i, self.chrom_seq, self.ref)
+
+
+    def write(self, line_i):
+
+        # The last line of a file may not end in a newline, and it would run into the next one:
+        if not line_i.endswith('\n'):
+            line_i += '\n'
+
+        if line_i.startswith('#'):
+            self.vcf_out.write( line_i )
+            return
+
+        coordinate_i = self.coordinate_of(line_i)
+        if coordinate_i < self.last_coordinate:
+            self.in_order = False
+        self.last_coordinate = coordinate_i
+
+        self.buffer.append( line_i )
+        self.buffered += len(line_i)
+        if self.buffered >= self.buffer_size:
+            self.spill()
+
+
+    def spill(self):
+        '''Sort the buffer into a temp file.'''
+
+        if not self.in_order:
+            self.buffer.sort(key=self.coordinate_of)
+
+        run_i = tempfile.TemporaryFile('w+', dir=self.temp_dir)
+        run_i.writelines( self.buffer )
+        run_i.seek(0)
+        self.runs.append( run_i )
+
+        self.buffer   = []
+        self.buffered = 0
+
+
+    def merge(self, runs):
+        # heapq.merge takes the earlier run first at the same position, so the order stays stable:
+        return heapq.merge(*runs, key=self.coordinate_of)
+
+
+    def close(self):
+
+        if self.vcf_out.closed:
+            return
+
+        # Everything came in order, so nothing was sorted, and there is nothing to merge:
+        if self.in_order and not self.runs:
+            self.vcf_out.writelines( self.buffer )
+
+        elif not self.runs:
+            self.buffer.sort(key=self.coordinate_of)
+            self.vcf_out.writelines( self.buffer )
+
         else:
-            copyfile(infile, outfile)
+            if self.buffer:
+                self.spill()
+
+            runs = self.runs
+            try:
+                while len(runs) > max_merged_runs:
+                    merged_runs = []
+                    for i in range(0, len(runs), max_merged_runs):
+                        run_i = tempfile.TemporaryFile('w+', dir=self.temp_dir)
+                        run_i.writelines( self.merge(runs[i:i+max_merged_runs]) )
+                        run_i.seek(0)
+                        for run_j in runs[i:i+max_merged_runs]:
+                            run_j.close()
+                        merged_runs.append( run_i )
+                    runs = self.runs = merged_runs
+
+                self.vcf_out.writelines( self.merge(runs) )
+
+            finally:
+                for run_i in self.runs:
+                    run_i.close()
+
+        self.buffer = []
+        self.runs   = []
+        self.vcf_out.close()
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+# Sort like bedtools sort -faidx, i.e., by the contig order of the .fai file and then the position. Records at the same position stay in the order they came in.
+def vcfsorter(ref, vcfin, vcfout, buffer_size=None):
     
+    assert vcfin != vcfout
     
-    for file_i in temp_files:
-        os.remove( file_i )
-        
-    return outfile
+    # Don't sort a file that is already sorted. Streaming lines can only be read once, so VcfSorter finds that out as it goes.
+    if isinstance(vcfin, str):
 
+        chrom_seq = genome.faiordict2contigorder(ref + '.fai', 'fai')
 
+        with genome.open_textfile(vcfin) as vcf_in:
+            last_coordinate = -1
+            for line_i in vcf_in:
+                if not line_i.startswith('#'):
+                    coordinate_i = record_coordinate(line_i, chrom_seq, ref)
+                    if coordinate_i < last_coordinate:
+                        break
+                    last_coordinate = coordinate_i
+            else:
+                with genome.open_textfile(vcfin) as vcf_in, open(vcfout, 'w') as vcf_out:
+                    shutil.copyfileobj(vcf_in, vcf_out)
+                return vcfout
 
-# Use utilities/vcfsorter.pl fa.dict unsorted.vcf > sorted.vcf
-def vcfsorter(ref, vcfin, vcfout):
-    
-    #vcfsort = '{}/utilities/vcfsorter.pl'.format(PRE_DIR)
-    #os.system( '{} {} {} > {}'.format(vcfsort, hg_dict, vcfin, vcfout ) )
-    fai = ref + '.fai'
-    exit_code = os.system('bedtools sort -faidx {} -header -i {} > {}'.format(fai, vcfin, vcfout))
-    assert exit_code == 0
+    with genome.open_textfile(vcfin) as vcf_in, VcfSorter(ref, vcfout, buffer_size) as vcf_sorter:
+        for line_i in vcf_in:
+            vcf_sorter.write( line_i )
+
+    return vcfout